@@ -13,6 +13,17 @@ class Models:
     GEMINI_2_5_PRO = "gemini-2.5-pro"
 
 
+class Embedding_Models:
+    GEMINI_EMBEDDING_001 = "gemini-embedding-001"
+
+
+# Maximum input texts per embedding request, gemini-embedding-001 accepts a single text
+EMBEDDING_MODEL_MAX_BATCH = {
+    Embedding_Models.GEMINI_EMBEDDING_001: 1,
+}
+DEFAULT_EMBEDDING_MAX_BATCH = 250
+
+
 class Llm_Call:
     STT = "STT"
     SMART = "SMART"
@@ -37,6 +48,16 @@ class Pipeline_Stage_Errors(str, Enum):
     INTERNAL_ERROR = "INTERNAL_ERROR"
 
 
+class Similarity_Search_Mode(str, Enum):
+    EXACT = "exact"
+    ANN = "ann"
+    HALFVEC = "halfvec"
+    BINARY = "binary"
+    PREFIX = "prefix"
+    CENTROID = "centroid"
+    HYBRID = "hybrid"
+
+
 # class Pipeline_Stage(str, Enum):
 #     STT = "stt"
 #     SMART_CONTEXT = "smart_context"
@@ -19,6 +19,10 @@ ENABLE_VERTEX_AI = os.getenv("ENABLE_VERTEX_AI", "true").lower() == "true"
 UPSTREAM_URL = os.getenv("UPSTREAM_URL", "http://localhost:8080")
 
 MAX_PIPELINE_STAGE_ATTEMPTS = int(os.getenv("MAX_PIPELINE_STAGE_ATTEMPTS", "3") or "3")
+# Running stages heartbeat every STAGE_HEARTBEAT_INTERVAL seconds; a stage without a heartbeat
+# for STAGE_LEASE_SECONDS is considered abandoned and can be claimed by a redelivery
+STAGE_LEASE_SECONDS = float(os.getenv("STAGE_LEASE_SECONDS", "60") or "60")
+STAGE_HEARTBEAT_INTERVAL = float(os.getenv("STAGE_HEARTBEAT_INTERVAL", "15") or "15")
 
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = int(os.getenv("DB_PORT", "5433") or "5433")
@@ -26,6 +30,96 @@ DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "mypassword")
 DB_NAME = os.getenv("DB_NAME", "mydb")
 
+# Connection pool sizing, idle recycling and checkout timeout (seconds)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2") or "2")
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10") or "10")
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300") or "300")
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800") or "1800")
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30") or "30")
+# Apply pending db/schema.py migrations when the Database is created
+DB_RUN_MIGRATIONS = os.getenv("DB_RUN_MIGRATIONS", "true").lower() == "true"
+# Optional read replica (libpq DSN) for lag-tolerant reads: similarity search and replays of
+# completed stage outputs. Sized like the primary pool; empty keeps every query on the primary
+DB_REPLICA_DSN = os.getenv("DB_REPLICA_DSN", "")
+# Per-statement latency histograms; a DB_SLOW_QUERY_SAMPLE_RATE fraction of the statements
+# taking DB_SLOW_QUERY_MS or more are explained (EXPLAIN (FORMAT JSON), not executed again)
+# and the plan logged with the job context
+DB_QUERY_STATS_ENABLED = os.getenv("DB_QUERY_STATS_ENABLED", "true").lower() == "true"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "250") or "250")
+DB_SLOW_QUERY_SAMPLE_RATE = float(os.getenv("DB_SLOW_QUERY_SAMPLE_RATE", "0.1") or "0.1")
+
+# Write-behind llm_metrics sink, rows are flushed by size or interval (seconds)
+METRICS_SINK_ENABLED = os.getenv("METRICS_SINK_ENABLED", "true").lower() == "true"
+METRICS_SINK_BATCH_SIZE = int(os.getenv("METRICS_SINK_BATCH_SIZE", "100") or "100")
+METRICS_SINK_FLUSH_INTERVAL = float(os.getenv("METRICS_SINK_FLUSH_INTERVAL", "2") or "2")
+METRICS_SINK_MAX_QUEUE = int(os.getenv("METRICS_SINK_MAX_QUEUE", "10000") or "10000")
+METRICS_SINK_MAX_RETRIES = int(os.getenv("METRICS_SINK_MAX_RETRIES", "3") or "3")
+
+# Monthly partitions of llm_metrics and pipeline_outputs: premade months ahead, maintenance
+# interval (seconds) and retention in days (0 keeps everything). Expired partitions are
+# detached (kept as standalone tables for archiving) or dropped. Replaying a stage whose
+# output was swept re-runs the stage
+PARTITION_MANAGER_ENABLED = os.getenv("PARTITION_MANAGER_ENABLED", "true").lower() == "true"
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "2") or "2")
+PARTITION_SWEEP_INTERVAL = float(os.getenv("PARTITION_SWEEP_INTERVAL", "3600") or "3600")
+PARTITION_RETENTION_ACTION = os.getenv("PARTITION_RETENTION_ACTION", "detach").lower()
+LLM_METRICS_RETENTION_DAYS = int(os.getenv("LLM_METRICS_RETENTION_DAYS", "90") or "90")
+PIPELINE_OUTPUTS_RETENTION_DAYS = int(os.getenv("PIPELINE_OUTPUTS_RETENTION_DAYS", "180") or "180")
+
+# Similarity search retrieval: "exact" scans all of a user's sentences, "ann" pulls
+# SIMILARITY_CANDIDATE_DEPTH candidates from the HNSW index before blending, "halfvec" and
+# "binary" pull them from a quantized expression index (pgvector >= 0.7) and rerank them at
+# full precision; binary needs a deeper candidate set (e.g. 4x top_k x anchors or more).
+# "prefix" pulls candidates by the first SIMILARITY_PREFIX_DIMENSIONS dimensions only
+# (Matryoshka truncation of gemini-embedding-001) and rescores them with the full vector.
+# "centroid" ranks the user's notes by centroid first and only scores sentences of the
+# SIMILARITY_CENTROID_NOTES closest notes. "hybrid" fuses SIMILARITY_LEXICAL_DEPTH full-text
+# matches of the query text (GIN index, SIMILARITY_TEXT_SEARCH_CONFIG) with the HNSW candidates
+# by reciprocal rank fusion (constant SIMILARITY_RRF_K) before the importance / recency blend
+SIMILARITY_SEARCH_MODE = os.getenv("SIMILARITY_SEARCH_MODE", "exact").lower()
+SIMILARITY_CANDIDATE_DEPTH = int(os.getenv("SIMILARITY_CANDIDATE_DEPTH", "100") or "100")
+SIMILARITY_PREFIX_DIMENSIONS = int(os.getenv("SIMILARITY_PREFIX_DIMENSIONS", "256") or "256")
+SIMILARITY_CENTROID_NOTES = int(os.getenv("SIMILARITY_CENTROID_NOTES", "20") or "20")
+SIMILARITY_LEXICAL_DEPTH = int(os.getenv("SIMILARITY_LEXICAL_DEPTH", "100") or "100")
+SIMILARITY_RRF_K = int(os.getenv("SIMILARITY_RRF_K", "60") or "60")
+SIMILARITY_TEXT_SEARCH_CONFIG = os.getenv("SIMILARITY_TEXT_SEARCH_CONFIG", "english") or "english"
+# Keeps filtered HNSW scans full: "relaxed_order", "strict_order" or "off" (pgvector >= 0.8);
+# "auto" picks relaxed_order when the installed pgvector supports it
+SIMILARITY_HNSW_ITERATIVE_SCAN = os.getenv("SIMILARITY_HNSW_ITERATIVE_SCAN", "auto") or "auto"
+# Similarity result cache: LRU bounded by entries and approximate size (MB, 0 = entries
+# only), keyed by the user's corpus version so a change to the user's notes invalidates it
+SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "true").lower() == "true"
+SIMILARITY_CACHE_MAX_ENTRIES = int(os.getenv("SIMILARITY_CACHE_MAX_ENTRIES", "2000") or "2000")
+SIMILARITY_CACHE_MAX_MB = float(os.getenv("SIMILARITY_CACHE_MAX_MB", "64") or "64")
+
+# Optional in-process matrix tier: users with at least USER_MATRIX_MIN_SENTENCES sentences
+# are searched in memory (exhaustive NumPy scoring) within a USER_MATRIX_CACHE_MAX_MB budget,
+# the least recently searched users are evicted first
+USER_MATRIX_CACHE_ENABLED = os.getenv("USER_MATRIX_CACHE_ENABLED", "false").lower() == "true"
+USER_MATRIX_CACHE_MAX_MB = float(os.getenv("USER_MATRIX_CACHE_MAX_MB", "512") or "512")
+USER_MATRIX_MIN_SENTENCES = int(os.getenv("USER_MATRIX_MIN_SENTENCES", "2000") or "2000")
+
+# Engine-side sentence ingest: the STT / SMART stages write the note's sentences and
+# embeddings to note_sentences (binary COPY) and their output carries the sentences without
+# embeddings; the caller must stop inserting them when this is enabled
+SENTENCE_INGEST_ENABLED = os.getenv("SENTENCE_INGEST_ENABLED", "false").lower() == "true"
+
+# Concurrent embedding requests when a call needs several request-sized batches
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8") or "8")
+# Cross-request micro-batching: texts wait up to EMBEDDING_BATCH_MAX_WAIT_MS for others;
+# bypassed for models taking a single text per request (EMBEDDING_MODEL_MAX_BATCH)
+EMBEDDING_BATCHER_ENABLED = os.getenv("EMBEDDING_BATCHER_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "250") or "250")
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5") or "5")
+
+# Embedding cache: in-process LRU (entries, TTL seconds) backed by the embedding_cache table
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000") or "10000")
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "3600") or "3600")
+EMBEDDING_CACHE_PERSISTENT = os.getenv("EMBEDDING_CACHE_PERSISTENT", "true").lower() == "true"
+# Days an unused persistent cache entry is kept (0 = forever), swept by the partition manager
+EMBEDDING_CACHE_RETENTION_DAYS = int(os.getenv("EMBEDDING_CACHE_RETENTION_DAYS", "30") or "30")
+
 
 required_vars = {
     "GCP_PROJECT_ID": GCP_PROJECT_ID,
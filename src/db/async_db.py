@@ -0,0 +1,235 @@
+"""
+Async counterpart of the vector database interface, limited to the stage lifecycle the push
+handlers drive from the event loop (claim, replay of a completed output, failure, release).
+Pipelines run in the threadpool on the blocking Database; the SQL and row mapping both layers
+issue comes from db/queries.py.
+"""
+
+import psycopg
+import uuid
+from contextlib import asynccontextmanager
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from config.settings import (
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MAX_IDLE,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_TIMEOUT,
+    DB_REPLICA_DSN,
+    STAGE_LEASE_SECONDS,
+    PIPELINE_OUTPUTS_RETENTION_DAYS,
+)
+from common.logging import get_logger
+from db import queries
+from db.db import connection_kwargs, session_settings
+
+logger = get_logger(__name__)
+
+
+async def configure_connection(conn):
+    """
+    Async pool configure callback applying session_settings() to a new connection.
+    """
+    cursor = await conn.execute(queries.VECTOR_VERSION_QUERY)
+    row = await cursor.fetchone()
+    for name, value in session_settings(row[0] if row else None):
+        await conn.execute("SELECT set_config(%s, %s, false)", (name, value))
+
+
+class AsyncDatabase:
+    """
+    Async stage-lifecycle operations of Database.
+    Stage checkout and status updates awaited from the event loop neither block it nor
+    consume threadpool slots while waiting on Cloud SQL.
+    """
+
+    def __init__(self):
+        """
+        Create the async connection pools, opened by open().
+        """
+        self.pool = AsyncConnectionPool(
+            kwargs=connection_kwargs(),
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            max_idle=DB_POOL_MAX_IDLE,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            timeout=DB_POOL_TIMEOUT,
+            configure=configure_connection,
+            name="primary-async",
+            open=False,
+        )
+        self.replica_pool = None
+        if DB_REPLICA_DSN:
+            self.replica_pool = AsyncConnectionPool(
+                conninfo=DB_REPLICA_DSN,
+                kwargs={"autocommit": True},
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                max_idle=DB_POOL_MAX_IDLE,
+                max_lifetime=DB_POOL_MAX_LIFETIME,
+                timeout=DB_POOL_TIMEOUT,
+                configure=configure_connection,
+                name="replica-async",
+                open=False,
+            )
+
+    async def open(self):
+        """
+        Open the pool and wait until the minimum number of connections is ready.
+        Must be awaited from a running event loop (e.g. application lifespan).
+        """
+        await self.pool.open(wait=True, timeout=DB_POOL_TIMEOUT)
+        logger.debug(
+            "Async database connection pool opened",
+            extra={"min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE},
+        )
+        if self.replica_pool is not None:
+            # Not waited on: an unreachable replica must not block startup, reads fall back
+            await self.replica_pool.open(wait=False)
+
+    async def close(self):
+        """
+        Close the async connection pools.
+        """
+        try:
+            if not self.pool.closed:
+                await self.pool.close()
+                logger.debug("Async database connection pool closed")
+            if self.replica_pool is not None and not self.replica_pool.closed:
+                await self.replica_pool.close()
+                logger.debug("Async read replica connection pool closed")
+        except Exception as e:
+            logger.warning("Error closing async database connection", extra={"error": str(e)})
+
+    @asynccontextmanager
+    async def _cursor(self):
+        """
+        Check a connection out of the async pool and yield a cursor bound to it.
+        """
+        async with self.pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                yield cursor
+
+    async def _replica_read(self, query: str, params, fetch_all: bool = False):
+        """
+        Run a lag-tolerant read on the read replica, or on the primary when no replica is
+        configured or the replica cannot serve it (unreachable, recovery conflict).
+
+        Args:
+            query (str): SQL statement.
+            params: Statement parameters.
+            fetch_all (bool): If True, return every row instead of the first one.
+
+        Returns:
+            list | tuple: Fetched rows, or the first row (None when there is none).
+        """
+        if self.replica_pool is not None:
+            try:
+                async with self.replica_pool.connection() as conn:
+                    cursor = await conn.execute(query, params)
+                    return await (cursor.fetchall() if fetch_all else cursor.fetchone())
+            except (psycopg.OperationalError, PoolTimeout) as e:
+                logger.warning("Replica read failed, reading from primary", extra={"error": str(e)})
+
+        async with self._cursor() as cursor:
+            await cursor.execute(query, params)
+            return await (cursor.fetchall() if fetch_all else cursor.fetchone())
+
+    def pool_stats(self) -> dict:
+        """
+        Snapshot of async pool usage, including accumulated checkout wait time.
+        """
+        return self.pool.get_stats()
+
+    def replica_pool_stats(self) -> dict:
+        """
+        Snapshot of async read replica pool usage, empty when no replica is configured.
+        """
+        return self.replica_pool.get_stats() if self.replica_pool is not None else {}
+
+    async def read_stage_output(
+        self, pipeline_stage_id: uuid, include_embeddings: bool = True
+    ) -> dict:
+        """
+        Read pipeline output, from the read replica when one is configured.
+
+        Args:
+            pipeline_stage_id (uuid): ID of the pipeline stage to be read.
+            include_embeddings (bool): If False, the packed sentence embeddings are not read
+                and the sentences come back without them.
+
+        Returns:
+            dict: Dictionary containing output information.
+        """
+        query = (
+            queries.READ_STAGE_OUTPUT_QUERY
+            if include_embeddings
+            else queries.READ_STAGE_OUTPUT_DATA_QUERY
+        )
+        row = await self._replica_read(query, (pipeline_stage_id,))
+        if row is None and self.replica_pool is not None:
+            # The replica may not have replayed an output committed moments ago
+            async with self._cursor() as cursor:
+                await cursor.execute(query, (pipeline_stage_id,))
+                row = await cursor.fetchone()
+        return queries.stage_output_from_row(row)
+
+    async def claim_stage(self, job_id: uuid, pipeline_name: str, max_attempts: int) -> dict:
+        """
+        Atomically claim a stage for execution in a single statement.
+
+        Sets the stage IN_PROGRESS and increments its attempt count only if it is not
+        running under a live lease, not completed with an output, and below max_attempts.
+        A stage whose lease expired (no heartbeat for STAGE_LEASE_SECONDS) is taken over.
+
+        Args:
+            job_id (uuid): ID of the job.
+            pipeline_name (str): Name of the pipeline.
+            max_attempts (int): Attempt limit; stages at or above it are not claimed.
+
+        Returns:
+            dict: Stage information with "claimed" and "previous_status", or None if not found.
+        """
+        async with self._cursor() as cursor:
+            await cursor.execute(
+                queries.CLAIM_STAGE_QUERY,
+                queries.claim_params(
+                    job_id,
+                    pipeline_name,
+                    max_attempts,
+                    STAGE_LEASE_SECONDS,
+                    PIPELINE_OUTPUTS_RETENTION_DAYS,
+                ),
+            )
+            return queries.claimed_stage_from_row(await cursor.fetchone())
+
+    async def fail_stage(
+        self, pipeline_stage_id: uuid, error_message: str, attempt_count: int = None
+    ):
+        """
+        Mark the stage FAILED and record its error in a single statement.
+
+        Args:
+            pipeline_stage_id (uuid): ID of the pipeline stage.
+            error_message (str): Error recorded on the stage.
+            attempt_count (int, optional): Lease held by the caller, see Database.complete_stage().
+        """
+        async with self._cursor() as cursor:
+            await cursor.execute(
+                queries.FAIL_STAGE_QUERY,
+                queries.fail_params(pipeline_stage_id, error_message, attempt_count),
+            )
+
+    async def release_stage(self, pipeline_stage_id: uuid, attempt_count: int = None):
+        """
+        Return a running stage to PENDING so a redelivery can claim it again.
+
+        Args:
+            pipeline_stage_id (uuid): ID of the pipeline stage.
+            attempt_count (int, optional): Lease held by the caller, see Database.complete_stage().
+        """
+        async with self._cursor() as cursor:
+            await cursor.execute(
+                queries.RELEASE_STAGE_QUERY,
+                queries.release_params(pipeline_stage_id, attempt_count),
+            )
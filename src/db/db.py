@@ -4,74 +4,481 @@ Uses PostgreSQL with pgvector for efficient similarity search and context retrie
 """
 
 import psycopg
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from psycopg.types.json import Json
+from psycopg_pool import ConnectionPool, PoolTimeout
 from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
-from config.settings import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
-from config.config import Llm_Call
+from config.settings import (
+    APP_ENV,
+    DB_HOST,
+    DB_PORT,
+    DB_USER,
+    DB_PASSWORD,
+    DB_NAME,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MAX_IDLE,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_TIMEOUT,
+    DB_RUN_MIGRATIONS,
+    DB_REPLICA_DSN,
+    DB_QUERY_STATS_ENABLED,
+    DB_SLOW_QUERY_MS,
+    DB_SLOW_QUERY_SAMPLE_RATE,
+    STAGE_LEASE_SECONDS,
+    METRICS_SINK_ENABLED,
+    METRICS_SINK_BATCH_SIZE,
+    METRICS_SINK_FLUSH_INTERVAL,
+    METRICS_SINK_MAX_QUEUE,
+    METRICS_SINK_MAX_RETRIES,
+    PARTITION_MANAGER_ENABLED,
+    PARTITION_PREMAKE_MONTHS,
+    PARTITION_SWEEP_INTERVAL,
+    PARTITION_RETENTION_ACTION,
+    LLM_METRICS_RETENTION_DAYS,
+    PIPELINE_OUTPUTS_RETENTION_DAYS,
+    SIMILARITY_SEARCH_MODE,
+    SIMILARITY_CANDIDATE_DEPTH,
+    SIMILARITY_PREFIX_DIMENSIONS,
+    SIMILARITY_CENTROID_NOTES,
+    SIMILARITY_LEXICAL_DEPTH,
+    SIMILARITY_RRF_K,
+    SIMILARITY_TEXT_SEARCH_CONFIG,
+    SIMILARITY_HNSW_ITERATIVE_SCAN,
+    SIMILARITY_CACHE_ENABLED,
+    SIMILARITY_CACHE_MAX_ENTRIES,
+    SIMILARITY_CACHE_MAX_MB,
+    USER_MATRIX_CACHE_ENABLED,
+    USER_MATRIX_CACHE_MAX_MB,
+    USER_MATRIX_MIN_SENTENCES,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_BATCHER_ENABLED,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_WAIT_MS,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_TTL,
+    EMBEDDING_CACHE_PERSISTENT,
+    EMBEDDING_CACHE_RETENTION_DAYS,
+)
+from config.config import (
+    Llm_Call,
+    Similarity_Search_Mode,
+    Embedding_Models,
+    EMBEDDING_MODEL_MAX_BATCH,
+    DEFAULT_EMBEDDING_MAX_BATCH,
+)
+from db import queries, schema
+from db.embedding_batcher import EmbeddingBatcher
+from db.embedding_cache import EmbeddingCache, embedding_cache_key
+from db.metrics_sink import MetricsSink
+from db.partitions import PartitionManager
+from db.matrix_cache import UserMatrix, UserMatrixCache
+from db.result_cache import SimilarityResultCache, similarity_cache_key
+from db.query_stats import QueryStats, TimedCursor, statement_labels
+from db.stage_outputs import split_embeddings
 from common.logging import get_logger
 
 logger = get_logger(__name__)
 
 
+def connection_kwargs() -> dict:
+    """
+    Build psycopg connection arguments for the configured host.
+
+    Returns:
+        dict: Keyword arguments accepted by psycopg.connect and the connection pools.
+    """
+    kwargs = {
+        "dbname": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "host": DB_HOST,
+        "autocommit": True,
+    }
+    # If DB_HOST starts with /cloudsql, it's a Unix Socket (Cloud Run) and no port is needed
+    # Otherwise, it's a standard IP/Hostname (Local Dev)
+    if not DB_HOST.startswith("/cloudsql"):
+        kwargs["port"] = DB_PORT
+    return kwargs
+
+
+def supports_iterative_scan(vector_version: str) -> bool:
+    """
+    Whether a pgvector version (extversion, e.g. "0.8.0") has HNSW iterative index scans.
+    """
+    try:
+        return tuple(int(part) for part in vector_version.split(".")[:2]) >= (0, 8)
+    except (AttributeError, ValueError):
+        return False
+
+
+def session_settings(vector_version: str = None) -> list[tuple[str, str]]:
+    """
+    Session settings applied to every pooled connection when it is opened.
+
+    Args:
+        vector_version (str, optional): Installed pgvector version, resolves the "auto"
+            iterative scan setting.
+
+    Returns:
+        list: (name, value) pairs for set_config.
+    """
+    # ef_search bounds how many HNSW candidates a scan can return, pgvector caps it at 1000
+    settings = [("hnsw.ef_search", str(min(max(SIMILARITY_CANDIDATE_DEPTH, 40), 1000)))]
+    # Without iterative scans the user_id filter applies after the ef_search candidates, so a
+    # user holding a small share of the index can get fewer rows than asked
+    iterative_scan = SIMILARITY_HNSW_ITERATIVE_SCAN
+    if iterative_scan == "auto":
+        iterative_scan = "relaxed_order" if supports_iterative_scan(vector_version) else ""
+    if iterative_scan:
+        settings.append(("hnsw.iterative_scan", iterative_scan))
+    return settings
+
+
+def configure_connection(conn: psycopg.Connection):
+    """
+    Pool configure callback applying session_settings() to a new connection.
+    """
+    row = conn.execute(queries.VECTOR_VERSION_QUERY).fetchone()
+    for name, value in session_settings(row[0] if row else None):
+        conn.execute("SELECT set_config(%s, %s, false)", (name, value))
+
+
 # TODO: Migrate module from vertexai.language_models to google-genai
 class Database:
     """
     Handles connection and operations with the vector database.
     Provides methods for embedding generation, data insertion, and similarity search.
+
+    Every operation checks a connection out of a bounded pool for the duration of one call,
+    so concurrent pipeline threads never share a connection or cursor.
     """
 
     def __init__(self):
         """
-        Establish connection to the PostgreSQL database and initialize the embedding model.
+        Open the PostgreSQL connection pool and initialize the embedding model.
         """
         try:
-            # If DB_HOST starts with /cloudsql, it's a Unix Socket (Cloud Run)
-            # Otherwise, it's a standard IP/Hostname (Local Dev)
-            if DB_HOST.startswith("/cloudsql"):
-                # Connection for Cloud Run
-                self.conn = psycopg.connect(
-                    dbname=DB_NAME,
-                    user=DB_USER,
-                    password=DB_PASSWORD,
-                    host=DB_HOST,  # Path like /cloudsql/project:region:instance
-                    # No port needed for Unix sockets
+            # Job context is per thread, each pipeline job runs on its own thread
+            self._local = threading.local()
+            self.query_stats = None
+            cursor_factory = TimedCursor
+            if DB_QUERY_STATS_ENABLED:
+                self.query_stats = QueryStats(
+                    slow_ms=DB_SLOW_QUERY_MS,
+                    sample_rate=DB_SLOW_QUERY_SAMPLE_RATE,
+                    labels=statement_labels(queries),
+                    context=self._job_context,
                 )
-            else:
-                # Connection for Local Dev
-                self.conn = psycopg.connect(
-                    dbname=DB_NAME,
-                    user=DB_USER,
-                    password=DB_PASSWORD,
-                    host=DB_HOST,
-                    port=DB_PORT,
+                cursor_factory = self.query_stats.cursor_factory()
+
+            self.pool = ConnectionPool(
+                kwargs={**connection_kwargs(), "cursor_factory": cursor_factory},
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                max_idle=DB_POOL_MAX_IDLE,
+                max_lifetime=DB_POOL_MAX_LIFETIME,
+                timeout=DB_POOL_TIMEOUT,
+                configure=configure_connection,
+                name="primary",
+                open=True,
+            )
+            # Fail startup fast when the database is unreachable instead of on the first job
+            self.pool.wait(timeout=DB_POOL_TIMEOUT)
+            logger.debug(
+                "Database connection pool opened",
+                extra={"min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE},
+            )
+            # Not waited on: an unreachable replica must not block startup, reads fall back
+            self.replica_pool = None
+            if DB_REPLICA_DSN:
+                self.replica_pool = ConnectionPool(
+                    conninfo=DB_REPLICA_DSN,
+                    kwargs={"autocommit": True, "cursor_factory": cursor_factory},
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    timeout=DB_POOL_TIMEOUT,
+                    configure=configure_connection,
+                    name="replica",
+                    open=True,
                 )
-            self.conn.autocommit = True
-            self.cursor = self.conn.cursor()
-            logger.debug("Database connection established")
+                logger.debug("Read replica connection pool opened")
+
+            if DB_RUN_MIGRATIONS:
+                with self.pool.connection() as conn:
+                    applied = schema.apply_migrations(conn)
+                if applied:
+                    logger.info("Schema migrations applied", extra={"versions": applied})
 
-            self.embedding_model = TextEmbeddingModel.from_pretrained("gemini-embedding-001")
+            self.embedding_model_name = Embedding_Models.GEMINI_EMBEDDING_001
+            self.embedding_model = TextEmbeddingModel.from_pretrained(self.embedding_model_name)
             self.embedding_dimensionality = 1536
+            self.embedding_max_batch = EMBEDDING_MODEL_MAX_BATCH.get(
+                self.embedding_model_name, DEFAULT_EMBEDDING_MAX_BATCH
+            )
+            self._embedding_executor = ThreadPoolExecutor(
+                max_workers=EMBEDDING_MAX_CONCURRENCY, thread_name_prefix="embedding"
+            )
+            # Shared by every pipeline thread so concurrent jobs' texts go out together; a
+            # model taking one text per request gains nothing from waiting for others
+            self.embedding_batcher = None
+            if EMBEDDING_BATCHER_ENABLED and self.embedding_max_batch > 1:
+                self.embedding_batcher = EmbeddingBatcher(
+                    self._send_embedding_requests,
+                    max_batch=EMBEDDING_BATCH_MAX_SIZE,
+                    max_wait=EMBEDDING_BATCH_MAX_WAIT_MS / 1000,
+                    max_inflight=EMBEDDING_MAX_CONCURRENCY,
+                )
+            self.embedding_cache = None
+            if EMBEDDING_CACHE_ENABLED:
+                self.embedding_cache = EmbeddingCache(
+                    EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_TTL
+                )
+            self.result_cache = None
+            if SIMILARITY_CACHE_ENABLED:
+                self.result_cache = SimilarityResultCache(
+                    SIMILARITY_CACHE_MAX_ENTRIES, int(SIMILARITY_CACHE_MAX_MB * 1024 * 1024)
+                )
+            self.matrix_cache = None
+            if USER_MATRIX_CACHE_ENABLED:
+                self.matrix_cache = UserMatrixCache(
+                    int(USER_MATRIX_CACHE_MAX_MB * 1024 * 1024), USER_MATRIX_MIN_SENTENCES
+                )
+            self.search_mode = Similarity_Search_Mode(SIMILARITY_SEARCH_MODE)
+            self.candidate_depth = SIMILARITY_CANDIDATE_DEPTH
+            self.prefix_dimensions = SIMILARITY_PREFIX_DIMENSIONS
+            self.note_depth = SIMILARITY_CENTROID_NOTES
+            self.lexical_depth = SIMILARITY_LEXICAL_DEPTH
+            self.rrf_k = SIMILARITY_RRF_K
+            self.text_search_config = SIMILARITY_TEXT_SEARCH_CONFIG
+            if DB_RUN_MIGRATIONS and self.search_mode in schema.SEARCH_MODE_INDEXES:
+                with self.pool.connection() as conn:
+                    schema.ensure_search_mode_index(
+                        conn,
+                        self.search_mode,
+                        self.embedding_dimensionality,
+                        self.prefix_dimensions,
+                        self.text_search_config,
+                    )
+
+            self.partition_manager = None
+            if PARTITION_MANAGER_ENABLED:
+                self.partition_manager = PartitionManager(
+                    self.pool,
+                    {
+                        "llm_metrics": LLM_METRICS_RETENTION_DAYS,
+                        "pipeline_outputs": PIPELINE_OUTPUTS_RETENTION_DAYS,
+                    },
+                    months_ahead=PARTITION_PREMAKE_MONTHS,
+                    interval=PARTITION_SWEEP_INTERVAL,
+                    action=PARTITION_RETENTION_ACTION,
+                    embedding_cache_retention_days=(
+                        EMBEDDING_CACHE_RETENTION_DAYS if EMBEDDING_CACHE_PERSISTENT else 0
+                    ),
+                )
+                # Premake this month's partitions before the first insert can reach DEFAULT
+                self.partition_manager.run_once()
+
+            self.metrics_sink = None
+            if METRICS_SINK_ENABLED:
+                self.metrics_sink = MetricsSink(
+                    self.pool,
+                    batch_size=METRICS_SINK_BATCH_SIZE,
+                    flush_interval=METRICS_SINK_FLUSH_INTERVAL,
+                    max_queue=METRICS_SINK_MAX_QUEUE,
+                    max_retries=METRICS_SINK_MAX_RETRIES,
+                )
+
         except psycopg.errors.UndefinedColumn as e:
             logger.critical("Schema mismatch: %s", e)
             raise
 
+    @contextmanager
+    def _cursor(self):
+        """
+        Check a connection out of the pool and yield a cursor bound to it.
+        The connection is returned to the pool when the block exits.
+        """
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+    def _job_context(self) -> dict:
+        """
+        Job the calling thread is working on, logged with captured slow-query plans.
+        """
+        job_id = getattr(self._local, "job_id", None)
+        return {"job_id": job_id} if job_id else {}
+
+    def _replica_read(
+        self,
+        query: str,
+        params,
+        fetch_all: bool = False,
+        label: str = None,
+        context: dict = None,
+    ):
+        """
+        Run a lag-tolerant read on the read replica, or on the primary when no replica is
+        configured or the replica cannot serve it (unreachable, recovery conflict).
+
+        Args:
+            query (str): SQL statement.
+            params: Statement parameters.
+            fetch_all (bool): If True, return every row instead of the first one.
+            label (str, optional): Statement name for query stats, derived from query if None.
+            context (dict, optional): Logged with the plan if the statement is captured as slow.
+
+        Returns:
+            list | tuple: Fetched rows, or the first row (None when there is none).
+        """
+        if self.replica_pool is not None:
+            try:
+                with self.replica_pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(query, params, label=label, context=context)
+                        return cursor.fetchall() if fetch_all else cursor.fetchone()
+            except (psycopg.OperationalError, PoolTimeout) as e:
+                logger.warning("Replica read failed, reading from primary", extra={"error": str(e)})
+
+        with self._cursor() as cursor:
+            cursor.execute(query, params, label=label, context=context)
+            return cursor.fetchall() if fetch_all else cursor.fetchone()
+
+    @contextmanager
+    def job_scope(self, job_id: str = None):
+        """
+        Tag statements issued by the current thread with the job they run for, logged with
+        captured slow-query plans.
+
+        Args:
+            job_id (str, optional): Job the calling thread is working on.
+        """
+        self._local.job_id = job_id
+        try:
+            yield
+        finally:
+            self._local.job_id = None
+
+    def _write(self, query: str, params, returning: bool = False):
+        """
+        Execute a write on a pooled connection.
+
+        Args:
+            query (str): SQL statement.
+            params: Statement parameters.
+            returning (bool): If True, return the first column of the first row.
+
+        Returns:
+            any: Returned value, or None when nothing is returned.
+        """
+        with self._cursor() as cursor:
+            cursor.execute(query, params)
+            if returning:
+                row = cursor.fetchone()
+                return row[0] if row else None
+        return None
+
+    def verify_schema(self) -> list[dict]:
+        """
+        Check the indexes the hot queries rely on, building missing ones when migrations are
+        enabled. Missing indexes are logged with their cost; in production a missing critical
+        index aborts startup.
+
+        Returns:
+            list[dict]: Required index entries still missing (see schema.REQUIRED_INDEXES).
+
+        Raises:
+            SchemaVerificationError: If a critical index is missing in production.
+        """
+        with self.pool.connection() as conn:
+            missing = schema.verify_indexes(
+                conn,
+                self.search_mode,
+                build=DB_RUN_MIGRATIONS,
+                production=APP_ENV.lower() in ("production", "prod"),
+            )
+        if not missing:
+            logger.info("Required indexes verified")
+        return missing
+
+    def pool_stats(self) -> dict:
+        """
+        Snapshot of pool usage, including accumulated checkout wait time.
+
+        Returns:
+            dict: psycopg_pool statistics (pool_size, pool_available, requests_wait_ms, ...).
+        """
+        return self.pool.get_stats()
+
+    def query_stats_snapshot(self) -> dict:
+        """
+        Per-statement latency histograms, empty when query stats are disabled.
+        """
+        return self.query_stats.stats() if self.query_stats is not None else {}
+
+    def result_cache_stats(self) -> dict:
+        """
+        Snapshot of similarity result cache hit rate, evictions and size.
+        """
+        return self.result_cache.stats() if self.result_cache else {}
+
+    def matrix_cache_stats(self) -> dict:
+        """
+        Snapshot of matrix tier hits, appends, loads, evictions and memory use.
+        """
+        return self.matrix_cache.stats() if self.matrix_cache else {}
+
+    def replica_pool_stats(self) -> dict:
+        """
+        Snapshot of read replica pool usage, empty when no replica is configured.
+        """
+        return self.replica_pool.get_stats() if self.replica_pool is not None else {}
+
+    def embedding_batcher_stats(self) -> dict:
+        """
+        Snapshot of micro-batcher requests, dispatched batches and texts sent.
+        """
+        return self.embedding_batcher.stats() if self.embedding_batcher else {}
+
+    def embedding_cache_stats(self) -> dict:
+        """
+        Snapshot of embedding cache hits (memory and table), misses and size.
+        """
+        return self.embedding_cache.stats() if self.embedding_cache else {}
+
     def close(self):
         """
-        Explicitly close the database connection.
+        Explicitly close the database connection pool.
         """
         try:
-            if hasattr(self, "cursor") and self.cursor:
-                self.cursor.close()
-            if hasattr(self, "conn") and self.conn:
-                self.conn.close()
-            logger.debug("Database connection closed")
+            if getattr(self, "embedding_batcher", None) is not None:
+                self.embedding_batcher.close()
+            if getattr(self, "_embedding_executor", None) is not None:
+                self._embedding_executor.shutdown(wait=False)
+            if getattr(self, "partition_manager", None) is not None:
+                self.partition_manager.close()
+            # Drain buffered metrics while the pool is still open
+            if getattr(self, "metrics_sink", None) is not None:
+                self.metrics_sink.close()
+            if getattr(self, "pool", None) is not None and not self.pool.closed:
+                self.pool.close()
+                logger.debug("Database connection pool closed")
+            if getattr(self, "replica_pool", None) is not None and not self.replica_pool.closed:
+                self.replica_pool.close()
+                logger.debug("Read replica connection pool closed")
         except Exception as e:
             logger.warning("Error closing database connection", extra={"error": str(e)})
 
     def __del__(self):
         """
-        Attempt to close the connection on object destruction.
+        Attempt to close the pool on object destruction.
         """
         self.close()
 
@@ -85,19 +492,7 @@ class Database:
         Returns:
             tuple: (embedding_values, char_count)
         """
-        dimensionality = self.embedding_dimensionality
-        task = "RETRIEVAL_QUERY"
-        model = self.embedding_model
-
-        text_input = TextEmbeddingInput(text, task)
-        if dimensionality:
-            embedding_response = model.get_embeddings(
-                [text_input], output_dimensionality=dimensionality
-            )
-        else:
-            embedding_response = model.get_embeddings([text_input])
-
-        return embedding_response[0].values, len(text)
+        return self._embed_texts([text], "RETRIEVAL_QUERY")[0], len(text)
 
     def _generate_sentence_embedding(self, sentence: str) -> tuple[list[float], int]:
         """
@@ -109,64 +504,200 @@ class Database:
         Returns:
             tuple: (embedding_values, char_count)
         """
-        dimensionality = self.embedding_dimensionality
-        task = "RETRIEVAL_DOCUMENT"
-        model = self.embedding_model
+        return self._embed_texts([sentence], "RETRIEVAL_DOCUMENT")[0], len(sentence)
+
+    def generate_sentence_embeddings(self, sentences: list[str]) -> tuple[list[list[float]], int]:
+        """
+        Generate embeddings for many document sentences in one call.
+        Sentences are sent in batches sized to the model's request limit, up to
+        EMBEDDING_MAX_CONCURRENCY batches at a time, and cached sentences are skipped.
 
-        text_input = TextEmbeddingInput(sentence, task)
-        if dimensionality:
-            embedding_response = model.get_embeddings(
-                [text_input], output_dimensionality=dimensionality
+        Args:
+            sentences (list[str]): Sentence texts.
+
+        Returns:
+            tuple: (list of embedding_values in input order, total char_count)
+        """
+        embeddings = self._embed_texts(sentences, "RETRIEVAL_DOCUMENT")
+        return embeddings, sum(len(sentence) for sentence in sentences)
+
+    def _embed_texts(self, texts: list[str], task: str) -> list[list[float]]:
+        """
+        Embed several texts, answering from the embedding cache before calling the model.
+        Lookups go memory, then the embedding_cache table, then the model; new embeddings
+        are written back to both levels. Results keep the input order.
+
+        Args:
+            texts (list[str]): Texts to embed.
+            task (str): Embedding task type (RETRIEVAL_QUERY or RETRIEVAL_DOCUMENT).
+
+        Returns:
+            list: One embedding per input text.
+        """
+        if self.embedding_cache is None:
+            return self._request_embeddings(texts, task)
+
+        keys = [
+            embedding_cache_key(
+                text, task, self.embedding_model_name, self.embedding_dimensionality
             )
+            for text in texts
+        ]
+        found = self.embedding_cache.get_many(keys)
+        pending = {key: text for key, text in zip(keys, texts) if key not in found}
+
+        if pending and EMBEDDING_CACHE_PERSISTENT:
+            stored = self._read_cached_embeddings(list(pending))
+            self.embedding_cache.put_many(stored)
+            self.embedding_cache.record(db_hits=len(stored))
+            found.update(stored)
+            for key in stored:
+                del pending[key]
+
+        if pending:
+            computed = dict(zip(pending, self._request_embeddings(list(pending.values()), task)))
+            self.embedding_cache.put_many(computed)
+            self.embedding_cache.record(misses=len(computed))
+            found.update(computed)
+            if EMBEDDING_CACHE_PERSISTENT:
+                self._write_cached_embeddings(computed)
+
+        return [found[key] for key in keys]
+
+    def _read_cached_embeddings(self, keys: list[tuple]) -> dict:
+        """
+        Fetch stored embeddings for cache keys; a failed lookup counts as a miss.
+        """
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(queries.READ_EMBEDDINGS_QUERY, queries.read_embeddings_params(keys))
+                return queries.cached_embeddings_from_rows(cursor.fetchall(), keys)
+        except psycopg.Error as e:
+            logger.warning("Embedding cache lookup failed", extra={"error": str(e)})
+            return {}
+
+    def _write_cached_embeddings(self, entries: dict):
+        """
+        Store new embeddings; a failed write only costs a later cache miss.
+        """
+        try:
+            with self._cursor() as cursor:
+                cursor.executemany(
+                    queries.WRITE_EMBEDDING_QUERY, queries.write_embeddings_params(entries)
+                )
+        except psycopg.Error as e:
+            logger.warning("Embedding cache write failed", extra={"error": str(e)})
+
+    def _request_embeddings(self, texts: list[str], task: str) -> list[list[float]]:
+        """
+        Embed texts with the model, joining the shared micro-batch when it is enabled.
+
+        Args:
+            texts (list[str]): Texts to embed.
+            task (str): Embedding task type (RETRIEVAL_QUERY or RETRIEVAL_DOCUMENT).
+
+        Returns:
+            list: One embedding per input text.
+        """
+        if self.embedding_batcher is not None:
+            return self.embedding_batcher.embed(texts, task)
+        return self._send_embedding_requests(texts, task)
+
+    def _send_embedding_requests(self, texts: list[str], task: str) -> list[list[float]]:
+        """
+        Embed several texts with the model, split into request-sized batches.
+        Batches are sent concurrently and results keep the input order.
+
+        Args:
+            texts (list[str]): Texts to embed.
+            task (str): Embedding task type (RETRIEVAL_QUERY or RETRIEVAL_DOCUMENT).
+
+        Returns:
+            list: One embedding per input text.
+        """
+        inputs = [TextEmbeddingInput(text, task) for text in texts]
+        batches = [
+            inputs[i : i + self.embedding_max_batch]
+            for i in range(0, len(inputs), self.embedding_max_batch)
+        ]
+        if len(batches) <= 1:
+            responses = [self._embed_batch(batch) for batch in batches]
         else:
-            embedding_response = model.get_embeddings([text_input])
+            responses = self._embedding_executor.map(self._embed_batch, batches)
+        return [values for response in responses for values in response]
 
-        return embedding_response[0].values, len(sentence)
+    def _embed_batch(self, batch: list[TextEmbeddingInput]) -> list[list[float]]:
+        """
+        Send one embedding request.
+        """
+        embedding_response = self.embedding_model.get_embeddings(
+            batch, output_dimensionality=self.embedding_dimensionality
+        )
+        return [embedding.values for embedding in embedding_response]
 
-    # def insert_sentences(self, user_id: str, note_id: str, sentences: list[dict]) -> int:
-    #     """
-    #     Insert multiple sentences with their embeddings into the database.
+    def _generate_query_embeddings(self, texts: list[str]) -> tuple[list[list[float]], int]:
+        """
+        Generate embeddings for several search queries at once.
 
-    #     Args:
-    #         user_id (str): ID of the user owning the note.
-    #         note_id (str): ID of the note.
-    #         sentences (list[dict]): List of dictionaries containing sentence text and metadata.
+        Args:
+            texts (list[str]): Query texts.
 
-    #     Returns:
-    #         int: Total characters processed for billing/tracking purposes.
-    #     """
-    #     insert_query = """
-    #     INSERT INTO note_sentences (user_id, note_id, sentence_index, sentence_text, embedding, importance_score)
-    #     VALUES (%s, %s, %s, %s, %s, %s)
-    #     ON CONFLICT (user_id, note_id, sentence_index) DO NOTHING;
-    #     """
-    #     total_chars = 0
-    #     for sentence in sentences:
-    #         sentence_index = sentence["sentence_index"]
-    #         sentence_text = sentence["sentence_text"]
-    #         embedding, char_count = self._generate_sentence_embedding(sentence_text)
-    #         total_chars += char_count
-    #         importance_score = sentence.get("importance_score", 0)
-    #         self.cursor.execute(
-    #             insert_query,
-    #             (
-    #                 user_id,
-    #                 note_id,
-    #                 sentence_index,
-    #                 sentence_text,
-    #                 embedding,
-    #                 importance_score,
-    #             ),
-    #         )
-    #     logger.debug(
-    #         "Sentences inserted into database",
-    #         extra={"count": len(sentences), "user_id": user_id, "note_id": note_id},
-    #     )
-    #     return total_chars
+        Returns:
+            tuple: (list of embedding_values, total char_count)
+        """
+        return self._embed_texts(texts, "RETRIEVAL_QUERY"), sum(len(text) for text in texts)
+
+    def ingest_sentences(self, user_id: str, note_id: str, sentences: list[dict]) -> int:
+        """
+        Write a note's sentences and embeddings into note_sentences with binary COPY.
+
+        The rows are staged and merged in one transaction on the primary, idempotent on
+        (user_id, note_id, sentence_index): replays leave unchanged rows alone and sentences
+        no longer in the note are removed. The per-user stats and note centroids are updated
+        by their triggers in the same transaction, so the note is searchable on commit.
+
+        Args:
+            user_id (str): ID of the user owning the note.
+            note_id (str): ID of the note.
+            sentences (list[dict]): Dicts with sentence_index, sentence_text, embedding and
+                importance_score.
+
+        Returns:
+            int: Number of sentences inserted or changed.
+        """
+        rows = queries.staged_sentence_rows(sentences)
+        params = {"user_id": user_id, "note_id": note_id}
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                with conn.cursor() as cursor:
+                    cursor.execute(queries.CREATE_SENTENCE_STAGING_QUERY)
+                    with cursor.copy(queries.COPY_SENTENCE_STAGING_QUERY) as copy:
+                        copy.set_types(queries.SENTENCE_STAGING_TYPES)
+                        for row in rows:
+                            copy.write_row(row)
+                    cursor.execute(queries.MERGE_STAGED_SENTENCES_QUERY, params)
+                    written = cursor.rowcount
+                    cursor.execute(queries.DELETE_UNSTAGED_SENTENCES_QUERY, params)
+                    removed = cursor.rowcount
+
+        logger.debug(
+            "Sentences ingested",
+            extra={
+                "user_id": user_id,
+                "note_id": note_id,
+                "count": len(rows),
+                "written": written,
+                "removed": removed,
+            },
+        )
+        return written
 
     def similarity_search(self, user_id: str, query: str, top_k: int = 5) -> tuple[list[dict], int]:
         """
         Perform a hybrid similarity search considering distance, importance, and recency.
+        In ANN mode candidates come from the HNSW index and only they are blended; hybrid
+        mode fuses them with full-text matches of the query text. Index-candidate searches
+        returning fewer than top_k rows are rerun in exact mode.
 
         Args:
             user_id (str): User ID context.
@@ -178,106 +709,236 @@ class Database:
         """
         query_embedding, query_chars = self._generate_query_embedding(query)
 
-        search_query = """
-        WITH ranked_notes AS (
-            SELECT
-                sentence_index,
-                sentence_text,
-                embedding <=> %s::vector AS distance,
-                importance_score,
-                EXTRACT(EPOCH FROM created_at) AS ts_epoch
-            FROM note_sentences
-            WHERE user_id = %s
-        )
-        , stats AS (
-            SELECT
-                MAX(importance_score) AS max_importance,
-                MIN(ts_epoch) AS min_ts,
-                MAX(ts_epoch) AS max_ts
-            FROM ranked_notes
-        )
-        SELECT
-            rn.sentence_index,
-            rn.sentence_text,
-            rn.distance,
-            rn.importance_score,
-            rn.ts_epoch,
-            (1 / (1 + rn.distance)) * 0.6 +
-            (rn.importance_score / NULLIF(s.max_importance, 0)) * 0.2 +
-            ((rn.ts_epoch - s.min_ts) / NULLIF(s.max_ts - s.min_ts, 0)) * 0.2 AS combined_score
-        FROM ranked_notes rn
-        CROSS JOIN stats s
-        ORDER BY combined_score DESC
-        LIMIT %s;
-        """
-
-        self.cursor.execute(search_query, (str(query_embedding), user_id, top_k))
-        results = self.cursor.fetchall()
-
-        similar_sentences = [
-            {
-                "sentence_index": row[0],
-                "sentence_text": row[1],
-                "distance": row[2],
-                "importance_score": row[3],
-                "timestamp_epoch": row[4],
-                "combined_score": row[5],
-            }
-            for row in results
-        ]
+        state = self._corpus_state(user_id)
+        cache_key = self._result_cache_key(user_id, state, top_k, [query_embedding])
+        if cache_key is not None:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached, query_chars
+
+        matrix = self._user_matrix(user_id, state)
+        if matrix is not None:
+            results = matrix.rank(query_embedding, top_k)
+        else:
+            search_query, params = queries.similarity_search_statement(
+                self.search_mode,
+                query_embedding,
+                user_id,
+                top_k,
+                self.candidate_depth,
+                self.prefix_dimensions,
+                self.note_depth,
+                query_text=query,
+                lexical_depth=self.lexical_depth,
+                rrf_k=self.rrf_k,
+                text_search_config=self.text_search_config,
+            )
+            results = self._replica_read(
+                search_query,
+                params,
+                fetch_all=True,
+                label=f"similarity_search.{self.search_mode.value}",
+                context={"user_id": user_id, "top_k": top_k},
+            )
+            if queries.needs_exact_fallback(self.search_mode, results, top_k):
+                search_query, params = queries.similarity_search_statement(
+                    Similarity_Search_Mode.EXACT, query_embedding, user_id, top_k, top_k
+                )
+                results = self._replica_read(
+                    search_query,
+                    params,
+                    fetch_all=True,
+                    label="similarity_search.exact_fallback",
+                    context={"user_id": user_id, "top_k": top_k},
+                )
+
+        similar_sentences = queries.similarity_results_from_rows(results)
+        if cache_key is not None:
+            self.result_cache.put(cache_key, similar_sentences)
         logger.debug(
             "Similarity search performed", extra={"user_id": user_id, "query_preview": query[:50]}
         )
         return similar_sentences, query_chars
 
-    # Table llm_metrics {
-    # id uuid [pk]
-    # pipeline_stage_id uuid [not null]
-    # llm_call enum
-    # input_tokens int
-    # prompt_tokens int
-    # total_input_tokens int
-    # output_tokens int
-    # thought_tokens int
-    # confidence_score float
-    # elapsed_time float
-    # }
+    def similarity_search_many(
+        self, user_id: str, anchors: list[str], top_k: int = 5, exclude_note_id: str = None
+    ) -> tuple[list[dict], int]:
+        """
+        Search several anchors in one SQL round trip and drop duplicate sentences.
 
-    # Table pipeline_stages {
-    # id uuid [pk]
+        All anchors are embedded together, ranked per anchor (top_k each) in a single
+        statement, and sentences matched by several anchors are kept once with their
+        best score.
 
-    # job_id uuid [not null]
-    # pipeline_name enum
+        Args:
+            user_id (str): User ID context.
+            anchors (list[str]): Search query texts.
+            top_k (int): Number of top results per anchor.
+            exclude_note_id (str, optional): Note whose sentences are not searched, e.g. the
+                note being processed when an earlier attempt already ingested it.
 
-    # status enum('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED')
+        Returns:
+            tuple: (List of result dictionaries ordered by score, total query character count)
+        """
+        if not anchors:
+            return [], 0
 
-    # attempt_count int [default: 0]
-    # last_heartbeat timestamp
-    # error_message text
+        anchor_embeddings, query_chars = self._generate_query_embeddings(anchors)
 
-    # started_at timestamp
-    # completed_at timestamp
+        state = self._corpus_state(user_id)
+        cache_key = self._result_cache_key(
+            user_id, state, top_k, anchor_embeddings, exclude_note_id
+        )
+        if cache_key is not None:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached, query_chars
+
+        matrix = self._user_matrix(user_id, state)
+        if matrix is not None:
+            results = matrix.rank_many(anchor_embeddings, top_k, exclude_note_id)
+        else:
+            search_query, params = queries.multi_anchor_search_statement(
+                self.search_mode,
+                anchor_embeddings,
+                user_id,
+                top_k,
+                self.candidate_depth,
+                self.prefix_dimensions,
+                self.note_depth,
+                anchor_texts=anchors,
+                lexical_depth=self.lexical_depth,
+                rrf_k=self.rrf_k,
+                text_search_config=self.text_search_config,
+                exclude_note_id=exclude_note_id,
+            )
+            results = self._replica_read(
+                search_query,
+                params,
+                fetch_all=True,
+                label=f"similarity_search_many.{self.search_mode.value}",
+                context={"user_id": user_id, "top_k": top_k, "anchors": len(anchors)},
+            )
+            if queries.needs_exact_fallback(self.search_mode, results, top_k):
+                search_query, params = queries.multi_anchor_search_statement(
+                    Similarity_Search_Mode.EXACT,
+                    anchor_embeddings,
+                    user_id,
+                    top_k,
+                    top_k,
+                    exclude_note_id=exclude_note_id,
+                )
+                results = self._replica_read(
+                    search_query,
+                    params,
+                    fetch_all=True,
+                    label="similarity_search_many.exact_fallback",
+                    context={"user_id": user_id, "top_k": top_k, "anchors": len(anchors)},
+                )
 
-    # indexes {
-    #     (job_id, pipeline_name) [unique]
-    # }
+        logger.debug(
+            "Multi-anchor similarity search performed",
+            extra={"user_id": user_id, "anchors": len(anchors), "results": len(results)},
+        )
+        similar_sentences = queries.similarity_results_from_rows(results)
+        if cache_key is not None:
+            self.result_cache.put(cache_key, similar_sentences)
+        return similar_sentences, query_chars
 
-    # }
+    def _corpus_state(self, user_id: str):
+        """
+        The user's note_sentence_stats version, sentence count and changed_version, read
+        before searching and where the search reads (replica or primary) so cached results
+        and matrices are never older than the version they are stored under.
 
-    # Table pipeline_outputs {
-    #   id uuid [pk]
+        Args:
+            user_id (str): User whose sentences are searched.
 
-    #   pipeline_stage_id uuid [not null]
+        Returns:
+            tuple | None: (version, sentence_count, changed_version), zeros for a user without
+                sentences, None when neither the result cache nor the matrix tier is enabled.
+        """
+        if self.result_cache is None and self.matrix_cache is None:
+            return None
+        row = self._replica_read(queries.USER_CORPUS_STATE_QUERY, (user_id,))
+        return tuple(row) if row else (0, 0, 0)
+
+    def _result_cache_key(
+        self,
+        user_id: str,
+        state,
+        top_k: int,
+        embeddings: list[list[float]],
+        exclude_note_id: str = None,
+    ):
+        """
+        Result cache key of a search at the user's corpus version, None when disabled.
 
-    #   content text
-    #   data jsonb
+        Args:
+            user_id (str): User whose sentences are searched.
+            state (tuple): Returned by _corpus_state().
+            top_k (int): Results requested.
+            embeddings (list[list[float]]): Anchor embeddings.
+            exclude_note_id (str, optional): Note left out of the results.
+
+        Returns:
+            tuple | None: Key built by similarity_cache_key().
+        """
+        if self.result_cache is None:
+            return None
+        return similarity_cache_key(
+            user_id, state[0], self.search_mode, top_k, embeddings, exclude_note_id
+        )
+
+    def _user_matrix(self, user_id: str, state):
+        """
+        The user's sentences as an in-process matrix at the current corpus version, None to
+        search in SQL (tier disabled or user below USER_MATRIX_MIN_SENTENCES). A cached matrix
+        only fetches rows inserted since it was loaded unless sentences were updated or
+        deleted (changed_version) or the counts disagree, which reloads the user.
 
-    #   start_second int
-    #   end_second int
+        Matrices are scored exhaustively like exact mode whatever SIMILARITY_SEARCH_MODE is,
+        except in hybrid mode, which needs the full-text index and always searches in SQL.
 
-    #   created_at timestamp
-    #   deleted_at timestamp
-    # }
+        Args:
+            user_id (str): User whose sentences are searched.
+            state (tuple): Returned by _corpus_state().
+
+        Returns:
+            UserMatrix | None: The user's sentences.
+        """
+        if self.matrix_cache is None or self.search_mode == Similarity_Search_Mode.HYBRID:
+            return None
+        version, sentence_count, changed_version = state
+        if sentence_count < self.matrix_cache.min_sentences:
+            return None
+
+        matrix = self.matrix_cache.get(user_id)
+        if matrix is not None and matrix.version >= version:
+            self.matrix_cache.record_hit()
+            return matrix
+
+        updated = None
+        if matrix is not None and matrix.version >= changed_version:
+            rows = self._replica_read(
+                queries.USER_SENTENCES_SINCE_QUERY,
+                (user_id, matrix.loaded_until),
+                fetch_all=True,
+                label="user_sentences_since",
+            )
+            updated = matrix.appended(rows, version)
+            if len(updated) != sentence_count:
+                updated = None
+        appended = updated is not None
+        if updated is None:
+            rows = self._replica_read(
+                queries.USER_SENTENCES_QUERY, (user_id,), fetch_all=True, label="user_sentences"
+            )
+            updated = UserMatrix.from_rows(rows, version)
+        self.matrix_cache.put(user_id, updated, appended=appended)
+        return updated
+
+    # llm_metrics, pipeline_stages and pipeline_outputs are defined in db/schema.py
 
     def write_metrics(
         self, user_id: str, job_id: str, pipeline_stage_id: str, llm_call: Llm_Call, metrics: dict
@@ -291,18 +952,19 @@ class Database:
             pipeline_stage_id (str): ID of the pipeline stage.
             llm_call (Llm_Call): LLM call type.
             metrics (dict): Dictionary containing metrics to be written.
-        """
 
-        insert_query = """
-        INSERT INTO llm_metrics (user_id, job_id, pipeline_stage_id, llm_call, input_tokens, prompt_tokens, total_input_tokens, output_tokens, thought_tokens, confidence_score, elapsed_time, model)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;
+        Returns:
+            uuid: ID of the inserted row, None when buffered by the metrics sink.
         """
-
-        params = (user_id, job_id, pipeline_stage_id, llm_call, *metrics.values())
-        self.cursor.execute(insert_query, params)
-        llm_metrics_id = self.cursor.fetchone()[0]
-        self.conn.commit()
-        return llm_metrics_id
+        if self.metrics_sink is not None:
+            self.metrics_sink.enqueue(user_id, job_id, pipeline_stage_id, llm_call, metrics)
+            return None
+
+        return self._write(
+            queries.INSERT_METRICS_QUERY,
+            queries.metrics_params(user_id, job_id, pipeline_stage_id, llm_call, metrics),
+            returning=True,
+        )
 
     def read_stage(self, job_id: uuid, pipeline_name: str) -> dict:
         """
@@ -315,52 +977,34 @@ class Database:
         Returns:
             dict: Dictionary containing stage information.
         """
-        select_query = """
-        SELECT * FROM pipeline_stages WHERE job_id = %s AND pipeline_name = %s;
-        """
-        self.cursor.execute(select_query, (job_id, pipeline_name))
-        result = self.cursor.fetchone()
-        if result:
-            return {
-                "id": result[0],
-                "job_id": result[1],
-                "pipeline_name": result[2],
-                "status": result[3],
-                "attempt_count": result[4],
-                "last_heartbeat": result[5],
-                "error_message": result[6],
-                "started_at": result[7],
-                "completed_at": result[8],
-            }
-        return None
+        with self._cursor() as cursor:
+            cursor.execute(queries.READ_STAGE_QUERY, (job_id, pipeline_name))
+            return queries.stage_from_row(cursor.fetchone())
 
-    def read_stage_output(self, pipeline_stage_id: uuid) -> dict:
+    def read_stage_output(self, pipeline_stage_id: uuid, include_embeddings: bool = True) -> dict:
         """
-        Read pipeline output from the database.
+        Read pipeline output, from the read replica when one is configured.
 
         Args:
             pipeline_stage_id (uuid): ID of the pipeline stage to be read.
+            include_embeddings (bool): If False, the packed sentence embeddings are not read
+                and the sentences come back without them.
 
         Returns:
             dict: Dictionary containing output information.
         """
-        select_query = """
-        SELECT * FROM pipeline_outputs WHERE pipeline_stage_id = %s;
-        """
-        self.cursor.execute(select_query, (pipeline_stage_id,))
-        result = self.cursor.fetchone()
-        if result:
-            return {
-                "id": result[0],
-                "pipeline_stage_id": result[1],
-                "content": result[2],
-                "data": result[3],
-                "start_second": result[4],
-                "end_second": result[5],
-                "created_at": result[6],
-                "deleted_at": result[7],
-            }
-        return None
+        query = (
+            queries.READ_STAGE_OUTPUT_QUERY
+            if include_embeddings
+            else queries.READ_STAGE_OUTPUT_DATA_QUERY
+        )
+        row = self._replica_read(query, (pipeline_stage_id,))
+        if row is None and self.replica_pool is not None:
+            # The replica may not have replayed an output committed moments ago
+            with self._cursor() as cursor:
+                cursor.execute(query, (pipeline_stage_id,))
+                row = cursor.fetchone()
+        return queries.stage_output_from_row(row)
 
     def update_pipeline_stage_status(self, pipeline_stage_id: uuid, status: str):
         """
@@ -370,12 +1014,7 @@ class Database:
             pipeline_stage_id (uuid): ID of the pipeline stage to be updated.
             status (str): New status of the pipeline stage.
         """
-        update_query = """
-        UPDATE pipeline_stages SET status = %s WHERE id = %s;
-        """
-        params = (status, pipeline_stage_id)
-        self.cursor.execute(update_query, params)
-        self.conn.commit()
+        self._write(queries.UPDATE_STAGE_STATUS_QUERY, (status, pipeline_stage_id))
 
     def increment_pipeline_stage_attempt_count(self, pipeline_stage_id: uuid):
         """
@@ -384,11 +1023,54 @@ class Database:
         Args:
             pipeline_stage_id (uuid): ID of the pipeline stage to be updated.
         """
-        update_query = """
-        UPDATE pipeline_stages SET attempt_count = attempt_count + 1 WHERE id = %s;
+        self._write(queries.INCREMENT_STAGE_ATTEMPT_QUERY, (pipeline_stage_id,))
+
+    def claim_stage(self, job_id: uuid, pipeline_name: str, max_attempts: int) -> dict:
         """
-        self.cursor.execute(update_query, (pipeline_stage_id,))
-        self.conn.commit()
+        Atomically claim a stage for execution in a single statement.
+
+        Sets the stage IN_PROGRESS and increments its attempt count only if it is not
+        running under a live lease, not completed with an output, and below max_attempts.
+        A stage whose lease expired (no heartbeat for STAGE_LEASE_SECONDS) is taken over.
+
+        Args:
+            job_id (uuid): ID of the job.
+            pipeline_name (str): Name of the pipeline.
+            max_attempts (int): Attempt limit; stages at or above it are not claimed.
+
+        Returns:
+            dict: Stage information with "claimed" and "previous_status", or None if not found.
+        """
+        with self._cursor() as cursor:
+            cursor.execute(
+                queries.CLAIM_STAGE_QUERY,
+                queries.claim_params(
+                    job_id,
+                    pipeline_name,
+                    max_attempts,
+                    STAGE_LEASE_SECONDS,
+                    PIPELINE_OUTPUTS_RETENTION_DAYS,
+                ),
+            )
+            return queries.claimed_stage_from_row(cursor.fetchone())
+
+    def heartbeat_stage(self, pipeline_stage_id: uuid, attempt_count: int) -> bool:
+        """
+        Extend the lease of a running stage.
+
+        Args:
+            pipeline_stage_id (uuid): ID of the pipeline stage.
+            attempt_count (int): Attempt count returned by the claim that holds the lease.
+
+        Returns:
+            bool: False if the stage is no longer held by this claim (taken over or finished).
+        """
+        with self._cursor() as cursor:
+            cursor.execute(
+                queries.HEARTBEAT_STAGE_QUERY,
+                queries.heartbeat_params(pipeline_stage_id, attempt_count),
+            )
+            return cursor.fetchone() is not None
 
     def update_pipeline_stage_error(self, pipeline_stage_id: uuid, error_message: str):
         """
@@ -398,12 +1080,7 @@ class Database:
             pipeline_stage_id (uuid): ID of the pipeline stage to be updated.
             error_message (str): New error message of the pipeline stage.
         """
-        update_query = """
-        UPDATE pipeline_stages SET error_message = %s WHERE id = %s;
-        """
-        params = (error_message, pipeline_stage_id)
-        self.cursor.execute(update_query, params)
-        self.conn.commit()
+        self._write(queries.UPDATE_STAGE_ERROR_QUERY, (error_message, pipeline_stage_id))
 
     def write_pipeline_stage_output(self, pipeline_stage_id: uuid, output: dict):
         """
@@ -411,17 +1088,62 @@ class Database:
 
         Args:
             pipeline_stage_id (uuid): ID of the pipeline stage to be written.
-            output (dict): Dictionary containing output information.
+            output (dict): Dictionary containing output information; sentence embeddings
+                are stored packed, see db/stage_outputs.py.
         """
-        insert_query = """
-        INSERT INTO pipeline_outputs (pipeline_stage_id, data)
-        VALUES (%s, %s) RETURNING id;
+        data, embeddings = split_embeddings(output)
+        return self._write(
+            queries.INSERT_STAGE_OUTPUT_QUERY,
+            (pipeline_stage_id, Json(data), embeddings),
+            returning=True,
+        )
+
+    def complete_stage(self, pipeline_stage_id: uuid, output: dict, attempt_count: int = None):
         """
-        params = (pipeline_stage_id, Json(output))
-        self.cursor.execute(insert_query, params)
-        pipeline_output_id = self.cursor.fetchone()[0]
-        self.conn.commit()
-        return pipeline_output_id
+        Write the stage output and mark the stage COMPLETED in a single statement.
+
+        Args:
+            pipeline_stage_id (uuid): ID of the pipeline stage.
+            output (dict): Dictionary containing output information; sentence embeddings
+                are stored packed, see db/stage_outputs.py.
+            attempt_count (int, optional): Lease held by the caller; nothing is written if
+                another claim took the stage over.
+
+        Returns:
+            uuid: ID of the inserted pipeline output, None when the lease was lost.
+        """
+        data, embeddings = split_embeddings(output)
+        return self._write(
+            queries.COMPLETE_STAGE_QUERY,
+            queries.complete_params(pipeline_stage_id, Json(data), attempt_count, embeddings),
+            returning=True,
+        )
+
+    def fail_stage(self, pipeline_stage_id: uuid, error_message: str, attempt_count: int = None):
+        """
+        Mark the stage FAILED and record its error in a single statement.
+
+        Args:
+            pipeline_stage_id (uuid): ID of the pipeline stage.
+            error_message (str): Error recorded on the stage.
+            attempt_count (int, optional): Lease held by the caller, see complete_stage().
+        """
+        self._write(
+            queries.FAIL_STAGE_QUERY,
+            queries.fail_params(pipeline_stage_id, error_message, attempt_count),
+        )
+
+    def release_stage(self, pipeline_stage_id: uuid, attempt_count: int = None):
+        """
+        Return a running stage to PENDING so a redelivery can claim it again.
+
+        Args:
+            pipeline_stage_id (uuid): ID of the pipeline stage.
+            attempt_count (int, optional): Lease held by the caller, see complete_stage().
+        """
+        self._write(
+            queries.RELEASE_STAGE_QUERY, queries.release_params(pipeline_stage_id, attempt_count)
+        )
 
     # def read_job(self, job_id: str) -> list[dict]:
     #     """
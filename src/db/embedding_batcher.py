@@ -0,0 +1,185 @@
+"""
+Cross-request embedding micro-batcher.
+Collects embedding requests from every in-flight pipeline for a few milliseconds and sends
+them as one batched call per task type, returning each caller its own embeddings.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Shared queue of texts waiting to be embedded, grouped by task type.
+    A batch is dispatched when max_batch texts of one task are pending or max_wait seconds
+    after the first of them arrived. Identical texts in a batch are embedded once.
+    """
+
+    def __init__(
+        self,
+        request_fn: Callable[[list[str], str], list[list[float]]],
+        max_batch: int = 250,
+        max_wait: float = 0.005,
+        max_inflight: int = 4,
+        start: bool = True,
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            request_fn (Callable): Embeds (texts, task) with the model, in input order.
+            max_batch (int): Texts per dispatched call.
+            max_wait (float): Seconds a text waits for others before its batch is sent.
+            max_inflight (int): Batches dispatched concurrently.
+            start (bool): If True, start the background collector thread.
+        """
+        self.request_fn = request_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._pending: dict[str, list[tuple[str, Future]]] = defaultdict(list)
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_inflight, thread_name_prefix="embedding-batch"
+        )
+
+        self.requests = 0
+        self.batches = 0
+        self.texts_sent = 0
+
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, texts: list[str], task: str) -> list[Future]:
+        """
+        Queue texts for the next batch of their task type.
+
+        Returns:
+            list[Future]: One future per text resolving to its embedding.
+
+        Raises:
+            RuntimeError: If the batcher is closed.
+        """
+        futures = [Future() for _ in texts]
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Embedding batcher is closed")
+            self._pending[task].extend(zip(texts, futures))
+            self.requests += 1
+            self._cond.notify()
+        return futures
+
+    def embed(self, texts: list[str], task: str) -> list[list[float]]:
+        """
+        Embed texts through the shared batch and wait for the results.
+
+        Returns:
+            list: One embedding per input text, in input order.
+        """
+        return [future.result() for future in self.submit(texts, task)]
+
+    def _take_batches(self) -> list[tuple[str, list[tuple[str, Future]]]]:
+        """
+        Remove up to max_batch pending texts per task type. Caller holds the condition.
+        """
+        batches = []
+        for task in list(self._pending):
+            items = self._pending[task]
+            batches.append((task, items[: self.max_batch]))
+            if len(items) > self.max_batch:
+                self._pending[task] = items[self.max_batch :]
+            else:
+                del self._pending[task]
+        return batches
+
+    def _run(self):
+        """
+        Collector loop: wait for a first text, hold the window open, then dispatch.
+        """
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped and not self._pending:
+                    return
+
+                deadline = time.monotonic() + self.max_wait
+                while not self._stopped and all(
+                    len(items) < self.max_batch for items in self._pending.values()
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batches = self._take_batches()
+
+            for task, items in batches:
+                self._executor.submit(self._dispatch, task, items)
+
+    def _dispatch(self, task: str, items: list[tuple[str, Future]]):
+        """
+        Send one batch and resolve its futures.
+        """
+        unique_texts = list(dict.fromkeys(text for text, _ in items))
+        try:
+            values = self.request_fn(unique_texts, task)
+            if len(values) != len(unique_texts):
+                raise ValueError(f"Expected {len(unique_texts)} embeddings, got {len(values)}")
+            embeddings = dict(zip(unique_texts, values))
+        except Exception as e:
+            logger.warning(
+                "Embedding batch failed", extra={"task": task, "size": len(items), "error": str(e)}
+            )
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        with self._cond:
+            self.batches += 1
+            self.texts_sent += len(unique_texts)
+        for text, future in items:
+            future.set_result(embeddings[text])
+
+    def stats(self) -> dict:
+        """
+        Snapshot of caller requests, dispatched batches and texts sent to the model.
+        """
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts_sent": self.texts_sent,
+                "pending": sum(len(items) for items in self._pending.values()),
+            }
+
+    def close(self):
+        """
+        Stop accepting texts, dispatch what is pending and wait for in-flight batches.
+        Safe to call more than once.
+        """
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            while self._pending:
+                with self._cond:
+                    batches = self._take_batches()
+                for task, items in batches:
+                    self._executor.submit(self._dispatch, task, items)
+        self._executor.shutdown(wait=True)
+        logger.debug("Embedding batcher closed", extra=self.stats())
@@ -0,0 +1,109 @@
+"""
+In-process embedding cache of the database layer.
+Entries are keyed by content hash, task type, model and dimensionality; the persistent
+embedding_cache table behind it is read and written by Database.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def embedding_cache_key(text: str, task: str, model: str, dimensionality: int) -> tuple:
+    """
+    Build the cache key of one embedding.
+
+    Args:
+        text (str): Embedded text.
+        task (str): Embedding task type (RETRIEVAL_QUERY or RETRIEVAL_DOCUMENT).
+        model (str): Embedding model name.
+        dimensionality (int): Output dimensionality.
+
+    Returns:
+        tuple: (content_hash, task, model, dimensionality)
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return content_hash, task, model, dimensionality
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU of embeddings bounded by entry count and entry age.
+    Also counts where each lookup was answered: memory, the database table, or neither.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        """
+        Args:
+            max_entries (int): Entries kept before the least recently used one is evicted.
+            ttl (float): Seconds an entry stays valid, 0 keeps entries until evicted.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: list[tuple]) -> dict:
+        """
+        Look keys up in memory and count the hits.
+
+        Args:
+            keys (list[tuple]): Keys built by embedding_cache_key().
+
+        Returns:
+            dict: key -> embedding for every fresh entry found.
+        """
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, values = entry
+                if expires_at and expires_at < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = values
+            self.memory_hits += len(found)
+        return found
+
+    def put_many(self, entries: dict):
+        """
+        Store embeddings, evicting the least recently used entries beyond max_entries.
+
+        Args:
+            entries (dict): key -> embedding.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            for key, values in entries.items():
+                self._entries[key] = (expires_at, values)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, db_hits: int = 0, misses: int = 0):
+        """
+        Count lookups answered by the database table or by the embedding model.
+        """
+        with self._lock:
+            self.db_hits += db_hits
+            self.misses += misses
+
+    def stats(self) -> dict:
+        """
+        Snapshot of hit/miss counters and current size.
+        """
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,301 @@
+"""
+In-process matrix tier for similarity search over heavy users' sentence histories.
+A user's sentences are held as a contiguous, row-normalized float32 embedding matrix with
+importance and timestamp arrays, scored with the same distance / importance / recency blend
+as the SQL queries. Matrices are versioned like note_sentence_stats so newly inserted
+sentences are appended instead of reloading the whole history.
+"""
+
+import numpy as np
+import sys
+import threading
+from collections import OrderedDict
+
+# combined_score = DISTANCE_WEIGHT / (1 + distance) + importance and recency terms, see
+# SIMILARITY_RANKING_SELECT in db/queries.py
+DISTANCE_WEIGHT = 0.6
+IMPORTANCE_WEIGHT = 0.2
+RECENCY_WEIGHT = 0.2
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scale rows to unit length; zero rows become NaN like pgvector's cosine distance.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (vectors / norms).astype(np.float32, copy=False)
+
+
+class UserMatrix:
+    """
+    Immutable snapshot of one user's sentences at a note_sentence_stats version.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        keys: list[tuple],
+        texts: list[str],
+        embeddings: np.ndarray,
+        importance: np.ndarray,
+        timestamps: np.ndarray,
+    ):
+        """
+        Args:
+            version (int): Corpus version the sentences were read at (or after).
+            keys (list[tuple]): (note_id, sentence_index) per row.
+            texts (list[str]): Sentence text per row.
+            embeddings (np.ndarray): (rows, dimensions) float32, rows of unit length.
+            importance (np.ndarray): float64 importance per row, NaN for NULL.
+            timestamps (np.ndarray): float64 created_at epoch per row.
+        """
+        self.version = version
+        self.keys = keys
+        self.texts = texts
+        self.embeddings = embeddings
+        self.importance = importance
+        self.timestamps = timestamps
+        self.nbytes = (
+            embeddings.nbytes
+            + importance.nbytes
+            + timestamps.nbytes
+            + sys.getsizeof(keys)
+            + sys.getsizeof(texts)
+            + sum(sys.getsizeof(text) for text in texts)
+        )
+
+    @classmethod
+    def from_rows(cls, rows: list[tuple], version: int) -> "UserMatrix":
+        """
+        Build a matrix from USER_SENTENCES_QUERY rows.
+
+        Args:
+            rows (list[tuple]): (note_id, sentence_index, text, embedding, importance, epoch).
+            version (int): Corpus version the rows were read at.
+
+        Returns:
+            UserMatrix: The user's sentences.
+        """
+        if not rows:
+            return cls(version, [], [], np.empty((0, 0), np.float32), np.empty(0), np.empty(0))
+        return cls(
+            version,
+            [(row[0], row[1]) for row in rows],
+            [row[2] for row in rows],
+            _normalized(np.asarray([row[3] for row in rows], dtype=np.float32)),
+            np.asarray([np.nan if row[4] is None else row[4] for row in rows], dtype=np.float64),
+            np.asarray([row[5] for row in rows], dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def loaded_until(self) -> float:
+        """
+        Newest created_at epoch held, new rows are fetched from there on.
+        """
+        return float(self.timestamps.max()) if len(self) else float("-inf")
+
+    def appended(self, rows: list[tuple], version: int) -> "UserMatrix":
+        """
+        New matrix with inserted rows added; rows already held (same key) are replaced.
+
+        Args:
+            rows (list[tuple]): USER_SENTENCES_SINCE_QUERY rows.
+            version (int): Corpus version the rows were read at.
+
+        Returns:
+            UserMatrix: The updated snapshot, this one is left untouched.
+        """
+        fresh = UserMatrix.from_rows(rows, version)
+        if not len(fresh):
+            return UserMatrix(
+                version, self.keys, self.texts, self.embeddings, self.importance, self.timestamps
+            )
+        if not len(self):
+            return fresh
+        new_keys = set(fresh.keys)
+        keep = [i for i, key in enumerate(self.keys) if key not in new_keys]
+        return UserMatrix(
+            version,
+            [self.keys[i] for i in keep] + fresh.keys,
+            [self.texts[i] for i in keep] + fresh.texts,
+            np.vstack([self.embeddings[keep], fresh.embeddings]),
+            np.concatenate([self.importance[keep], fresh.importance]),
+            np.concatenate([self.timestamps[keep], fresh.timestamps]),
+        )
+
+    def _scores(self, anchors: list[list[float]]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine distance and combined score of every sentence for every anchor, NaN where
+        SQL would yield NULL (zero normalizers, NULL importance).
+
+        Returns:
+            tuple: (distance, combined), both (anchors, rows) float64.
+        """
+        queries = _normalized(np.asarray(anchors, dtype=np.float32))
+        distance = 1.0 - (queries @ self.embeddings.T).astype(np.float64)
+
+        max_importance = np.nan if np.isnan(self.importance).all() else np.nanmax(self.importance)
+        min_ts, max_ts = self.timestamps.min(), self.timestamps.max()
+        importance_term = self.importance / (max_importance or np.nan)
+        recency_term = (self.timestamps - min_ts) / ((max_ts - min_ts) or np.nan)
+
+        combined = (
+            DISTANCE_WEIGHT / (1.0 + distance)
+            + IMPORTANCE_WEIGHT * importance_term
+            + RECENCY_WEIGHT * recency_term
+        )
+        return distance, combined
+
+    def _top(self, combined: np.ndarray, top_k: int) -> np.ndarray:
+        """
+        Indices of the top_k scores, best first; NaN scores rank first like NULLs under
+        ORDER BY ... DESC.
+        """
+        order_key = np.where(np.isnan(combined), np.inf, combined)
+        if top_k < len(order_key):
+            candidates = np.argpartition(-order_key, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(order_key))
+        return candidates[np.argsort(-order_key[candidates], kind="stable")]
+
+    def _row(self, index: int, distance: float, combined: float) -> tuple:
+        """
+        Result row shaped like the similarity search queries' rows.
+        """
+        importance = self.importance[index]
+        return (
+            self.keys[index][1],
+            self.texts[index],
+            float(distance),
+            None if np.isnan(importance) else float(importance),
+            float(self.timestamps[index]),
+            None if np.isnan(combined) else float(combined),
+        )
+
+    def rank(self, query_embedding: list[float], top_k: int) -> list[tuple]:
+        """
+        Rank the user's sentences for one query, like similarity_search_statement() in
+        exact mode.
+
+        Returns:
+            list[tuple]: Rows for queries.similarity_results_from_rows().
+        """
+        if not len(self) or top_k <= 0:
+            return []
+        distance, combined = self._scores([query_embedding])
+        return [self._row(i, distance[0, i], combined[0, i]) for i in self._top(combined[0], top_k)]
+
+    def rank_many(
+        self, anchor_embeddings: list[list[float]], top_k: int, exclude_note_id: str = None
+    ) -> list[tuple]:
+        """
+        Rank top_k sentences per anchor, keep each sentence once with its best score, like
+        multi_anchor_search_statement() in exact mode.
+
+        Returns:
+            list[tuple]: Rows (with the 1-based anchor_index) ordered by score.
+        """
+        if not len(self) or top_k <= 0:
+            return []
+        distance, combined = self._scores(anchor_embeddings)
+        searched = np.asarray(
+            [i for i, key in enumerate(self.keys) if key[0] != exclude_note_id], dtype=np.intp
+        )
+        if not len(searched):
+            return []
+        best = {}
+        for anchor, scores in enumerate(combined[:, searched]):
+            for j in self._top(scores, top_k):
+                i = int(searched[j])
+                score = np.inf if np.isnan(scores[j]) else scores[j]
+                if i not in best or score > best[i][0]:
+                    best[i] = (score, anchor)
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            self._row(i, distance[anchor, i], combined[anchor, i]) + (anchor + 1,)
+            for i, (_, anchor) in ranked
+        ]
+
+
+class UserMatrixCache:
+    """
+    Thread-safe LRU of UserMatrix snapshots bounded by memory; the coldest users are evicted
+    first and a user larger than the whole budget is never cached.
+    """
+
+    def __init__(self, max_bytes: int, min_sentences: int = 0):
+        """
+        Args:
+            max_bytes (int): Memory budget in bytes across all cached users.
+            min_sentences (int): Users with fewer sentences are left to the SQL queries.
+        """
+        self.max_bytes = max_bytes
+        self.min_sentences = min_sentences
+        self._entries: OrderedDict[str, UserMatrix] = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.appends = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, user_id: str):
+        """
+        Cached matrix of a user (any version), marking the user as recently used.
+        """
+        with self._lock:
+            matrix = self._entries.get(user_id)
+            if matrix is not None:
+                self._entries.move_to_end(user_id)
+            return matrix
+
+    def put(self, user_id: str, matrix: UserMatrix, appended: bool = False):
+        """
+        Store a user's matrix, evicting the least recently used users beyond the budget.
+
+        Args:
+            user_id (str): User the sentences belong to.
+            matrix (UserMatrix): New snapshot, replaces any older one.
+            appended (bool): Whether it was built incrementally, for the counters.
+        """
+        with self._lock:
+            if appended:
+                self.appends += 1
+            else:
+                self.loads += 1
+            previous = self._entries.pop(user_id, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            if matrix.nbytes > self.max_bytes:
+                return
+            self._entries[user_id] = matrix
+            self.bytes += matrix.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def record_hit(self):
+        """
+        Count a search answered from a cached matrix without reading sentences.
+        """
+        with self._lock:
+            self.hits += 1
+
+    def stats(self) -> dict:
+        """
+        Snapshot of hits, incremental appends, full loads, evictions and memory use.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "appends": self.appends,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "users": len(self._entries),
+                "bytes": self.bytes,
+            }
@@ -0,0 +1,167 @@
+"""
+Write-behind sink for llm_metrics rows.
+Buffers metric rows in memory and persists them with COPY from a background thread,
+keeping metrics inserts off the STT/SMART request path.
+"""
+
+import threading
+from collections import deque
+from psycopg_pool import ConnectionPool
+from common.logging import get_logger
+from db import queries
+
+logger = get_logger(__name__)
+
+
+class MetricsSink:
+    """
+    Bounded in-memory queue of llm_metrics rows flushed with COPY.
+    A flush is triggered when batch_size rows are pending or every flush_interval seconds,
+    and once more on close(). Rows that do not fit in the queue are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        start: bool = True,
+    ):
+        """
+        Initialize the sink.
+
+        Args:
+            pool (ConnectionPool): Pool used to check out a connection per flush.
+            batch_size (int): Pending row count that triggers an early flush.
+            flush_interval (float): Maximum seconds between flushes.
+            max_queue (int): Maximum pending rows before new rows are dropped.
+            max_retries (int): Consecutive failed flushes a batch survives before it is dropped.
+            start (bool): If True, start the background flush thread.
+        """
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+
+        self._rows = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self._failed_flushes = 0
+
+        self.written = 0
+        self.dropped = 0
+
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="metrics-sink", daemon=True)
+            self._thread.start()
+
+    def enqueue(
+        self, user_id: str, job_id: str, pipeline_stage_id: str, llm_call: str, metrics: dict
+    ) -> bool:
+        """
+        Queue one metrics row for the next flush.
+
+        Returns:
+            bool: False if the row was dropped because the queue is full or closed.
+        """
+        row = queries.metrics_params(user_id, job_id, pipeline_stage_id, llm_call, metrics)
+        with self._cond:
+            if self._stopped or len(self._rows) >= self.max_queue:
+                self.dropped += 1
+                return False
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def flush(self) -> int:
+        """
+        Write all pending rows with a single COPY.
+
+        Returns:
+            int: Number of rows written.
+        """
+        with self._flush_lock:
+            with self._cond:
+                rows = list(self._rows)
+                self._rows.clear()
+            if not rows:
+                return 0
+
+            try:
+                with self.pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        with cursor.copy(queries.COPY_METRICS_QUERY) as copy:
+                            for row in rows:
+                                copy.write_row(row)
+            except Exception as e:
+                self._requeue(rows)
+                logger.error("Failed to flush metrics", extra={"rows": len(rows), "error": str(e)})
+                return 0
+
+            self._failed_flushes = 0
+            self.written += len(rows)
+            logger.debug("Metrics flushed", extra={"rows": len(rows)})
+            return len(rows)
+
+    def _requeue(self, rows: list):
+        """
+        Put a failed batch back at the head of the queue, or drop it after max_retries.
+        """
+        self._failed_flushes += 1
+        with self._cond:
+            if self._failed_flushes > self.max_retries:
+                self.dropped += len(rows)
+                self._failed_flushes = 0
+                return
+            room = max(self.max_queue - len(self._rows), 0)
+            kept = rows[:room]
+            self.dropped += len(rows) - len(kept)
+            self._rows.extendleft(reversed(kept))
+
+    def _run(self):
+        """
+        Background loop flushing on batch size, interval, or shutdown.
+        """
+        while True:
+            with self._cond:
+                if not self._stopped and len(self._rows) < self.batch_size:
+                    self._cond.wait(timeout=self.flush_interval)
+                stopping = self._stopped
+            self.flush()
+            if stopping:
+                return
+
+    def stats(self) -> dict:
+        """
+        Sink counters for monitoring.
+
+        Returns:
+            dict: pending, written and dropped row counts.
+        """
+        with self._cond:
+            pending = len(self._rows)
+        return {"pending": pending, "written": self.written, "dropped": self.dropped}
+
+    def close(self, timeout: float = 10.0):
+        """
+        Stop accepting rows and flush whatever is pending.
+
+        Args:
+            timeout (float): Seconds to wait for the background thread to finish.
+        """
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        else:
+            self.flush()
+        logger.debug("Metrics sink closed", extra=self.stats())
@@ -0,0 +1,506 @@
+"""
+Monthly partition maintenance for the time-partitioned llm_metrics and pipeline_outputs tables.
+Keeps partitions premade ahead of the current month so inserts never land in the DEFAULT
+partition, and detaches or drops partitions whose whole range is older than the retention.
+Rows that did land in the DEFAULT partition (e.g. while maintenance was disabled) are moved
+into the monthly partition created for them, Postgres refuses the partition otherwise; those
+older than every monthly partition stay there and are deleted once past the retention.
+The same rounds delete persistent embedding cache entries unused for their retention.
+"""
+
+import psycopg
+import re
+import threading
+from datetime import datetime, timedelta
+from psycopg import sql
+from psycopg_pool import ConnectionPool
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Only one instance maintains partitions at a time, the others skip the round
+PARTITION_LOCK_KEY = 727_002
+
+# Partition maintenance must not queue inserts behind a long-running read
+PARTITION_LOCK_TIMEOUT = "5s"
+
+LIST_PARTITIONS_QUERY = """
+SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = %s::regclass;
+"""
+
+IS_PARTITIONED_QUERY = """
+SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s);
+"""
+
+DEFAULT_PARTITION_QUERY = """
+SELECT c.relname
+FROM pg_partitioned_table p
+JOIN pg_class c ON c.oid = p.partdefid
+WHERE p.partrelid = %s::regclass;
+"""
+
+# Embedding cache entries deleted per statement, keeps each sweep transaction short
+EMBEDDING_CACHE_SWEEP_BATCH = 5000
+
+# One bounded batch of the embedding cache sweep, repeated until a batch comes back short
+SWEEP_EMBEDDING_CACHE_QUERY = """
+DELETE FROM embedding_cache
+WHERE ctid = ANY(ARRAY(
+    SELECT ctid
+    FROM embedding_cache
+    WHERE last_used_at < now() - make_interval(days => %(retention_days)s)
+    LIMIT %(batch_size)s
+));
+"""
+
+# Range partitioning column of the maintained tables
+PARTITION_KEY = "created_at"
+
+# Expired DEFAULT partition rows deleted per statement, like EMBEDDING_CACHE_SWEEP_BATCH
+DEFAULT_PARTITION_SWEEP_BATCH = 5000
+
+# One bounded batch of the DEFAULT partition sweep, formatted with the partition and key
+SWEEP_DEFAULT_PARTITION_QUERY = """
+DELETE FROM {default}
+WHERE ctid = ANY(ARRAY(
+    SELECT ctid
+    FROM {default}
+    WHERE {key} < %(cutoff)s
+    LIMIT %(batch_size)s
+));
+"""
+
+_BOUND_PATTERN = re.compile(r"FROM \((MINVALUE|'[^']+')\) TO \((MAXVALUE|'[^']+')\)")
+
+
+def month_start(value: datetime) -> datetime:
+    """
+    First instant of the month containing value.
+    """
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """
+    Start of the month the given number of months after value's month.
+    """
+    index = value.year * 12 + value.month - 1 + months
+    return month_start(value).replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    """
+    Name of the monthly partition of table starting at start, e.g. llm_metrics_p202610.
+    """
+    return f"{table}_p{start:%Y%m}"
+
+
+def _parse_bound(value: str):
+    """
+    Map a partition bound literal to a datetime, None for MINVALUE/MAXVALUE.
+    """
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def partition_bounds(conn, table: str) -> list[tuple]:
+    """
+    List the range partitions of a table, the DEFAULT partition excluded.
+
+    Args:
+        conn (psycopg.Connection): Database connection.
+        table (str): Partitioned table name.
+
+    Returns:
+        list[tuple]: (partition name, lower bound, upper bound) with None for MINVALUE/MAXVALUE.
+    """
+    bounds = []
+    for name, expression in conn.execute(LIST_PARTITIONS_QUERY, (table,)).fetchall():
+        match = _BOUND_PATTERN.search(expression or "")
+        if match:
+            bounds.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return bounds
+
+
+def default_partition(conn, table: str):
+    """
+    Name of the DEFAULT partition of a table, None when it has none.
+    """
+    row = conn.execute(DEFAULT_PARTITION_QUERY, (table,)).fetchone()
+    return row[0] if row else None
+
+
+def _earliest_default_row(conn, default: str, after: datetime):
+    """
+    Partition key of the oldest row in the DEFAULT partition at or after after (any row when
+    None), None when there is none.
+    """
+    row = conn.execute(
+        sql.SQL(
+            "SELECT min({key}) FROM {default} WHERE %s::timestamp IS NULL OR {key} >= %s"
+        ).format(key=sql.Identifier(PARTITION_KEY), default=sql.Identifier(default)),
+        (after, after),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _has_default_rows(conn, default: str, start: datetime, end: datetime) -> bool:
+    """
+    Whether the DEFAULT partition holds rows in [start, end).
+    """
+    row = conn.execute(
+        sql.SQL("SELECT EXISTS (SELECT 1 FROM {default} WHERE {key} >= %s AND {key} < %s)").format(
+            key=sql.Identifier(PARTITION_KEY), default=sql.Identifier(default)
+        ),
+        (start, end),
+    ).fetchone()
+    return bool(row and row[0])
+
+
+def _attach_with_default_rows(
+    conn, table: str, default: str, name: str, start: datetime, end: datetime
+):
+    """
+    Create the partition of [start, end) as a plain table, move the DEFAULT partition's rows
+    of that range into it and attach it. Runs inside the caller's transaction.
+    """
+    conn.execute(
+        sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+            sql.Identifier(name), sql.Identifier(table)
+        )
+    )
+    conn.execute(
+        sql.SQL(
+            "WITH moved AS (DELETE FROM {default} WHERE {key} >= %s AND {key} < %s RETURNING *) "
+            "INSERT INTO {name} SELECT * FROM moved"
+        ).format(
+            default=sql.Identifier(default),
+            key=sql.Identifier(PARTITION_KEY),
+            name=sql.Identifier(name),
+        ),
+        (start, end),
+    )
+    conn.execute(
+        sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(
+            sql.Identifier(table), sql.Identifier(name), sql.Literal(start), sql.Literal(end)
+        )
+    )
+
+
+def ensure_partitions(conn, table: str, months_ahead: int, now: datetime) -> list[str]:
+    """
+    Create the monthly partitions missing between the covered range and months_ahead months
+    after the current one. Past months are only created for rows the DEFAULT partition holds
+    after the covered range, which are moved into them.
+
+    Args:
+        conn (psycopg.Connection): Autocommit connection.
+        table (str): Partitioned table name.
+        months_ahead (int): Months after the current one that must already have a partition.
+        now (datetime): Current database time (timestamp without time zone).
+
+    Returns:
+        list[str]: Names of the partitions created.
+    """
+    uppers = [upper for _, _, upper in partition_bounds(conn, table) if upper is not None]
+    start = max(uppers + [month_start(now)])
+    end = add_months(now, months_ahead + 1)
+
+    default = default_partition(conn, table)
+    if default is not None:
+        earliest = _earliest_default_row(conn, default, max(uppers) if uppers else None)
+        if earliest is not None:
+            start = min(start, month_start(earliest))
+
+    created = []
+    while start < end:
+        next_start = add_months(start, 1)
+        name = partition_name(table, start)
+        with conn.transaction():
+            conn.execute(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'")
+            if default is not None and _has_default_rows(conn, default, start, next_start):
+                _attach_with_default_rows(conn, table, default, name, start, next_start)
+                logger.warning(
+                    "Moved rows out of the default partition",
+                    extra={"table": table, "partition": name},
+                )
+            else:
+                conn.execute(
+                    sql.SQL(
+                        "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})"
+                    ).format(
+                        sql.Identifier(name),
+                        sql.Identifier(table),
+                        sql.Literal(start),
+                        sql.Literal(next_start),
+                    )
+                )
+        created.append(name)
+        start = next_start
+    return created
+
+
+def sweep_partitions(
+    conn, table: str, retention_days: int, action: str, now: datetime
+) -> list[str]:
+    """
+    Detach or drop every partition whose range ends before the retention cutoff.
+
+    Args:
+        conn (psycopg.Connection): Autocommit connection.
+        table (str): Partitioned table name.
+        retention_days (int): Days of rows to keep, 0 keeps everything.
+        action (str): "detach" keeps expired partitions as standalone tables, "drop" deletes them.
+        now (datetime): Current database time (timestamp without time zone).
+
+    Returns:
+        list[str]: Names of the partitions detached or dropped.
+    """
+    if retention_days <= 0:
+        return []
+    cutoff = now - timedelta(days=retention_days)
+
+    swept = []
+    for name, _, upper in partition_bounds(conn, table):
+        if upper is None or upper > cutoff:
+            continue
+        with conn.transaction():
+            conn.execute(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'")
+            if action == "drop":
+                conn.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+            else:
+                conn.execute(
+                    sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                        sql.Identifier(table), sql.Identifier(name)
+                    )
+                )
+        swept.append(name)
+    return swept
+
+
+def _delete_in_batches(conn, query, params: dict, batch_size: int) -> int:
+    """
+    Run a bounded DELETE until a batch comes back short, each batch its own transaction.
+    """
+    params = {**params, "batch_size": batch_size}
+    deleted = 0
+    while True:
+        count = conn.execute(query, params).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def sweep_default_partition(conn, table: str, retention_days: int, now: datetime) -> int:
+    """
+    Delete the DEFAULT partition's rows older than the retention cutoff, in batches. Unlike
+    monthly partitions they cannot be detached, and ensure_partitions() never moves rows
+    older than the covered range out of it.
+
+    Args:
+        conn (psycopg.Connection): Autocommit connection.
+        table (str): Partitioned table name.
+        retention_days (int): Days of rows to keep, 0 keeps everything.
+        now (datetime): Current database time (timestamp without time zone).
+
+    Returns:
+        int: Number of rows deleted.
+    """
+    if retention_days <= 0:
+        return 0
+    default = default_partition(conn, table)
+    if default is None:
+        return 0
+    query = sql.SQL(SWEEP_DEFAULT_PARTITION_QUERY).format(
+        default=sql.Identifier(default), key=sql.Identifier(PARTITION_KEY)
+    )
+    cutoff = now - timedelta(days=retention_days)
+    return _delete_in_batches(conn, query, {"cutoff": cutoff}, DEFAULT_PARTITION_SWEEP_BATCH)
+
+
+def sweep_embedding_cache(conn, retention_days: int) -> int:
+    """
+    Delete persistent embedding cache entries not used for retention_days, in batches.
+
+    Args:
+        conn (psycopg.Connection): Autocommit connection.
+        retention_days (int): Days an unused entry is kept, 0 keeps everything.
+
+    Returns:
+        int: Number of entries deleted.
+    """
+    if retention_days <= 0:
+        return 0
+    return _delete_in_batches(
+        conn,
+        SWEEP_EMBEDDING_CACHE_QUERY,
+        {"retention_days": retention_days},
+        EMBEDDING_CACHE_SWEEP_BATCH,
+    )
+
+
+class PartitionManager:
+    """
+    Background maintenance of the partitioned tables, one round every interval seconds; the
+    owner runs the first round itself with run_once() so startup never races the first insert.
+    Each round premakes upcoming months and sweeps expired ones (and expired DEFAULT partition
+    rows) per table, then deletes unused embedding cache entries.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        retention_days: dict[str, int],
+        months_ahead: int = 2,
+        interval: float = 3600,
+        action: str = "detach",
+        start: bool = True,
+        embedding_cache_retention_days: int = 0,
+    ):
+        """
+        Initialize the manager.
+
+        Args:
+            pool (ConnectionPool): Pool used to check out a connection per round.
+            retention_days (dict): Partitioned table name -> days of rows to keep (0 keeps all).
+            months_ahead (int): Months after the current one to premake.
+            interval (float): Seconds between maintenance rounds.
+            action (str): "detach" or "drop" for expired partitions.
+            start (bool): If True, start the background thread.
+            embedding_cache_retention_days (int): Days an unused embedding cache entry is
+                kept (0 keeps all).
+        """
+        self.pool = pool
+        self.retention_days = retention_days
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self.action = action
+        self.embedding_cache_retention_days = embedding_cache_retention_days
+
+        self._stop = threading.Event()
+        self.created = 0
+        self.swept = 0
+        self.default_rows_deleted = 0
+        self.embeddings_deleted = 0
+
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="partition-manager", daemon=True)
+            self._thread.start()
+
+    def run_once(self) -> dict:
+        """
+        Run one maintenance round unless another instance holds the partition lock.
+
+        Returns:
+            dict: table -> {"created": [...], "swept": [...], "default_deleted": n} for the
+                tables maintained, plus
+                "embedding_cache" -> {"deleted": n} when its retention is set.
+        """
+        results = {}
+        with self.pool.connection() as conn:
+            locked = conn.execute(
+                "SELECT pg_try_advisory_lock(%s)", (PARTITION_LOCK_KEY,)
+            ).fetchone()[0]
+            if not locked:
+                logger.debug("Partition maintenance running elsewhere, skipped")
+                return results
+            try:
+                now = conn.execute("SELECT localtimestamp").fetchone()[0]
+                for table, retention_days in self.retention_days.items():
+                    results[table] = self._maintain(conn, table, retention_days, now)
+                if self.embedding_cache_retention_days > 0:
+                    results["embedding_cache"] = {"deleted": self._sweep_embedding_cache(conn)}
+            finally:
+                conn.execute("SELECT pg_advisory_unlock(%s)", (PARTITION_LOCK_KEY,))
+        return results
+
+    def _maintain(self, conn, table: str, retention_days: int, now: datetime) -> dict:
+        """
+        Premake and sweep one table, logging instead of raising so other tables still run.
+        """
+        result = {"created": [], "swept": [], "default_deleted": 0}
+        try:
+            partitioned = conn.execute(IS_PARTITIONED_QUERY, (table,)).fetchone()
+            if not partitioned or not partitioned[0]:
+                logger.debug("Table not partitioned, maintenance skipped", extra={"table": table})
+                return result
+            result["created"] = ensure_partitions(conn, table, self.months_ahead, now)
+            result["swept"] = sweep_partitions(conn, table, retention_days, self.action, now)
+            result["default_deleted"] = sweep_default_partition(conn, table, retention_days, now)
+        except psycopg.Error as e:
+            logger.error("Partition maintenance failed", extra={"table": table, "error": str(e)})
+
+        self.created += len(result["created"])
+        self.swept += len(result["swept"])
+        self.default_rows_deleted += result["default_deleted"]
+        if result["created"] or result["swept"] or result["default_deleted"]:
+            logger.info(
+                "Partitions maintained",
+                extra={
+                    "table": table,
+                    "action": self.action,
+                    "partitions_created": result["created"],
+                    "partitions_swept": result["swept"],
+                    "default_rows_deleted": result["default_deleted"],
+                },
+            )
+        return result
+
+    def _sweep_embedding_cache(self, conn) -> int:
+        """
+        Run the embedding cache sweep, logging instead of raising like _maintain().
+        """
+        try:
+            deleted = sweep_embedding_cache(conn, self.embedding_cache_retention_days)
+        except psycopg.Error as e:
+            logger.error("Embedding cache sweep failed", extra={"error": str(e)})
+            return 0
+
+        self.embeddings_deleted += deleted
+        if deleted:
+            logger.info(
+                "Embedding cache swept",
+                extra={
+                    "entries_deleted": deleted,
+                    "retention_days": self.embedding_cache_retention_days,
+                },
+            )
+        return deleted
+
+    def _run(self):
+        """
+        Background loop running a maintenance round every interval until closed.
+        """
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("Partition maintenance round failed", extra={"error": str(e)})
+
+    def stats(self) -> dict:
+        """
+        Partitions created and swept, and DEFAULT partition rows and embedding cache entries
+        deleted, since start.
+        """
+        return {
+            "created": self.created,
+            "swept": self.swept,
+            "default_rows_deleted": self.default_rows_deleted,
+            "embeddings_deleted": self.embeddings_deleted,
+        }
+
+    def close(self, timeout: float = 10.0):
+        """
+        Stop the background thread.
+
+        Args:
+            timeout (float): Seconds to wait for a running round to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
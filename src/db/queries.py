@@ -0,0 +1,1013 @@
+"""
+SQL statements and row mappers shared by the blocking and async database layers.
+Keeping them in one place guarantees both layers issue identical queries.
+"""
+
+from config.config import Pipeline_Stage_Status, Similarity_Search_Mode
+from db.stage_outputs import merge_embeddings
+
+# Per-user normalizers, a primary-key lookup on the trigger-maintained note_sentence_stats
+RANKING_STATS_CTE = """
+, stats AS (
+    SELECT max_importance, min_ts, max_ts
+    FROM note_sentence_stats
+    WHERE user_id = %(user_id)s
+)
+"""
+
+# Scores candidates with the 0.6 distance / 0.2 importance / 0.2 recency blend
+SIMILARITY_RANKING_SELECT = """
+SELECT
+    rn.sentence_index,
+    rn.sentence_text,
+    rn.distance,
+    rn.importance_score,
+    rn.ts_epoch,
+    (1 / (1 + rn.distance)) * 0.6 +
+    (rn.importance_score / NULLIF(s.max_importance, 0)) * 0.2 +
+    ((rn.ts_epoch - s.min_ts) / NULLIF(s.max_ts - s.min_ts, 0)) * 0.2 AS combined_score
+FROM ranked_notes rn
+CROSS JOIN stats s
+ORDER BY combined_score DESC
+LIMIT %(top_k)s;
+"""
+
+# Exact mode: every sentence of the user is scored (sequential scan per user)
+EXACT_SIMILARITY_SEARCH_QUERY = """
+WITH ranked_notes AS (
+    SELECT
+        sentence_index,
+        sentence_text,
+        embedding <=> %(query)s::vector AS distance,
+        importance_score,
+        EXTRACT(EPOCH FROM created_at) AS ts_epoch
+    FROM note_sentences
+    WHERE user_id = %(user_id)s
+)
+""" + RANKING_STATS_CTE + SIMILARITY_RANKING_SELECT
+
+"""
+ANN mode: the ORDER BY distance ... LIMIT candidate_depth is served by the HNSW index on
+note_sentences.embedding, and only those candidates are blended. Normalizers still cover
+the user's whole history (note_sentence_stats) so scores match exact mode.
+"""
+ANN_SIMILARITY_SEARCH_QUERY = """
+WITH ranked_notes AS (
+    SELECT
+        sentence_index,
+        sentence_text,
+        embedding <=> %(query)s::vector AS distance,
+        importance_score,
+        EXTRACT(EPOCH FROM created_at) AS ts_epoch
+    FROM note_sentences
+    WHERE user_id = %(user_id)s
+    ORDER BY embedding <=> %(query)s::vector
+    LIMIT %(candidate_depth)s
+)
+""" + RANKING_STATS_CTE + SIMILARITY_RANKING_SELECT
+
+"""
+Quantized modes: candidates are ordered by a half-precision, binary or truncated (first
+prefix_dimensions dimensions) copy of the embedding that only lives in an expression HNSW
+index (schema.SEARCH_MODE_INDEXES), then reranked with full-precision distances before
+blending. Dimensions are part of the index expression, so they are formatted into the
+statement.
+"""
+QUANTIZED_CANDIDATE_ORDER = {
+    Similarity_Search_Mode.HALFVEC: (
+        "{column}::halfvec({dimensions}) <=> {query}::halfvec({dimensions})"
+    ),
+    Similarity_Search_Mode.BINARY: (
+        "binary_quantize({column})::bit({dimensions}) <~> binary_quantize({query})"
+    ),
+    Similarity_Search_Mode.PREFIX: (
+        "subvector({column}, 1, {prefix_dimensions})::vector({prefix_dimensions}) <=> "
+        "subvector({query}, 1, {prefix_dimensions})::vector({prefix_dimensions})"
+    ),
+}
+
+QUANTIZED_SIMILARITY_SEARCH_QUERY = """
+WITH candidates AS (
+    SELECT sentence_index, sentence_text, embedding, importance_score, created_at
+    FROM note_sentences
+    WHERE user_id = %(user_id)s
+    ORDER BY {candidate_order}
+    LIMIT %(candidate_depth)s
+)
+, ranked_notes AS (
+    SELECT
+        sentence_index,
+        sentence_text,
+        embedding <=> %(query)s::vector AS distance,
+        importance_score,
+        EXTRACT(EPOCH FROM created_at) AS ts_epoch
+    FROM candidates
+)
+""" + RANKING_STATS_CTE + SIMILARITY_RANKING_SELECT
+
+MULTI_ANCHOR_QUANTIZED_CANDIDATES = """
+            ORDER BY {candidate_order}
+            LIMIT %(candidate_depth)s"""
+
+"""
+Centroid mode: the user's notes are ranked by their centroid (note_centroids) and only the
+sentences of the note_depth closest notes are scored, so the work per query follows the
+number of notes searched rather than the size of the user's history.
+"""
+CENTROID_SIMILARITY_SEARCH_QUERY = """
+WITH top_notes AS (
+    SELECT note_id
+    FROM note_centroids
+    WHERE user_id = %(user_id)s
+    ORDER BY centroid <=> %(query)s::vector
+    LIMIT %(note_depth)s
+)
+, ranked_notes AS (
+    SELECT
+        ns.sentence_index,
+        ns.sentence_text,
+        ns.embedding <=> %(query)s::vector AS distance,
+        ns.importance_score,
+        EXTRACT(EPOCH FROM ns.created_at) AS ts_epoch
+    FROM top_notes t
+    JOIN note_sentences ns ON ns.user_id = %(user_id)s AND ns.note_id = t.note_id
+)
+""" + RANKING_STATS_CTE + SIMILARITY_RANKING_SELECT
+
+"""
+Hybrid mode: lexical candidates from the full-text GIN index (schema.SEARCH_MODE_INDEXES) and
+vector candidates from the HNSW index are fused with reciprocal rank fusion, then the fused
+relevance takes the place of the distance term in the importance / recency blend. Both
+candidate lists are bounded (lexical_depth, candidate_depth), so the work per query does not
+grow with the user's history. The query text matches any of its terms, ranked by ts_rank_cd.
+"""
+HYBRID_LEXICAL_TSQUERY = "replace(plainto_tsquery('{config}', {text})::text, ' & ', ' | ')::tsquery"
+
+# RRF: sum of 1 / (rrf_k + rank) over both lists, scaled to 1 for a first place in both
+HYBRID_FUSED_CANDIDATES = """
+            SELECT
+                note_id,
+                sentence_index,
+                (COALESCE(1.0 / (%(rrf_k)s + v.vector_rank), 0) +
+                 COALESCE(1.0 / (%(rrf_k)s + l.lexical_rank), 0)) * (%(rrf_k)s + 1) / 2
+                    AS relevance
+            FROM (
+                SELECT note_id, sentence_index, ROW_NUMBER() OVER (ORDER BY distance) AS vector_rank
+                FROM (
+                    SELECT note_id, sentence_index, embedding <=> {vector} AS distance
+                    FROM note_sentences
+                    WHERE user_id = %(user_id)s
+                        AND note_id IS DISTINCT FROM %(exclude_note_id)s
+                    ORDER BY embedding <=> {vector}
+                    LIMIT %(candidate_depth)s
+                ) vc
+            ) v
+            FULL JOIN (
+                SELECT
+                    note_id,
+                    sentence_index,
+                    ROW_NUMBER() OVER (ORDER BY text_rank DESC) AS lexical_rank
+                FROM (
+                    SELECT
+                        note_id,
+                        sentence_index,
+                        ts_rank_cd(to_tsvector('{config}', sentence_text), {tsquery}) AS text_rank
+                    FROM note_sentences
+                    WHERE user_id = %(user_id)s
+                        AND note_id IS DISTINCT FROM %(exclude_note_id)s
+                        AND to_tsvector('{config}', sentence_text) @@ {tsquery}
+                    ORDER BY text_rank DESC
+                    LIMIT %(lexical_depth)s
+                ) lc
+            ) l USING (note_id, sentence_index)"""
+
+HYBRID_SIMILARITY_SEARCH_QUERY = (
+    """
+WITH fused AS ("""
+    + HYBRID_FUSED_CANDIDATES
+    + """
+)
+, ranked_notes AS (
+    SELECT
+        ns.sentence_index,
+        ns.sentence_text,
+        ns.embedding <=> %(query)s::vector AS distance,
+        ns.importance_score,
+        EXTRACT(EPOCH FROM ns.created_at) AS ts_epoch,
+        f.relevance
+    FROM fused f
+    JOIN note_sentences ns
+        ON ns.user_id = %(user_id)s
+        AND ns.note_id = f.note_id
+        AND ns.sentence_index = f.sentence_index
+)
+"""
+    + RANKING_STATS_CTE
+    + """
+SELECT
+    rn.sentence_index,
+    rn.sentence_text,
+    rn.distance,
+    rn.importance_score,
+    rn.ts_epoch,
+    rn.relevance * 0.6 +
+    (rn.importance_score / NULLIF(s.max_importance, 0)) * 0.2 +
+    ((rn.ts_epoch - s.min_ts) / NULLIF(s.max_ts - s.min_ts, 0)) * 0.2 AS combined_score
+FROM ranked_notes rn
+CROSS JOIN stats s
+ORDER BY combined_score DESC
+LIMIT %(top_k)s;
+"""
+)
+
+"""
+Multi-anchor search: every anchor vector is ranked in one statement through a LATERAL
+subquery (top_k per anchor), then sentences returned by several anchors are collapsed to
+their best score. Candidate selection per anchor follows the retrieval mode. exclude_note_id
+keeps the note being processed out of its own history.
+"""
+MULTI_ANCHOR_CANDIDATES = {
+    Similarity_Search_Mode.EXACT: "",
+    Similarity_Search_Mode.ANN: """
+            ORDER BY ns.embedding <=> a.embedding
+            LIMIT %(candidate_depth)s""",
+    Similarity_Search_Mode.CENTROID: """
+                AND ns.note_id IN (
+                    SELECT c.note_id
+                    FROM note_centroids c
+                    WHERE c.user_id = %(user_id)s
+                    ORDER BY c.centroid <=> a.embedding
+                    LIMIT %(note_depth)s
+                )""",
+}
+
+# Collapses sentences returned by several anchors to their best score
+MULTI_ANCHOR_DEDUPED_SELECT = """
+, deduped AS (
+    SELECT DISTINCT ON (note_id, sentence_index) *
+    FROM per_anchor
+    ORDER BY note_id, sentence_index, combined_score DESC
+)
+SELECT
+    sentence_index,
+    sentence_text,
+    distance,
+    importance_score,
+    ts_epoch,
+    combined_score,
+    anchor_index
+FROM deduped
+ORDER BY combined_score DESC;
+"""
+
+MULTI_ANCHOR_SIMILARITY_SEARCH_QUERY = (
+    """
+WITH anchors AS (
+    SELECT ord AS anchor_index, anchor::vector AS embedding
+    FROM unnest(%(anchors)s::text[]) WITH ORDINALITY AS a(anchor, ord)
+)
+"""
+    + RANKING_STATS_CTE
+    + """, per_anchor AS (
+    SELECT a.anchor_index, r.*
+    FROM anchors a
+    CROSS JOIN stats s
+    CROSS JOIN LATERAL (
+        SELECT
+            rn.note_id,
+            rn.sentence_index,
+            rn.sentence_text,
+            rn.distance,
+            rn.importance_score,
+            rn.ts_epoch,
+            (1 / (1 + rn.distance)) * 0.6 +
+            (rn.importance_score / NULLIF(s.max_importance, 0)) * 0.2 +
+            ((rn.ts_epoch - s.min_ts) / NULLIF(s.max_ts - s.min_ts, 0)) * 0.2 AS combined_score
+        FROM (
+            SELECT
+                ns.note_id,
+                ns.sentence_index,
+                ns.sentence_text,
+                ns.embedding <=> a.embedding AS distance,
+                ns.importance_score,
+                EXTRACT(EPOCH FROM ns.created_at) AS ts_epoch
+            FROM note_sentences ns
+            WHERE ns.user_id = %(user_id)s
+                AND ns.note_id IS DISTINCT FROM %(exclude_note_id)s{candidates}
+        ) rn
+        ORDER BY combined_score DESC
+        LIMIT %(top_k)s
+    ) r
+)
+"""
+    + MULTI_ANCHOR_DEDUPED_SELECT
+)
+
+MULTI_ANCHOR_HYBRID_SEARCH_QUERY = (
+    """
+WITH anchors AS (
+    SELECT
+        ord AS anchor_index,
+        anchor::vector AS embedding,
+        """
+    + HYBRID_LEXICAL_TSQUERY.format(config="{config}", text="anchor_text")
+    + """ AS lexical
+    FROM unnest(%(anchors)s::text[], %(anchor_texts)s::text[])
+        WITH ORDINALITY AS a(anchor, anchor_text, ord)
+)
+"""
+    + RANKING_STATS_CTE
+    + """, per_anchor AS (
+    SELECT a.anchor_index, r.*
+    FROM anchors a
+    CROSS JOIN stats s
+    CROSS JOIN LATERAL (
+        SELECT
+            ns.note_id,
+            ns.sentence_index,
+            ns.sentence_text,
+            ns.embedding <=> a.embedding AS distance,
+            ns.importance_score,
+            EXTRACT(EPOCH FROM ns.created_at) AS ts_epoch,
+            f.relevance * 0.6 +
+            (ns.importance_score / NULLIF(s.max_importance, 0)) * 0.2 +
+            ((EXTRACT(EPOCH FROM ns.created_at) - s.min_ts) / NULLIF(s.max_ts - s.min_ts, 0))
+                * 0.2 AS combined_score
+        FROM ("""
+    + HYBRID_FUSED_CANDIDATES.format(config="{config}", vector="a.embedding", tsquery="a.lexical")
+    + """
+        ) f
+        JOIN note_sentences ns
+            ON ns.user_id = %(user_id)s
+            AND ns.note_id = f.note_id
+            AND ns.sentence_index = f.sentence_index
+        ORDER BY combined_score DESC
+        LIMIT %(top_k)s
+    ) r
+)
+"""
+    + MULTI_ANCHOR_DEDUPED_SELECT
+)
+
+# version is bumped by the note_sentence_stats triggers whenever the user's sentences change,
+# changed_version is the last version that was not produced by inserts alone
+USER_CORPUS_STATE_QUERY = """
+SELECT version, sentence_count, changed_version FROM note_sentence_stats WHERE user_id = %s;
+"""
+
+# Loads a user's sentences into the in-process matrix tier (db/matrix_cache.py)
+USER_SENTENCES_QUERY = """
+SELECT
+    note_id,
+    sentence_index,
+    sentence_text,
+    embedding::real[],
+    importance_score,
+    EXTRACT(EPOCH FROM created_at)::float8
+FROM note_sentences
+WHERE user_id = %s;
+"""
+
+# Rows inserted at or after the newest timestamp already loaded; rows backdated below it are
+# caught by the sentence count check and trigger a full reload
+USER_SENTENCES_SINCE_QUERY = """
+SELECT
+    note_id,
+    sentence_index,
+    sentence_text,
+    embedding::real[],
+    importance_score,
+    EXTRACT(EPOCH FROM created_at)::float8
+FROM note_sentences
+WHERE user_id = %s AND EXTRACT(EPOCH FROM created_at) >= %s;
+"""
+
+"""
+Engine-side sentence ingest: a note's sentences are binary COPYed into a transaction-scoped
+staging table (embeddings as real[], no text encoding of the floats) and merged into
+note_sentences in the same transaction, so the note_sentence_stats and note_centroids triggers
+run before commit. Replays of a note are idempotent: unchanged rows are not rewritten and
+sentences no longer in the note are removed.
+"""
+CREATE_SENTENCE_STAGING_QUERY = """
+CREATE TEMP TABLE note_sentences_staging (
+    sentence_index INTEGER NOT NULL,
+    sentence_text TEXT,
+    embedding REAL[],
+    importance_score DOUBLE PRECISION
+) ON COMMIT DROP;
+"""
+
+COPY_SENTENCE_STAGING_QUERY = (
+    "COPY note_sentences_staging (sentence_index, sentence_text, embedding, importance_score) "
+    "FROM STDIN (FORMAT BINARY)"
+)
+SENTENCE_STAGING_TYPES = ("int4", "text", "float4[]", "float8")
+
+MERGE_STAGED_SENTENCES_QUERY = """
+INSERT INTO note_sentences AS ns
+    (user_id, note_id, sentence_index, sentence_text, embedding, importance_score)
+SELECT %(user_id)s, %(note_id)s, sentence_index, sentence_text, embedding::vector, importance_score
+FROM note_sentences_staging
+ON CONFLICT (user_id, note_id, sentence_index) DO UPDATE SET
+    sentence_text = EXCLUDED.sentence_text,
+    embedding = EXCLUDED.embedding,
+    importance_score = EXCLUDED.importance_score
+WHERE (ns.sentence_text, ns.embedding, ns.importance_score)
+    IS DISTINCT FROM (EXCLUDED.sentence_text, EXCLUDED.embedding, EXCLUDED.importance_score);
+"""
+
+DELETE_UNSTAGED_SENTENCES_QUERY = """
+DELETE FROM note_sentences ns
+WHERE ns.user_id = %(user_id)s
+    AND ns.note_id = %(note_id)s
+    AND NOT EXISTS (
+        SELECT 1 FROM note_sentences_staging s WHERE s.sentence_index = ns.sentence_index
+    );
+"""
+
+SIMILARITY_SEARCH_QUERIES = {
+    Similarity_Search_Mode.EXACT: EXACT_SIMILARITY_SEARCH_QUERY,
+    Similarity_Search_Mode.ANN: ANN_SIMILARITY_SEARCH_QUERY,
+    Similarity_Search_Mode.CENTROID: CENTROID_SIMILARITY_SEARCH_QUERY,
+}
+
+"""
+Modes whose candidates come from an HNSW scan filtered on user_id afterwards. Without
+iterative scans (pgvector < 0.8) a user holding a small share of the index can get fewer
+than top_k rows, such searches are rerun in exact mode.
+"""
+INDEX_CANDIDATE_MODES = {Similarity_Search_Mode.ANN, *QUANTIZED_CANDIDATE_ORDER}
+
+# Installed pgvector version, decides whether iterative index scans are available
+VECTOR_VERSION_QUERY = """
+SELECT extversion FROM pg_extension WHERE extname = 'vector';
+"""
+
+INSERT_METRICS_QUERY = """
+INSERT INTO llm_metrics (user_id, job_id, pipeline_stage_id, llm_call, input_tokens, prompt_tokens, total_input_tokens, output_tokens, thought_tokens, confidence_score, elapsed_time, model)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;
+"""
+
+METRICS_COLUMNS = (
+    "user_id, job_id, pipeline_stage_id, llm_call, input_tokens, prompt_tokens, "
+    "total_input_tokens, output_tokens, thought_tokens, confidence_score, elapsed_time, model"
+)
+
+COPY_METRICS_QUERY = f"COPY llm_metrics ({METRICS_COLUMNS}) FROM STDIN"
+
+READ_STAGE_QUERY = """
+SELECT * FROM pipeline_stages WHERE job_id = %s AND pipeline_name = %s;
+"""
+
+STAGE_OUTPUT_COLUMNS = (
+    "id, pipeline_stage_id, content, data, start_second, end_second, created_at, deleted_at"
+)
+
+READ_STAGE_OUTPUT_QUERY = f"""
+SELECT {STAGE_OUTPUT_COLUMNS}, embeddings FROM pipeline_outputs WHERE pipeline_stage_id = %s;
+"""
+
+# Leaves the packed embeddings in TOAST, for readers that only need the semantic payload
+READ_STAGE_OUTPUT_DATA_QUERY = f"""
+SELECT {STAGE_OUTPUT_COLUMNS}, NULL::bytea FROM pipeline_outputs WHERE pipeline_stage_id = %s;
+"""
+
+UPDATE_STAGE_STATUS_QUERY = """
+UPDATE pipeline_stages SET status = %s WHERE id = %s;
+"""
+
+INCREMENT_STAGE_ATTEMPT_QUERY = """
+UPDATE pipeline_stages SET attempt_count = attempt_count + 1 WHERE id = %s;
+"""
+
+UPDATE_STAGE_ERROR_QUERY = """
+UPDATE pipeline_stages SET error_message = %s WHERE id = %s;
+"""
+
+STAGE_COLUMNS = (
+    "id, job_id, pipeline_name, status, attempt_count, last_heartbeat, error_message, "
+    "started_at, completed_at"
+)
+
+"""
+Claims a stage in one statement. The UPDATE re-checks status and attempt count on the
+locked row, so of two concurrent redeliveries only one can flip the stage to IN_PROGRESS.
+A COMPLETED stage whose output row is missing stays claimable so it can be re-run, as long as
+it completed within the pipeline_outputs retention (older outputs are gone by design, see
+db/partitions.py, and must not be paid for again); so does an IN_PROGRESS stage whose lease
+expired (no heartbeat for lease_seconds, its worker died). The claim starts a new lease; attempt_count identifies it for the heartbeat and the
+final status writes. The pre-claim snapshot is returned alongside the claim flag to explain
+rejections; lease_expired tells a dead worker's stage apart from a running one when the
+attempts are used up.
+"""
+CLAIM_STAGE_QUERY = f"""
+WITH current_stage AS (
+    SELECT
+        {STAGE_COLUMNS},
+        status = %(in_progress)s
+            AND COALESCE(last_heartbeat, started_at, '-infinity')
+                < NOW() - make_interval(secs => %(lease_seconds)s) AS lease_expired
+    FROM pipeline_stages
+    WHERE job_id = %(job_id)s AND pipeline_name = %(pipeline_name)s
+),
+claimed AS (
+    UPDATE pipeline_stages ps
+    SET status = %(in_progress)s,
+        attempt_count = ps.attempt_count + 1,
+        started_at = NOW(),
+        last_heartbeat = NOW()
+    FROM current_stage cs
+    WHERE ps.id = cs.id
+      AND ps.attempt_count < %(max_attempts)s
+      AND (
+          ps.status <> %(in_progress)s
+          OR COALESCE(ps.last_heartbeat, ps.started_at, '-infinity')
+              < NOW() - make_interval(secs => %(lease_seconds)s)
+      )
+      AND (
+          ps.status <> %(completed)s
+          OR (
+              (
+                  %(output_retention_days)s::int <= 0
+                  OR ps.completed_at >= NOW() - make_interval(days => %(output_retention_days)s)
+              )
+              AND NOT EXISTS (SELECT 1 FROM pipeline_outputs po WHERE po.pipeline_stage_id = ps.id)
+          )
+      )
+    RETURNING ps.id, ps.status, ps.attempt_count, ps.started_at, ps.last_heartbeat
+)
+SELECT
+    cs.id,
+    cs.job_id,
+    cs.pipeline_name,
+    COALESCE(c.status, cs.status),
+    COALESCE(c.attempt_count, cs.attempt_count),
+    COALESCE(c.last_heartbeat, cs.last_heartbeat),
+    cs.error_message,
+    COALESCE(c.started_at, cs.started_at),
+    cs.completed_at,
+    c.id IS NOT NULL AS claimed,
+    cs.status AS previous_status,
+    cs.lease_expired
+FROM current_stage cs
+LEFT JOIN claimed c ON c.id = cs.id;
+"""
+
+INSERT_STAGE_OUTPUT_QUERY = """
+INSERT INTO pipeline_outputs (pipeline_stage_id, data, embeddings)
+VALUES (%s, %s, %s) RETURNING id;
+"""
+
+"""
+Stage transitions are single statements so a job never leaves an output row behind
+without the COMPLETED status (or a FAILED status without its error) on a partial failure.
+When attempt_count is given, only the lease holder's transition applies: a worker whose
+expired stage was taken over by another claim writes nothing. A COMPLETED stage is never
+failed afterwards.
+"""
+LEASE_HOLDER_CONDITION = "(%(attempt_count)s::int IS NULL OR attempt_count = %(attempt_count)s)"
+
+COMPLETE_STAGE_QUERY = f"""
+WITH stage AS (
+    UPDATE pipeline_stages
+    SET status = %(status)s, completed_at = NOW()
+    WHERE id = %(stage_id)s AND {LEASE_HOLDER_CONDITION}
+    RETURNING id
+),
+output AS (
+    INSERT INTO pipeline_outputs (pipeline_stage_id, data, embeddings)
+    SELECT id, %(data)s, %(embeddings)s FROM stage
+    RETURNING id
+)
+SELECT id FROM output;
+"""
+
+FAIL_STAGE_QUERY = f"""
+UPDATE pipeline_stages
+SET status = %(status)s, error_message = %(error_message)s
+WHERE id = %(stage_id)s AND status <> %(completed)s AND {LEASE_HOLDER_CONDITION};
+"""
+
+# Only a running stage goes back to PENDING, a concurrent COMPLETED must not be undone
+RELEASE_STAGE_QUERY = f"""
+UPDATE pipeline_stages
+SET status = %(status)s
+WHERE id = %(stage_id)s AND status = %(in_progress)s AND {LEASE_HOLDER_CONDITION};
+"""
+
+# Extends the lease of a running stage, no row is returned once another claim took it over
+HEARTBEAT_STAGE_QUERY = """
+UPDATE pipeline_stages
+SET last_heartbeat = NOW()
+WHERE id = %(stage_id)s AND status = %(in_progress)s AND attempt_count = %(attempt_count)s
+RETURNING id;
+"""
+
+"""
+Persistent embedding cache, one lookup covers every text of a call (same task/model/size).
+Hits refresh last_used_at for the retention sweep, at most once a day per entry so repeated
+lookups do not turn into a write each.
+"""
+READ_EMBEDDINGS_QUERY = """
+WITH touched AS (
+    UPDATE embedding_cache
+    SET last_used_at = now()
+    WHERE content_hash = ANY(%(hashes)s)
+        AND task = %(task)s
+        AND model = %(model)s
+        AND dimensionality = %(dimensionality)s
+        AND last_used_at < now() - INTERVAL '1 day'
+)
+SELECT content_hash, embedding
+FROM embedding_cache
+WHERE content_hash = ANY(%(hashes)s)
+    AND task = %(task)s
+    AND model = %(model)s
+    AND dimensionality = %(dimensionality)s;
+"""
+
+WRITE_EMBEDDING_QUERY = """
+INSERT INTO embedding_cache (content_hash, task, model, dimensionality, embedding)
+VALUES (%s, %s, %s, %s, %s)
+ON CONFLICT DO NOTHING;
+"""
+
+
+def _text_search_config(name: str) -> str:
+    """
+    Validate a text search configuration name, which is formatted into the statement so the
+    planner can match the full-text expression index.
+    """
+    if not name.isidentifier():
+        raise ValueError(f"Invalid text search configuration: {name!r}")
+    return name
+
+
+def similarity_search_statement(
+    mode: Similarity_Search_Mode,
+    query_embedding: list[float],
+    user_id: str,
+    top_k: int,
+    candidate_depth: int,
+    prefix_dimensions: int = 256,
+    note_depth: int = 20,
+    query_text: str = "",
+    lexical_depth: int = 100,
+    rrf_k: int = 60,
+    text_search_config: str = "english",
+) -> tuple[str, dict]:
+    """
+    Select the similarity search query for a retrieval mode and build its parameters.
+
+    Args:
+        mode (Similarity_Search_Mode): Retrieval mode.
+        query_embedding (list[float]): Query vector.
+        user_id (str): User whose sentences are searched.
+        top_k (int): Number of results to return.
+        candidate_depth (int): Candidates pulled from the index before blending (ANN modes).
+        prefix_dimensions (int): Leading dimensions scanned in prefix mode.
+        note_depth (int): Closest notes whose sentences are scored in centroid mode.
+        query_text (str): Query text matched against the full-text index in hybrid mode.
+        lexical_depth (int): Full-text candidates fused with the vector ones in hybrid mode.
+        rrf_k (int): Reciprocal rank fusion constant in hybrid mode.
+        text_search_config (str): Text search configuration of the full-text index.
+
+    Returns:
+        tuple: (query, params)
+    """
+    params = {
+        "query": str(query_embedding),
+        "user_id": user_id,
+        "top_k": top_k,
+        "candidate_depth": max(candidate_depth, top_k),
+        "note_depth": note_depth,
+        "exclude_note_id": None,
+    }
+    if mode == Similarity_Search_Mode.HYBRID:
+        config = _text_search_config(text_search_config)
+        params.update(query_text=query_text, lexical_depth=lexical_depth, rrf_k=rrf_k)
+        query = HYBRID_SIMILARITY_SEARCH_QUERY.format(
+            config=config,
+            vector="%(query)s::vector",
+            tsquery=HYBRID_LEXICAL_TSQUERY.format(config=config, text="%(query_text)s"),
+        )
+        return query, params
+    if mode in QUANTIZED_CANDIDATE_ORDER:
+        candidate_order = QUANTIZED_CANDIDATE_ORDER[mode].format(
+            column="embedding",
+            query="%(query)s::vector",
+            dimensions=len(query_embedding),
+            prefix_dimensions=prefix_dimensions,
+        )
+        return QUANTIZED_SIMILARITY_SEARCH_QUERY.format(candidate_order=candidate_order), params
+    return SIMILARITY_SEARCH_QUERIES[mode], params
+
+
+def multi_anchor_search_statement(
+    mode: Similarity_Search_Mode,
+    anchor_embeddings: list[list[float]],
+    user_id: str,
+    top_k: int,
+    candidate_depth: int,
+    prefix_dimensions: int = 256,
+    note_depth: int = 20,
+    anchor_texts: list[str] = None,
+    lexical_depth: int = 100,
+    rrf_k: int = 60,
+    text_search_config: str = "english",
+    exclude_note_id: str = None,
+) -> tuple[str, dict]:
+    """
+    Build the single-statement multi-anchor similarity search for a retrieval mode.
+
+    Args:
+        mode (Similarity_Search_Mode): Retrieval mode.
+        anchor_embeddings (list[list[float]]): One query vector per anchor.
+        user_id (str): User whose sentences are searched.
+        top_k (int): Results kept per anchor before de-duplication.
+        candidate_depth (int): Candidates pulled from the index per anchor (ANN modes).
+        prefix_dimensions (int): Leading dimensions scanned in prefix mode.
+        note_depth (int): Closest notes whose sentences are scored in centroid mode.
+        anchor_texts (list[str]): Anchor texts matched against the full-text index in hybrid
+            mode, aligned with anchor_embeddings.
+        lexical_depth (int): Full-text candidates fused per anchor in hybrid mode.
+        rrf_k (int): Reciprocal rank fusion constant in hybrid mode.
+        text_search_config (str): Text search configuration of the full-text index.
+        exclude_note_id (str, optional): Note whose sentences are left out of the results.
+
+    Returns:
+        tuple: (query, params)
+    """
+    params = {
+        "anchors": [str(embedding) for embedding in anchor_embeddings],
+        "user_id": user_id,
+        "top_k": top_k,
+        "candidate_depth": max(candidate_depth, top_k),
+        "note_depth": note_depth,
+        "exclude_note_id": exclude_note_id,
+    }
+    if mode == Similarity_Search_Mode.HYBRID:
+        params.update(
+            anchor_texts=list(anchor_texts or [""] * len(anchor_embeddings)),
+            lexical_depth=lexical_depth,
+            rrf_k=rrf_k,
+        )
+        query = MULTI_ANCHOR_HYBRID_SEARCH_QUERY.format(
+            config=_text_search_config(text_search_config)
+        )
+        return query, params
+    if mode in QUANTIZED_CANDIDATE_ORDER:
+        candidates = MULTI_ANCHOR_QUANTIZED_CANDIDATES.format(
+            candidate_order=QUANTIZED_CANDIDATE_ORDER[mode].format(
+                column="ns.embedding",
+                query="a.embedding",
+                dimensions=len(anchor_embeddings[0]),
+                prefix_dimensions=prefix_dimensions,
+            )
+        )
+    else:
+        candidates = MULTI_ANCHOR_CANDIDATES[mode]
+    return MULTI_ANCHOR_SIMILARITY_SEARCH_QUERY.format(candidates=candidates), params
+
+
+def needs_exact_fallback(mode: Similarity_Search_Mode, rows: list, top_k: int) -> bool:
+    """
+    Whether a search returned fewer rows than asked from index candidates, see
+    INDEX_CANDIDATE_MODES. A user with fewer than top_k sentences is searched twice, which
+    exact mode answers from a handful of rows.
+    """
+    return mode in INDEX_CANDIDATE_MODES and len(rows) < top_k
+
+
+def stage_from_row(row) -> dict:
+    """
+    Map a pipeline_stages row to a dictionary.
+
+    Args:
+        row (tuple): Row in pipeline_stages column order, or None.
+
+    Returns:
+        dict: Stage information, or None when no row was found.
+    """
+    if not row:
+        return None
+    return {
+        "id": row[0],
+        "job_id": row[1],
+        "pipeline_name": row[2],
+        "status": row[3],
+        "attempt_count": row[4],
+        "last_heartbeat": row[5],
+        "error_message": row[6],
+        "started_at": row[7],
+        "completed_at": row[8],
+    }
+
+
+def claim_params(
+    job_id,
+    pipeline_name: str,
+    max_attempts: int,
+    lease_seconds: float,
+    output_retention_days: int = 0,
+) -> dict:
+    """
+    Build CLAIM_STAGE_QUERY parameters; output_retention_days of 0 means outputs are kept.
+    """
+    return {
+        "job_id": job_id,
+        "pipeline_name": pipeline_name,
+        "max_attempts": max_attempts,
+        "lease_seconds": lease_seconds,
+        "output_retention_days": output_retention_days,
+        "in_progress": Pipeline_Stage_Status.IN_PROGRESS.value,
+        "completed": Pipeline_Stage_Status.COMPLETED.value,
+    }
+
+
+def complete_params(
+    pipeline_stage_id, data, attempt_count: int = None, embeddings: bytes = None
+) -> dict:
+    """
+    Build COMPLETE_STAGE_QUERY parameters; data must already be adapted (e.g. Json) and
+    embeddings packed (stage_outputs.split_embeddings()).
+    """
+    return {
+        "stage_id": pipeline_stage_id,
+        "data": data,
+        "embeddings": embeddings,
+        "status": Pipeline_Stage_Status.COMPLETED.value,
+        "attempt_count": attempt_count,
+    }
+
+
+def fail_params(pipeline_stage_id, error_message: str, attempt_count: int = None) -> dict:
+    """
+    Build FAIL_STAGE_QUERY parameters.
+    """
+    return {
+        "stage_id": pipeline_stage_id,
+        "error_message": error_message,
+        "status": Pipeline_Stage_Status.FAILED.value,
+        "completed": Pipeline_Stage_Status.COMPLETED.value,
+        "attempt_count": attempt_count,
+    }
+
+
+def release_params(pipeline_stage_id, attempt_count: int = None) -> dict:
+    """
+    Build RELEASE_STAGE_QUERY parameters.
+    """
+    return {
+        "stage_id": pipeline_stage_id,
+        "status": Pipeline_Stage_Status.PENDING.value,
+        "in_progress": Pipeline_Stage_Status.IN_PROGRESS.value,
+        "attempt_count": attempt_count,
+    }
+
+
+def heartbeat_params(pipeline_stage_id, attempt_count: int) -> dict:
+    """
+    Build HEARTBEAT_STAGE_QUERY parameters.
+    """
+    return {
+        "stage_id": pipeline_stage_id,
+        "in_progress": Pipeline_Stage_Status.IN_PROGRESS.value,
+        "attempt_count": attempt_count,
+    }
+
+
+def claimed_stage_from_row(row) -> dict:
+    """
+    Map a CLAIM_STAGE_QUERY row to a stage dictionary with claim details.
+
+    Args:
+        row (tuple): Stage columns followed by the claimed flag, previous status and
+            lease_expired flag, or None.
+
+    Returns:
+        dict: Stage information with "claimed", "previous_status" and "lease_expired", or None
+            if not found.
+    """
+    if not row:
+        return None
+    stage = stage_from_row(row[:9])
+    stage["claimed"] = row[9]
+    stage["previous_status"] = row[10]
+    stage["lease_expired"] = row[11]
+    return stage
+
+
+def stage_output_from_row(row) -> dict:
+    """
+    Map a READ_STAGE_OUTPUT_QUERY row to a dictionary, packed embeddings merged back into
+    data when they were read.
+
+    Args:
+        row (tuple): Row in STAGE_OUTPUT_COLUMNS order followed by embeddings, or None.
+
+    Returns:
+        dict: Output information, or None when no row was found.
+    """
+    if not row:
+        return None
+    return {
+        "id": row[0],
+        "pipeline_stage_id": row[1],
+        "content": row[2],
+        "data": merge_embeddings(row[3], row[8] if len(row) > 8 else None),
+        "start_second": row[4],
+        "end_second": row[5],
+        "created_at": row[6],
+        "deleted_at": row[7],
+    }
+
+
+def similarity_results_from_rows(rows) -> list[dict]:
+    """
+    Map similarity search rows to result dictionaries.
+
+    Args:
+        rows (list[tuple]): Rows returned by a similarity search query.
+
+    Returns:
+        list: Result dictionaries ordered as returned by the query.
+    """
+    results = []
+    for row in rows:
+        result = {
+            "sentence_index": row[0],
+            "sentence_text": row[1],
+            "distance": row[2],
+            "importance_score": row[3],
+            "timestamp_epoch": row[4],
+            "combined_score": row[5],
+        }
+        # Multi-anchor searches also report the (1-based) anchor that matched best
+        if len(row) > 6:
+            result["anchor_index"] = row[6]
+        results.append(result)
+    return results
+
+
+def metrics_params(
+    user_id: str, job_id: str, pipeline_stage_id: str, llm_call: str, metrics: dict
+) -> tuple:
+    """
+    Build INSERT_METRICS_QUERY parameters from a provider metrics dictionary.
+    """
+    return (user_id, job_id, pipeline_stage_id, llm_call, *metrics.values())
+
+
+def read_embeddings_params(keys: list[tuple]) -> dict:
+    """
+    Build READ_EMBEDDINGS_QUERY parameters from embedding cache keys of one task/model/size.
+    """
+    _, task, model, dimensionality = keys[0]
+    return {
+        "hashes": [key[0] for key in keys],
+        "task": task,
+        "model": model,
+        "dimensionality": dimensionality,
+    }
+
+
+def cached_embeddings_from_rows(rows, keys: list[tuple]) -> dict:
+    """
+    Map READ_EMBEDDINGS_QUERY rows back to their embedding cache keys.
+    """
+    keys_by_hash = {key[0]: key for key in keys}
+    return {keys_by_hash[content_hash]: list(embedding) for content_hash, embedding in rows}
+
+
+def write_embeddings_params(entries: dict) -> list[tuple]:
+    """
+    Build WRITE_EMBEDDING_QUERY parameter rows from key -> embedding entries.
+    """
+    return [(*key, values) for key, values in entries.items()]
+
+
+def staged_sentence_rows(sentences: list[dict]) -> list[tuple]:
+    """
+    Build COPY_SENTENCE_STAGING_QUERY rows from sentences with embeddings.
+
+    Args:
+        sentences (list[dict]): Dicts with sentence_index, sentence_text, embedding and
+            importance_score (optional).
+
+    Returns:
+        list[tuple]: Rows in SENTENCE_STAGING_TYPES order.
+    """
+    rows = []
+    for sentence in sentences:
+        importance_score = sentence.get("importance_score")
+        rows.append(
+            (
+                int(sentence["sentence_index"]),
+                sentence["sentence_text"],
+                [float(value) for value in sentence["embedding"]],
+                None if importance_score is None else float(importance_score),
+            )
+        )
+    return rows
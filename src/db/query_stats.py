@@ -0,0 +1,253 @@
+"""
+Per-statement latency histograms and sampled slow-query plan capture for the Database layer.
+Connections opened with a TimedCursor factory time every statement under a label; a sampled
+fraction of the statements slower than the threshold are explained and their plan logged
+with the job context they ran under.
+"""
+
+import psycopg
+import random
+import threading
+import time
+from psycopg import pq
+from common.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Upper bounds (ms) of the latency buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# EXPLAIN without ANALYZE never runs the statement, so writes can be explained safely
+EXPLAINABLE_PREFIXES = ("select", "with", "insert", "update", "delete")
+
+
+def statement_labels(module) -> dict[str, str]:
+    """
+    Map the text of every *_QUERY constant of a module to a short label, e.g.
+    CLAIM_STAGE_QUERY -> "claim_stage".
+
+    Args:
+        module: Module holding the SQL constants (db.queries).
+
+    Returns:
+        dict: Statement text -> label.
+    """
+    return {
+        value: name[: -len("_QUERY")].lower()
+        for name, value in vars(module).items()
+        if name.endswith("_QUERY") and isinstance(value, str)
+    }
+
+
+def fallback_label(text: str) -> str:
+    """
+    Label for a statement without a known name: its first words, whitespace collapsed.
+    """
+    return " ".join(text.split())[:60]
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram of one statement. Not thread-safe, QueryStats locks.
+    """
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow = 0
+
+    def observe(self, elapsed_ms: float, slow: bool = False):
+        """
+        Count one execution in its bucket.
+        """
+        index = next((i for i, bound in enumerate(self.bounds) if elapsed_ms <= bound), -1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.slow += int(slow)
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Upper bound of the bucket holding the given fraction of executions (max when unbounded).
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        """
+        Counts, mean/max, bucket-resolution p50/p95/p99 and the raw buckets.
+        """
+        buckets = {f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "slow": self.slow,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": buckets,
+        }
+
+
+class QueryStats:
+    """
+    Latency histograms per statement label and the slow-statement sampler shared by every
+    connection of a Database.
+    """
+
+    def __init__(
+        self,
+        slow_ms: float = 250,
+        sample_rate: float = 0.1,
+        labels: dict[str, str] = None,
+        context=None,
+    ):
+        """
+        Initialize the collector.
+
+        Args:
+            slow_ms (float): Statements at or above this latency count as slow.
+            sample_rate (float): Fraction of slow statements explained and logged (0 disables).
+            labels (dict, optional): Statement text -> label, see statement_labels().
+            context (callable, optional): Returns the job context (e.g. job_id) of the
+                calling thread, logged with captured plans.
+        """
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.labels = labels or {}
+        self.context = context
+        self._lock = threading.Lock()
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self.plans_captured = 0
+
+    def label(self, query) -> str:
+        """
+        Label of a statement: its known name, or its leading text.
+        """
+        if not isinstance(query, str):
+            return "composed"
+        return self.labels.get(query) or fallback_label(query)
+
+    def observe(self, label: str, elapsed_ms: float) -> bool:
+        """
+        Record one execution.
+
+        Returns:
+            bool: True if the statement was slow and sampled for plan capture.
+        """
+        slow = elapsed_ms >= self.slow_ms
+        with self._lock:
+            histogram = self._histograms.get(label)
+            if histogram is None:
+                histogram = self._histograms[label] = LatencyHistogram()
+            histogram.observe(elapsed_ms, slow)
+        return slow and random.random() < self.sample_rate
+
+    def log_plan(self, label: str, elapsed_ms: float, plan, context: dict = None):
+        """
+        Log the plan of a slow statement with the job context of the calling thread.
+        """
+        with self._lock:
+            self.plans_captured += 1
+        extra = dict(self.context() or {}) if self.context else {}
+        extra.update(context or {})
+        logger.warning(
+            "Slow query plan captured",
+            extra={
+                **extra,
+                "statement": label,
+                "elapsed_ms": round(elapsed_ms, 3),
+                "slow_ms": self.slow_ms,
+                "plan": plan,
+            },
+        )
+
+    def stats(self) -> dict:
+        """
+        Snapshot of every statement's histogram, keyed by label.
+        """
+        with self._lock:
+            return {label: h.snapshot() for label, h in sorted(self._histograms.items())}
+
+    def cursor_factory(self) -> type:
+        """
+        TimedCursor subclass reporting to this collector, for the connections' cursor_factory.
+        """
+        return type("TimedCursor", (TimedCursor,), {"query_stats": self})
+
+
+class TimedCursor(psycopg.Cursor):
+    """
+    Cursor timing every execute() into its QueryStats. Accepts an optional label (statement
+    name) and context (e.g. user_id) logged with a captured plan.
+    """
+
+    query_stats: QueryStats = None
+
+    def execute(self, query, params=None, *, label: str = None, context: dict = None, **kwargs):
+        """
+        Execute a statement, timing it unless it is queued in pipeline mode.
+        """
+        stats = self.query_stats
+        if stats is None or self.connection.pgconn.pipeline_status != pq.PipelineStatus.OFF:
+            # Pipelined statements return before the server ran them, nothing to time
+            return super().execute(query, params, **kwargs)
+
+        start = time.perf_counter()
+        result = super().execute(query, params, **kwargs)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        label = label or stats.label(query)
+        if stats.observe(label, elapsed_ms):
+            plan = self._explain(query, params)
+            if plan is not None:
+                stats.log_plan(label, elapsed_ms, plan, context)
+        return result
+
+    def executemany(self, query, params_seq, *, label: str = None, **kwargs):
+        """
+        Execute a statement for each parameter set, timed as a single execution.
+        """
+        stats = self.query_stats
+        if stats is None or self.connection.pgconn.pipeline_status != pq.PipelineStatus.OFF:
+            return super().executemany(query, params_seq, **kwargs)
+
+        start = time.perf_counter()
+        result = super().executemany(query, params_seq, **kwargs)
+        stats.observe(label or stats.label(query), (time.perf_counter() - start) * 1000)
+        return result
+
+    def _explain(self, query, params):
+        """
+        EXPLAIN (FORMAT JSON) the statement with the same parameters on a separate plain
+        cursor, so this cursor's results are untouched. Skipped inside a transaction, where a
+        failing EXPLAIN would abort it.
+
+        Returns:
+            list | None: The JSON plan, None when it was not captured.
+        """
+        if not isinstance(query, str) or not query.lstrip().lower().startswith(
+            EXPLAINABLE_PREFIXES
+        ):
+            return None
+        if self.connection.info.transaction_status != pq.TransactionStatus.IDLE:
+            return None
+        try:
+            with psycopg.Cursor(self.connection) as cursor:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                return cursor.fetchone()[0]
+        except psycopg.Error as e:
+            logger.debug("Slow query plan capture failed", extra={"error": str(e)})
+            return None
@@ -0,0 +1,166 @@
+"""
+In-process similarity result cache of the database layer.
+Entries are keyed by user, the user's corpus version (note_sentence_stats.version, bumped by
+trigger on every change to the user's sentences), search mode, top_k and a hash of the
+anchor embeddings, so a change to a user's notes invalidates exactly that user's entries.
+"""
+
+import hashlib
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+
+def similarity_cache_key(
+    user_id: str,
+    version: int,
+    mode: str,
+    top_k: int,
+    embeddings: list[list[float]],
+    exclude_note_id: str = None,
+) -> tuple:
+    """
+    Build the cache key of one similarity search.
+
+    Args:
+        user_id (str): User whose sentences are searched.
+        version (int): The user's corpus version read before the search.
+        mode (str): Retrieval mode.
+        top_k (int): Results requested (per anchor for multi-anchor searches).
+        embeddings (list[list[float]]): Anchor embeddings, one for a single-query search.
+        exclude_note_id (str, optional): Note left out of the results.
+
+    Returns:
+        tuple: (user_id, version, mode, top_k, embeddings digest, exclude_note_id)
+    """
+    digest = hashlib.sha256()
+    for embedding in embeddings:
+        digest.update(array("d", embedding).tobytes())
+        digest.update(b"|")
+    return user_id, version, str(mode), top_k, digest.hexdigest(), exclude_note_id
+
+
+def _results_size(results: list[dict]) -> int:
+    """
+    Approximate memory held by a result list (containers and values, shared keys excluded).
+    """
+    size = sys.getsizeof(results)
+    for result in results:
+        size += sys.getsizeof(result) + sum(sys.getsizeof(value) for value in result.values())
+    return size
+
+
+class SimilarityResultCache:
+    """
+    Thread-safe LRU of similarity search results bounded by entry count and approximate
+    memory. Seeing a newer corpus version for a user drops that user's older entries.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0):
+        """
+        Args:
+            max_entries (int): Entries kept before the least recently used one is evicted.
+            max_bytes (int): Approximate memory bound in bytes, 0 bounds by entries only.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[int, list[dict]]] = OrderedDict()
+        self._user_keys: dict[str, set] = {}
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        """
+        Look a search up and count the hit or miss.
+
+        Args:
+            key (tuple): Key built by similarity_cache_key().
+
+        Returns:
+            list[dict] | None: Copies of the cached results, None on a miss.
+        """
+        with self._lock:
+            self._observe_version(key[0], key[1])
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(result) for result in entry[1]]
+
+    def put(self, key: tuple, results: list[dict]):
+        """
+        Store the results of a search, unless a newer version of the user was already seen.
+
+        Args:
+            key (tuple): Key built by similarity_cache_key().
+            results (list[dict]): Search results.
+        """
+        user_id, version = key[0], key[1]
+        results = [dict(result) for result in results]
+        size = _results_size(results)
+        with self._lock:
+            self._observe_version(user_id, version)
+            if self._versions.get(user_id, version) != version:
+                return
+            self._versions[user_id] = version
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (size, results)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            self.bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes and self.bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _observe_version(self, user_id: str, version: int):
+        """
+        Drop a user's cached entries once a newer version of the user is seen. Versions are
+        only tracked while the user has entries. Lock held.
+        """
+        known = self._versions.get(user_id)
+        if known is None or known >= version:
+            return
+        stale = list(self._user_keys.get(user_id, ()))
+        for key in stale:
+            self._remove(key)
+        self.invalidations += len(stale)
+
+    def _remove(self, key: tuple):
+        """
+        Drop one entry and its bookkeeping. Lock held.
+        """
+        size, _ = self._entries.pop(key)
+        self.bytes -= size
+        user_keys = self._user_keys.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[key[0]]
+                self._versions.pop(key[0], None)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of hit rate, evictions, invalidations and current size.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+            }
@@ -0,0 +1,851 @@
+"""
+Versioned schema migrations owned by this service.
+Applied once at startup, in order, each in its own transaction under an advisory lock so
+concurrently starting instances never run the same migration twice.
+"""
+
+import psycopg
+from config.config import Similarity_Search_Mode
+from common.logging import get_logger
+from db.partitions import IS_PARTITIONED_QUERY, LIST_PARTITIONS_QUERY
+
+logger = get_logger(__name__)
+
+# Arbitrary constant shared by every instance of the service
+MIGRATION_LOCK_KEY = 727_001
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+"""
+Per-user ranking normalizers for similarity search. Inserts widen the stored bounds with
+GREATEST/LEAST in one upsert per statement; deletes and updates can shrink them, so the
+affected users are recomputed from note_sentences. version increases on every change to
+a user's sentences.
+"""
+NOTE_SENTENCE_STATS = """
+CREATE TABLE IF NOT EXISTS note_sentence_stats (
+    user_id TEXT PRIMARY KEY,
+    sentence_count BIGINT NOT NULL DEFAULT 0,
+    max_importance DOUBLE PRECISION,
+    min_ts NUMERIC,
+    max_ts NUMERIC,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION note_sentence_stats_on_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO note_sentence_stats AS s
+        (user_id, sentence_count, max_importance, min_ts, max_ts)
+    SELECT
+        user_id,
+        COUNT(*),
+        MAX(importance_score),
+        EXTRACT(EPOCH FROM MIN(created_at)),
+        EXTRACT(EPOCH FROM MAX(created_at))
+    FROM new_rows
+    GROUP BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        sentence_count = s.sentence_count + EXCLUDED.sentence_count,
+        max_importance = GREATEST(s.max_importance, EXCLUDED.max_importance),
+        min_ts = LEAST(s.min_ts, EXCLUDED.min_ts),
+        max_ts = GREATEST(s.max_ts, EXCLUDED.max_ts),
+        version = s.version + 1,
+        updated_at = now();
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION note_sentence_stats_on_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO note_sentence_stats AS s
+            (user_id, sentence_count, max_importance, min_ts, max_ts)
+        SELECT
+            a.user_id,
+            COUNT(ns.user_id),
+            MAX(ns.importance_score),
+            EXTRACT(EPOCH FROM MIN(ns.created_at)),
+            EXTRACT(EPOCH FROM MAX(ns.created_at))
+        FROM (SELECT user_id FROM old_rows UNION SELECT user_id FROM new_rows) a
+        LEFT JOIN note_sentences ns ON ns.user_id = a.user_id
+        GROUP BY a.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            sentence_count = EXCLUDED.sentence_count,
+            max_importance = EXCLUDED.max_importance,
+            min_ts = EXCLUDED.min_ts,
+            max_ts = EXCLUDED.max_ts,
+            version = s.version + 1,
+            updated_at = now();
+    ELSE
+        INSERT INTO note_sentence_stats AS s
+            (user_id, sentence_count, max_importance, min_ts, max_ts)
+        SELECT
+            a.user_id,
+            COUNT(ns.user_id),
+            MAX(ns.importance_score),
+            EXTRACT(EPOCH FROM MIN(ns.created_at)),
+            EXTRACT(EPOCH FROM MAX(ns.created_at))
+        FROM (SELECT DISTINCT user_id FROM old_rows) a
+        LEFT JOIN note_sentences ns ON ns.user_id = a.user_id
+        GROUP BY a.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            sentence_count = EXCLUDED.sentence_count,
+            max_importance = EXCLUDED.max_importance,
+            min_ts = EXCLUDED.min_ts,
+            max_ts = EXCLUDED.max_ts,
+            version = s.version + 1,
+            updated_at = now();
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION note_sentence_stats_on_truncate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE note_sentence_stats SET
+        sentence_count = 0,
+        max_importance = NULL,
+        min_ts = NULL,
+        max_ts = NULL,
+        version = version + 1,
+        updated_at = now();
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS note_sentence_stats_insert ON note_sentences;
+CREATE TRIGGER note_sentence_stats_insert
+    AFTER INSERT ON note_sentences
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_sentence_stats_on_insert();
+
+DROP TRIGGER IF EXISTS note_sentence_stats_update ON note_sentences;
+CREATE TRIGGER note_sentence_stats_update
+    AFTER UPDATE ON note_sentences
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_sentence_stats_on_change();
+
+DROP TRIGGER IF EXISTS note_sentence_stats_delete ON note_sentences;
+CREATE TRIGGER note_sentence_stats_delete
+    AFTER DELETE ON note_sentences
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_sentence_stats_on_change();
+
+DROP TRIGGER IF EXISTS note_sentence_stats_truncate ON note_sentences;
+CREATE TRIGGER note_sentence_stats_truncate
+    AFTER TRUNCATE ON note_sentences
+    FOR EACH STATEMENT EXECUTE FUNCTION note_sentence_stats_on_truncate();
+
+-- Backfill existing history; the triggers above already hold the table lock
+INSERT INTO note_sentence_stats (user_id, sentence_count, max_importance, min_ts, max_ts)
+SELECT
+    user_id,
+    COUNT(*),
+    MAX(importance_score),
+    EXTRACT(EPOCH FROM MIN(created_at)),
+    EXTRACT(EPOCH FROM MAX(created_at))
+FROM note_sentences
+GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
+"""
+
+# Embeddings by content hash, filled by the embedding cache behind the in-process LRU
+EMBEDDING_CACHE = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    content_hash TEXT NOT NULL,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dimensionality INTEGER NOT NULL,
+    embedding REAL[] NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (content_hash, task, model, dimensionality)
+);
+"""
+
+"""
+One centroid (mean sentence embedding) per note for the centroid search mode. The table is
+created from note_sentences' own column types so joins back to it stay index-friendly.
+Notes touched by a statement are recomputed from their (few) sentences, which keeps
+inserts, updates and deletes exact; notes left without sentences are removed.
+"""
+NOTE_CENTROIDS = """
+CREATE TABLE IF NOT EXISTS note_centroids AS
+SELECT
+    user_id,
+    note_id,
+    embedding AS centroid,
+    0::BIGINT AS sentence_count,
+    now() AS updated_at
+FROM note_sentences
+WITH NO DATA;
+
+ALTER TABLE note_centroids ADD PRIMARY KEY (user_id, note_id);
+
+CREATE OR REPLACE FUNCTION note_centroids_refresh() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH affected AS (
+        SELECT DISTINCT user_id, note_id FROM changed_rows
+    )
+    , refreshed AS (
+        INSERT INTO note_centroids AS c (user_id, note_id, centroid, sentence_count, updated_at)
+        SELECT a.user_id, a.note_id, AVG(ns.embedding), COUNT(*), now()
+        FROM affected a
+        JOIN note_sentences ns ON ns.user_id = a.user_id AND ns.note_id = a.note_id
+        GROUP BY a.user_id, a.note_id
+        ON CONFLICT (user_id, note_id) DO UPDATE SET
+            centroid = EXCLUDED.centroid,
+            sentence_count = EXCLUDED.sentence_count,
+            updated_at = EXCLUDED.updated_at
+    )
+    DELETE FROM note_centroids c
+    USING affected a
+    WHERE c.user_id = a.user_id
+        AND c.note_id = a.note_id
+        AND NOT EXISTS (
+            SELECT 1 FROM note_sentences ns
+            WHERE ns.user_id = a.user_id AND ns.note_id = a.note_id
+        );
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION note_centroids_on_truncate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM note_centroids;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS note_centroids_insert ON note_sentences;
+CREATE TRIGGER note_centroids_insert
+    AFTER INSERT ON note_sentences
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_centroids_refresh();
+
+-- Updates refresh both the notes sentences left and the notes they moved to
+DROP TRIGGER IF EXISTS note_centroids_update_old ON note_sentences;
+CREATE TRIGGER note_centroids_update_old
+    AFTER UPDATE ON note_sentences
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_centroids_refresh();
+
+DROP TRIGGER IF EXISTS note_centroids_update_new ON note_sentences;
+CREATE TRIGGER note_centroids_update_new
+    AFTER UPDATE ON note_sentences
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_centroids_refresh();
+
+DROP TRIGGER IF EXISTS note_centroids_delete ON note_sentences;
+CREATE TRIGGER note_centroids_delete
+    AFTER DELETE ON note_sentences
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_centroids_refresh();
+
+DROP TRIGGER IF EXISTS note_centroids_truncate ON note_sentences;
+CREATE TRIGGER note_centroids_truncate
+    AFTER TRUNCATE ON note_sentences
+    FOR EACH STATEMENT EXECUTE FUNCTION note_centroids_on_truncate();
+
+INSERT INTO note_centroids (user_id, note_id, centroid, sentence_count, updated_at)
+SELECT user_id, note_id, AVG(embedding), COUNT(*), now()
+FROM note_sentences
+GROUP BY user_id, note_id
+ON CONFLICT (user_id, note_id) DO NOTHING;
+"""
+
+"""
+Job bookkeeping tables written by the pipelines. Deployments that predate this migration
+already have them (possibly with an enum status column), so existing tables are left as
+they are; their indexes are checked separately by verify_indexes().
+"""
+PIPELINE_TABLES = """
+CREATE TABLE IF NOT EXISTS pipeline_stages (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    job_id UUID NOT NULL,
+    pipeline_name TEXT,
+    status TEXT NOT NULL DEFAULT 'PENDING',
+    attempt_count INTEGER NOT NULL DEFAULT 0,
+    last_heartbeat TIMESTAMP,
+    error_message TEXT,
+    started_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    UNIQUE (job_id, pipeline_name)
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_outputs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    pipeline_stage_id UUID NOT NULL,
+    content TEXT,
+    data JSONB,
+    start_second INTEGER,
+    end_second INTEGER,
+    created_at TIMESTAMP DEFAULT now(),
+    deleted_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS llm_metrics (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id TEXT,
+    job_id UUID,
+    pipeline_stage_id UUID NOT NULL,
+    llm_call TEXT,
+    input_tokens INTEGER,
+    prompt_tokens INTEGER,
+    total_input_tokens INTEGER,
+    output_tokens INTEGER,
+    thought_tokens INTEGER,
+    confidence_score DOUBLE PRECISION,
+    elapsed_time DOUBLE PRECISION,
+    model TEXT
+);
+"""
+
+"""
+Converts llm_metrics and pipeline_outputs into tables range-partitioned by month on created_at
+(see db/partitions.py). Rows without created_at take the completion (or start) time of their
+stage, so retention ages history out by when it was produced. The existing rows are copied
+once into one partition per month they span up to the current one and the old table is
+dropped; a DEFAULT partition catches rows outside the premade months. The primary key becomes
+(id, created_at) since a partitioned table's unique keys must contain the partition key.
+Defaults, CHECK constraints, foreign keys and non-unique indexes are carried over. A table
+another table's foreign key references cannot be partitioned (its id is no longer unique), so
+the migration stops before changing anything instead.
+"""
+TIME_PARTITIONING = """
+DO $$
+DECLARE
+    t TEXT;
+    legacy TEXT;
+    month TIMESTAMP;
+    bound TIMESTAMP := date_trunc('month', now()) + INTERVAL '1 month';
+    referencing TEXT;
+    carried TEXT[];
+    ddl TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['llm_metrics', 'pipeline_outputs'] LOOP
+        IF (SELECT relkind FROM pg_class WHERE oid = t::regclass) = 'p' THEN
+            CONTINUE;
+        END IF;
+        SELECT string_agg(format('%s (%s)', conname, conrelid::regclass), ', ') INTO referencing
+        FROM pg_constraint WHERE contype = 'f' AND confrelid = t::regclass;
+        IF referencing IS NOT NULL THEN
+            RAISE EXCEPTION 'Cannot partition %: referenced by foreign keys %', t, referencing;
+        END IF;
+        legacy := t || '_legacy';
+
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS created_at TIMESTAMP', t);
+        EXECUTE format(
+            'UPDATE %I r SET created_at = COALESCE(s.completed_at, s.started_at, now()) '
+            'FROM pipeline_stages s WHERE s.id = r.pipeline_stage_id AND r.created_at IS NULL',
+            t
+        );
+        EXECUTE format('UPDATE %I SET created_at = now() WHERE created_at IS NULL', t);
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', t, legacy);
+
+        -- Foreign keys and non-unique indexes are re-created once the legacy table is gone
+        SELECT array_agg(
+            format('ALTER TABLE %I ADD CONSTRAINT %I %s', t, conname, pg_get_constraintdef(oid))
+        ) INTO carried
+        FROM pg_constraint WHERE contype = 'f' AND conrelid = legacy::regclass;
+        SELECT carried || array_agg(
+            regexp_replace(pg_get_indexdef(indexrelid), ' ON (ONLY )?\\S+ USING ',
+                format(' ON %I USING ', t))
+        ) INTO carried
+        FROM pg_index WHERE indrelid = legacy::regclass AND NOT indisunique;
+
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE %I INCLUDING ALL EXCLUDING INDEXES, '
+            'CONSTRAINT %I PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)',
+            t, legacy, t || '_id_created_at_pkey'
+        );
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN created_at SET DEFAULT now()', t);
+        FOR month IN EXECUTE format(
+            'SELECT generate_series(date_trunc(''month'', min(created_at)), %L::timestamp '
+            '- INTERVAL ''1 month'', INTERVAL ''1 month'') FROM %I',
+            bound, legacy
+        ) LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                t || '_p' || to_char(month, 'YYYYMM'), t, month, month + INTERVAL '1 month'
+            );
+        END LOOP;
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', t || '_default', t);
+        EXECUTE format('INSERT INTO %I SELECT * FROM %I', t, legacy);
+        EXECUTE format('DROP TABLE %I', legacy);
+        FOREACH ddl IN ARRAY coalesce(carried, '{}') LOOP
+            EXECUTE ddl;
+        END LOOP;
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON %I (pipeline_stage_id)',
+            t || '_pipeline_stage_id_idx', t
+        );
+    END LOOP;
+END;
+$$;
+"""
+
+"""
+Records in note_sentence_stats.changed_version the last version produced by an UPDATE, DELETE
+or TRUNCATE of a user's sentences. A reader holding the user's sentences at version v only
+has to fetch newly inserted rows while changed_version <= v. Same-event triggers fire in name
+order, so the *_changed triggers run after the stats triggers have bumped version.
+"""
+NOTE_SENTENCE_CHANGES = """
+ALTER TABLE note_sentence_stats ADD COLUMN IF NOT EXISTS changed_version BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION note_sentence_stats_mark_changed() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE note_sentence_stats SET changed_version = version;
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE note_sentence_stats s SET changed_version = s.version
+        FROM (SELECT user_id FROM old_rows UNION SELECT user_id FROM new_rows) a
+        WHERE s.user_id = a.user_id;
+    ELSE
+        UPDATE note_sentence_stats s SET changed_version = s.version
+        FROM (SELECT DISTINCT user_id FROM old_rows) a
+        WHERE s.user_id = a.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS note_sentence_stats_update_changed ON note_sentences;
+CREATE TRIGGER note_sentence_stats_update_changed
+    AFTER UPDATE ON note_sentences
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_sentence_stats_mark_changed();
+
+DROP TRIGGER IF EXISTS note_sentence_stats_delete_changed ON note_sentences;
+CREATE TRIGGER note_sentence_stats_delete_changed
+    AFTER DELETE ON note_sentences
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION note_sentence_stats_mark_changed();
+
+DROP TRIGGER IF EXISTS note_sentence_stats_truncate_changed ON note_sentences;
+CREATE TRIGGER note_sentence_stats_truncate_changed
+    AFTER TRUNCATE ON note_sentences
+    FOR EACH STATEMENT EXECUTE FUNCTION note_sentence_stats_mark_changed();
+"""
+
+"""
+Packed stage output embeddings (db/stage_outputs.py). A nullable column is a catalog-only change
+on the partitioned table and its partitions; rows written before keep their inline JSONB
+embeddings. EXTERNAL storage skips compression attempts on float data.
+"""
+PIPELINE_OUTPUT_EMBEDDINGS = """
+ALTER TABLE pipeline_outputs ADD COLUMN IF NOT EXISTS embeddings BYTEA;
+ALTER TABLE pipeline_outputs ALTER COLUMN embeddings SET STORAGE EXTERNAL;
+"""
+
+"""
+Retention of the persistent embedding cache: last_used_at is refreshed by lookups (at most
+daily) and the partition manager deletes entries unused for EMBEDDING_CACHE_RETENTION_DAYS.
+A constant default is a catalog-only change, existing entries start their window now.
+"""
+EMBEDDING_CACHE_RETENTION = """
+ALTER TABLE embedding_cache ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS embedding_cache_last_used_at_idx ON embedding_cache (last_used_at);
+"""
+
+# (version, name, sql) applied in ascending version order, never edit an applied entry
+MIGRATIONS = [
+    (1, "note_sentence_stats", NOTE_SENTENCE_STATS),
+    (2, "embedding_cache", EMBEDDING_CACHE),
+    (3, "note_centroids", NOTE_CENTROIDS),
+    (4, "pipeline_tables", PIPELINE_TABLES),
+    (5, "time_partitioning", TIME_PARTITIONING),
+    (6, "note_sentence_changes", NOTE_SENTENCE_CHANGES),
+    (7, "pipeline_output_embeddings", PIPELINE_OUTPUT_EMBEDDINGS),
+    (8, "embedding_cache_retention", EMBEDDING_CACHE_RETENTION),
+]
+
+
+def apply_migrations(conn, migrations: list[tuple[int, str, str]] = None) -> list[int]:
+    """
+    Apply every migration not yet recorded in schema_migrations.
+
+    Args:
+        conn (psycopg.Connection): Autocommit connection, each migration gets its own transaction.
+        migrations (list): Migrations to consider, defaults to MIGRATIONS.
+
+    Returns:
+        list[int]: Versions applied by this call.
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    applied = []
+
+    conn.execute(CREATE_MIGRATIONS_TABLE)
+    for version, name, sql in sorted(migrations):
+        with conn.transaction():
+            conn.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+            already_applied = conn.execute(
+                "SELECT 1 FROM schema_migrations WHERE version = %s", (version,)
+            ).fetchone()
+            if already_applied:
+                continue
+
+            logger.info("Applying schema migration", extra={"version": version, "migration": name})
+            conn.execute(sql)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+            )
+            applied.append(version)
+
+    return applied
+
+
+"""
+Expression indexes a search mode scans besides the plain HNSW index: HNSW indexes over
+quantized copies of note_sentences.embedding for the halfvec, binary and prefix modes
+(pgvector >= 0.7), and the full-text GIN index of hybrid mode. The table keeps the full
+vectors for reranking, so existing rows need no rewrite: building the index is the whole
+migration. Built CONCURRENTLY (outside a transaction) so sentence inserts keep flowing.
+"""
+SEARCH_MODE_INDEXES = {
+    Similarity_Search_Mode.HALFVEC: (
+        "note_sentences_embedding_halfvec_idx",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS note_sentences_embedding_halfvec_idx "
+        "ON note_sentences USING hnsw ((embedding::halfvec({dimensions})) halfvec_cosine_ops)",
+    ),
+    Similarity_Search_Mode.BINARY: (
+        "note_sentences_embedding_binary_idx",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS note_sentences_embedding_binary_idx "
+        "ON note_sentences USING hnsw ((binary_quantize(embedding)::bit({dimensions})) "
+        "bit_hamming_ops)",
+    ),
+    # One index per prefix length, changing SIMILARITY_PREFIX_DIMENSIONS builds a new one
+    Similarity_Search_Mode.PREFIX: (
+        "note_sentences_embedding_prefix{prefix_dimensions}_idx",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+        "note_sentences_embedding_prefix{prefix_dimensions}_idx ON note_sentences USING hnsw "
+        "((subvector(embedding, 1, {prefix_dimensions})::vector({prefix_dimensions})) "
+        "vector_cosine_ops)",
+    ),
+    # Plain GIN over the expression hybrid queries filter on; the user filter is applied to
+    # the matches (a composite index would need btree_gin). One index per configuration.
+    Similarity_Search_Mode.HYBRID: (
+        "note_sentences_text_{text_search_config}_idx",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS note_sentences_text_{text_search_config}_idx "
+        "ON note_sentences USING gin "
+        "(to_tsvector('{text_search_config}'::regconfig, sentence_text))",
+    ),
+}
+
+
+def ensure_search_mode_index(
+    conn,
+    mode: Similarity_Search_Mode,
+    dimensions: int,
+    prefix_dimensions: int = 256,
+    text_search_config: str = "english",
+) -> bool:
+    """
+    Build the expression index a search mode scans, if it is missing or invalid.
+
+    Args:
+        conn (psycopg.Connection): Autocommit connection (CONCURRENTLY cannot run in a transaction).
+        mode (Similarity_Search_Mode): Configured search mode.
+        dimensions (int): Embedding dimensionality, part of the index expression.
+        prefix_dimensions (int): Leading dimensions indexed in prefix mode.
+        text_search_config (str): Text search configuration indexed in hybrid mode.
+
+    Returns:
+        bool: True if the index was built by this call.
+    """
+    if mode not in SEARCH_MODE_INDEXES:
+        return False
+    if not text_search_config.isidentifier():
+        raise ValueError(f"Invalid text search configuration: {text_search_config!r}")
+    index_name, ddl = (
+        template.format(
+            dimensions=dimensions,
+            prefix_dimensions=prefix_dimensions,
+            text_search_config=text_search_config,
+        )
+        for template in SEARCH_MODE_INDEXES[mode]
+    )
+
+    # Session lock: one instance builds, the others wait and then find a valid index
+    conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        row = conn.execute(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = %s",
+            (index_name,),
+        ).fetchone()
+        if row and row[0]:
+            return False
+        if row:
+            # Left behind by an interrupted concurrent build
+            conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+        logger.info("Building search mode index", extra={"index": index_name, "mode": mode.value})
+        conn.execute(ddl)
+        return True
+    finally:
+        conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+
+class SchemaVerificationError(RuntimeError):
+    """Raised when indexes the service cannot run without are missing."""
+
+    pass
+
+
+"""
+Indexes the hot queries rely on, matched by table, access method and leading key columns
+rather than by name so equivalent indexes created by hand (or by a primary key) count.
+critical indexes stop a production start when missing; modes limits an entry to the
+similarity search modes that scan it.
+"""
+REQUIRED_INDEXES = [
+    {
+        "index": "pipeline_stages_job_id_pipeline_name_key",
+        "table": "pipeline_stages",
+        "columns": ("job_id", "pipeline_name"),
+        "method": "btree",
+        "unique": True,
+        "critical": True,
+        "impact": "every stage read and claim scans pipeline_stages, and concurrent "
+        "redeliveries can create duplicate stages",
+    },
+    {
+        "index": "pipeline_outputs_pipeline_stage_id_idx",
+        "table": "pipeline_outputs",
+        "columns": ("pipeline_stage_id",),
+        "method": "btree",
+        "critical": True,
+        "impact": "read_stage_output and every stage claim scan pipeline_outputs, "
+        "growing linearly with job history",
+    },
+    {
+        "index": "note_sentences_user_id_note_id_idx",
+        "table": "note_sentences",
+        "columns": ("user_id", "note_id"),
+        "method": "btree",
+        "critical": True,
+        "impact": "similarity searches and the stats/centroid triggers scan every user's "
+        "sentences instead of one user's",
+    },
+    {
+        "index": "llm_metrics_pipeline_stage_id_idx",
+        "table": "llm_metrics",
+        "columns": ("pipeline_stage_id",),
+        "method": "btree",
+        "critical": False,
+        "impact": "per-stage metrics lookups scan llm_metrics, writes are unaffected",
+    },
+    {
+        "index": "note_sentences_embedding_idx",
+        "table": "note_sentences",
+        "columns": ("embedding",),
+        "method": "hnsw",
+        "opclass": "vector_cosine_ops",
+        "critical": True,
+        "modes": (Similarity_Search_Mode.ANN, Similarity_Search_Mode.HYBRID),
+        "impact": (
+            "ann and hybrid similarity search fall back to an exact scan of the user's sentences"
+        ),
+    },
+]
+
+# Valid indexes on the given tables with their key column names (NULL for expressions)
+EXISTING_INDEXES_QUERY = """
+SELECT
+    t.relname,
+    am.amname,
+    i.indisunique,
+    ARRAY(
+        SELECT a.attname
+        FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+        LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE k.ord <= i.indnkeyatts
+        ORDER BY k.ord
+    )
+FROM pg_index i
+JOIN pg_class t ON t.oid = i.indrelid
+JOIN pg_class ic ON ic.oid = i.indexrelid
+JOIN pg_am am ON am.oid = ic.relam
+WHERE t.relname = ANY(%s)
+    AND t.relnamespace = current_schema()::regnamespace
+    AND i.indisvalid;
+"""
+
+
+def required_indexes(search_mode: Similarity_Search_Mode) -> list[dict]:
+    """
+    Required index entries that apply to the configured similarity search mode.
+    """
+    return [
+        spec
+        for spec in REQUIRED_INDEXES
+        if spec.get("modes") is None or search_mode in spec["modes"]
+    ]
+
+
+def _covers(spec: dict, method: str, unique: bool, columns: list) -> bool:
+    """
+    Check whether an existing index serves a required index entry.
+    """
+    if method != spec["method"]:
+        return False
+    if spec.get("unique"):
+        # Only an index on exactly these columns enforces their uniqueness
+        return unique and tuple(columns) == spec["columns"]
+    return tuple(columns[: len(spec["columns"])]) == spec["columns"]
+
+
+def missing_indexes(conn, specs: list[dict]) -> list[dict]:
+    """
+    Find required indexes with no valid equivalent in the database.
+
+    Args:
+        conn (psycopg.Connection): Database connection.
+        specs (list[dict]): REQUIRED_INDEXES entries to check.
+
+    Returns:
+        list[dict]: Entries of specs that are missing.
+    """
+    tables = sorted({spec["table"] for spec in specs})
+    existing = conn.execute(EXISTING_INDEXES_QUERY, (tables,)).fetchall()
+    return [
+        spec
+        for spec in specs
+        if not any(
+            table == spec["table"] and _covers(spec, method, unique, columns)
+            for table, method, unique, columns in existing
+        )
+    ]
+
+
+def _index_ddl(spec: dict, table: str, name: str, only: bool = False) -> str:
+    """
+    CREATE INDEX statement of a required index entry on table, concurrent unless only is set
+    (ON ONLY a partitioned parent, which Postgres cannot build concurrently).
+    """
+    columns = ", ".join(spec["columns"])
+    if spec.get("opclass"):
+        columns = f"{columns} {spec['opclass']}"
+    unique = "UNIQUE " if spec.get("unique") else ""
+    if only:
+        target = f"IF NOT EXISTS {name} ON ONLY {table}"
+    else:
+        target = f"CONCURRENTLY IF NOT EXISTS {name} ON {table}"
+    return f"CREATE {unique}INDEX {target} USING {spec['method']} ({columns})"
+
+
+def _drop_invalid_index(conn, name: str):
+    """
+    Drop an index left invalid by an interrupted concurrent build.
+    """
+    row = conn.execute(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = %s",
+        (name,),
+    ).fetchone()
+    if row and not row[0]:
+        conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def _build_partitioned_index(conn, spec: dict):
+    """
+    Build a required index of a partitioned table without blocking writes: the parent index
+    is created ON ONLY (invalid and empty), each partition's index is built concurrently and
+    attached, and the parent index turns valid once every partition has one.
+    """
+    conn.execute(_index_ddl(spec, spec["table"], spec["index"], only=True))
+    for partition, _ in conn.execute(LIST_PARTITIONS_QUERY, (spec["table"],)).fetchall():
+        name = f"{partition}_{'_'.join(spec['columns'])}_idx"
+        _drop_invalid_index(conn, name)
+        conn.execute(_index_ddl(spec, partition, name))
+        conn.execute(f"ALTER INDEX {spec['index']} ATTACH PARTITION {name}")
+
+
+def _build_index(conn, spec: dict) -> bool:
+    """
+    Build one required index concurrently, dropping a leftover invalid build first.
+    Partitioned tables are indexed partition by partition, see _build_partitioned_index().
+
+    Returns:
+        bool: True if the index was built.
+    """
+    conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        # Another instance may have finished the build while this one waited for the lock
+        if not missing_indexes(conn, [spec]):
+            return False
+
+        logger.info("Building missing index", extra={"index": spec["index"]})
+        partitioned = conn.execute(IS_PARTITIONED_QUERY, (spec["table"],)).fetchone()
+        if partitioned and partitioned[0]:
+            _build_partitioned_index(conn, spec)
+        else:
+            _drop_invalid_index(conn, spec["index"])
+            conn.execute(_index_ddl(spec, spec["table"], spec["index"]))
+        return True
+    except psycopg.Error as e:
+        # e.g. duplicate rows under a unique index, verification reports it as still missing
+        logger.error("Failed to build index", extra={"index": spec["index"], "error": str(e)})
+        return False
+    finally:
+        conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+
+def verify_indexes(
+    conn,
+    search_mode: Similarity_Search_Mode,
+    build: bool = False,
+    production: bool = False,
+) -> list[dict]:
+    """
+    Check the required indexes, optionally build the missing ones, and report what is left.
+
+    Args:
+        conn (psycopg.Connection): Autocommit connection (CONCURRENTLY cannot run in a transaction).
+        search_mode (Similarity_Search_Mode): Configured similarity search mode.
+        build (bool): If True, build missing indexes concurrently before re-checking.
+        production (bool): If True, missing critical indexes raise instead of only logging.
+
+    Returns:
+        list[dict]: Required index entries still missing.
+
+    Raises:
+        SchemaVerificationError: If production is set and a critical index is missing.
+    """
+    specs = required_indexes(search_mode)
+    missing = missing_indexes(conn, specs)
+    for spec in missing:
+        logger.warning(
+            "Required index missing",
+            extra={
+                "index": spec["index"],
+                "table": spec["table"],
+                "columns": list(spec["columns"]),
+                "critical": spec["critical"],
+                "impact": spec["impact"],
+            },
+        )
+
+    if build and missing:
+        for spec in missing:
+            _build_index(conn, spec)
+        missing = missing_indexes(conn, specs)
+
+    critical = [spec["index"] for spec in missing if spec["critical"]]
+    if critical and production:
+        raise SchemaVerificationError(f"Critical indexes missing: {', '.join(critical)}")
+    return missing
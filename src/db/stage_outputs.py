@@ -0,0 +1,78 @@
+"""
+Compact storage of stage outputs. The per-sentence embeddings of an output are packed into one
+little-endian float32 matrix stored in pipeline_outputs.embeddings (bytea, the precision of the
+vector column they end up in), and the JSONB keeps the small semantic payload plus the layout
+needed to put them back. Outputs written before the split keep their inline embeddings.
+"""
+
+import numpy as np
+
+# Output key holding the sentence dicts whose "embedding" is packed
+EMBEDDED_OUTPUT_KEY = "sentences_with_embeddings"
+LAYOUT_KEY = "embedding_layout"
+EMBEDDING_DTYPE = "<f4"
+
+
+def split_embeddings(output: dict) -> tuple[dict, bytes]:
+    """
+    Move the sentence embeddings of a stage output into a packed matrix.
+
+    Args:
+        output (dict): Stage output, left untouched.
+
+    Returns:
+        tuple: (data for the JSONB column, packed embeddings or None when there is nothing to
+            pack or they are not a uniform matrix, in which case data is the output itself)
+    """
+    sentences = output.get(EMBEDDED_OUTPUT_KEY) if isinstance(output, dict) else None
+    if not sentences or not isinstance(sentences, list):
+        return output, None
+    if not all(isinstance(s, dict) and isinstance(s.get("embedding"), list) for s in sentences):
+        return output, None
+    try:
+        matrix = np.asarray([s["embedding"] for s in sentences], dtype=EMBEDDING_DTYPE)
+    except (TypeError, ValueError):
+        return output, None
+    if matrix.ndim != 2:
+        return output, None
+
+    data = dict(output)
+    data[EMBEDDED_OUTPUT_KEY] = [
+        {key: value for key, value in sentence.items() if key != "embedding"}
+        for sentence in sentences
+    ]
+    data[LAYOUT_KEY] = {
+        "key": EMBEDDED_OUTPUT_KEY,
+        "count": matrix.shape[0],
+        "dimensions": matrix.shape[1],
+    }
+    return data, matrix.tobytes()
+
+
+def merge_embeddings(data: dict, embeddings: bytes = None) -> dict:
+    """
+    Rebuild a stage output from its JSONB data and packed embeddings.
+
+    Args:
+        data (dict): JSONB column value.
+        embeddings (bytes, optional): Packed embeddings, None when they were not read; the
+            sentences are then returned without them.
+
+    Returns:
+        dict: The stage output as it was written.
+    """
+    if not isinstance(data, dict) or LAYOUT_KEY not in data:
+        return data
+    layout = data[LAYOUT_KEY]
+    output = {key: value for key, value in data.items() if key != LAYOUT_KEY}
+    if embeddings is None:
+        return output
+
+    matrix = np.frombuffer(embeddings, dtype=EMBEDDING_DTYPE).reshape(
+        layout["count"], layout["dimensions"]
+    )
+    output[layout["key"]] = [
+        {**sentence, "embedding": row.tolist()}
+        for sentence, row in zip(output[layout["key"]], matrix)
+    ]
+    return output
@@ -10,13 +10,16 @@ from pipeline.exceptions import FatalPipelineError, TransientPipelineError
 logger = get_logger(__name__)
 
 
-def prepare_context_for_noteback(context_response: dict, vector_db: Database, user_id: str) -> list:
+def prepare_context_for_noteback(
+    context_response: dict, vector_db: Database, user_id: str, note_id: str = None
+) -> list:
     """
     Perform multi-anchor similarity search using context preparation output.
 
     Args:
         context_response (dict): Parsed JSON response from context LLM.
         vector_db (Database): Initialized vector database instance.
+        note_id (str, optional): Note being processed, kept out of its own context.
 
     Returns:
         list: List of formatted similarity context strings for prompting.
@@ -48,55 +51,52 @@ def prepare_context_for_noteback(context_response: dict, vector_db: Database, us
         raise FatalPipelineError("Invalid search_anchors format: Expected list")
 
     similarity_context = []
-    total_query_chars = 0
+    valid_anchors = []
     failed_anchors = 0
 
     for idx, anchor in enumerate(search_anchors, 1):
-        try:
-            if anchor is None or not isinstance(anchor, str):
-                logger.warning(
-                    "Invalid anchor type", extra={"index": idx, "type": type(anchor).__name__}
-                )
-                failed_anchors += 1
-                continue
-
-            logger.debug(
-                "Searching similarity anchor", extra={"index": idx, "total": len(search_anchors)}
+        if anchor is None or not isinstance(anchor, str):
+            logger.warning(
+                "Invalid anchor type", extra={"index": idx, "type": type(anchor).__name__}
             )
+            failed_anchors += 1
+            continue
+        valid_anchors.append(anchor)
 
-            results, chars_used = vector_db.similarity_search(
-                user_id=user_id, query=anchor, top_k=3
-            )
-            total_query_chars += chars_used
-
-            if results is None:
-                logger.warning("No results from similarity search for anchor", extra={"index": idx})
-                raise FatalPipelineError("No results from similarity search for anchor")
-
-            for item in results:
-                try:
-                    if (
-                        not isinstance(item, dict)
-                        or "sentence_text" not in item
-                        or "combined_score" not in item
-                    ):
-                        logger.warning("Invalid result item structure", extra={"index": idx})
-                        raise FatalPipelineError("Invalid result item structure")
-
-                    formatted = f"sentence_text: {item['sentence_text']}, value_score: {item['combined_score']}"
-                    similarity_context.append(formatted)
-                except Exception as e:
-                    logger.warning(
-                        "Failed to process result item", extra={"index": idx, "error": str(e)}
-                    )
-                    raise FatalPipelineError("Failed to process result item")
+    logger.debug("Searching similarity anchors", extra={"total": len(valid_anchors)})
 
-        except Exception as e:
-            logger.error(
-                "Similarity search failed", extra={"index": idx, "error": str(e)}, exc_info=True
+    try:
+        # All anchors share one embedding call and one SQL round trip; sentences matched
+        # by several anchors come back once
+        results, total_query_chars = vector_db.similarity_search_many(
+            user_id=user_id, anchors=valid_anchors, top_k=3, exclude_note_id=note_id
+        )
+
+        if results is None:
+            logger.warning("No results from similarity search for anchors")
+            raise FatalPipelineError("No results from similarity search for anchors")
+
+        for item in results:
+            if (
+                not isinstance(item, dict)
+                or "sentence_text" not in item
+                or "combined_score" not in item
+            ):
+                logger.warning("Invalid result item structure")
+                raise FatalPipelineError("Invalid result item structure")
+
+            formatted = (
+                f"sentence_text: {item['sentence_text']}, value_score: {item['combined_score']}"
             )
-            failed_anchors += 1
-            raise FatalPipelineError("Similarity search failed")
+            similarity_context.append(formatted)
+
+    except Exception as e:
+        logger.error(
+            "Similarity search failed",
+            extra={"anchors": len(valid_anchors), "error": str(e)},
+            exc_info=True,
+        )
+        raise FatalPipelineError("Similarity search failed")
 
     if failed_anchors > 0:
         logger.warning(
@@ -261,13 +261,11 @@ def current_note_sentences_with_embeddings(context_response: dict, vector_db: Da
                 failed_sentences += 1
                 raise TransientPipelineError("Invalid importance_score type")
 
-            sentence_embedding, _ = vector_db._generate_sentence_embedding(sentence_text)
             sentences_with_embeddings.append(
                 {
                     "sentence_index": idx,
                     "sentence_text": sentence_text,
                     "importance_score": importance_score,
-                    "embedding": sentence_embedding,
                 }
             )
         except Exception as e:
@@ -283,10 +281,66 @@ def current_note_sentences_with_embeddings(context_response: dict, vector_db: Da
             extra={"failed": failed_sentences, "total": len(sentences_data)},
         )
 
+    # One bulk call: the sentences are embedded in concurrent model-sized batches
+    try:
+        embeddings, _ = vector_db.generate_sentence_embeddings(
+            [sentence["sentence_text"] for sentence in sentences_with_embeddings]
+        )
+    except Exception as e:
+        logger.error(
+            "Failed to embed sentences",
+            extra={"count": len(sentences_with_embeddings), "error": str(e)},
+            exc_info=True,
+        )
+        raise FatalPipelineError("Failed to embed sentences")
+
+    for sentence, embedding in zip(sentences_with_embeddings, embeddings):
+        sentence["embedding"] = embedding
+
     logger.debug("Sentence extraction completed", extra={"count": len(sentences_with_embeddings)})
     return sentences_with_embeddings
 
 
+def ingest_note_sentences(
+    sentences_with_embeddings: list, vector_db: Database, user_id: str, note_id: str
+) -> list:
+    """
+    Write the current note's sentences and embeddings to the vector database and strip the
+    embeddings from the sentences returned to the caller.
+
+    Args:
+        sentences_with_embeddings (list): Output of current_note_sentences_with_embeddings().
+        vector_db (Database): Initialized vector database instance.
+        user_id (str): ID of the user owning the note.
+        note_id (str): ID of the note.
+
+    Returns:
+        list: The sentences without their embeddings.
+    """
+    if not user_id or not note_id:
+        logger.error("Missing note identity for sentence ingest", extra={"user_id": user_id})
+        raise FatalPipelineError("Missing user_id or note_id for sentence ingest")
+
+    try:
+        written = vector_db.ingest_sentences(user_id, note_id, sentences_with_embeddings)
+    except Exception as e:
+        logger.error(
+            "Failed to ingest sentences",
+            extra={"note_id": note_id, "count": len(sentences_with_embeddings), "error": str(e)},
+            exc_info=True,
+        )
+        raise TransientPipelineError("Failed to ingest sentences", original_error=e)
+
+    logger.debug(
+        "Note sentences ingested",
+        extra={"note_id": note_id, "count": len(sentences_with_embeddings), "written": written},
+    )
+    return [
+        {key: value for key, value in sentence.items() if key != "embedding"}
+        for sentence in sentences_with_embeddings
+    ]
+
+
 # Depricated
 # def save_sentences_to_vector_db(context_response: dict, vector_db: Database) -> tuple:
 #     """
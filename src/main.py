@@ -23,10 +23,15 @@ from config.settings import (
 )
 from config.config import User_Input_Type, Pipeline, Pipeline_Stage_Status, Pipeline_Stage_Errors
 from db.db import Database
+from db.async_db import AsyncDatabase
 from impl.gemini import GeminiProvider
 from pipeline.stt import SttPipeline
 from pipeline.smart import SmartPipeline
-from pipeline.exceptions import FatalPipelineError, TransientPipelineError
+from pipeline.exceptions import (
+    FatalPipelineError,
+    StageLeaseLostError,
+    TransientPipelineError,
+)
 from util.util import upstream_call
 
 # Configure logging
@@ -58,11 +63,20 @@ async def lifespan(app: FastAPI):
 
     try:
         app.state.vector_db = Database()
+        app.state.vector_db.verify_schema()
         logger.info("Vector Database initialized")
     except Exception as e:
         logger.critical("Failed to initialize Vector Database", extra={"error": str(e)})
         raise
 
+    try:
+        app.state.async_db = AsyncDatabase()
+        await app.state.async_db.open()
+        logger.info("Async Database initialized")
+    except Exception as e:
+        logger.critical("Failed to initialize Async Database", extra={"error": str(e)})
+        raise
+
     try:
         gemini_client = genai.Client(
             vertexai=ENABLE_VERTEX_AI, project=GCP_PROJECT_ID, location=GCP_REGION
@@ -92,6 +106,31 @@ async def lifespan(app: FastAPI):
     logger.info("Application shutdown initiated")
     try:
         app.state.vector_db.close()
+        await app.state.async_db.close()
+        logger.info(
+            "Database pool stats",
+            extra={
+                "pool": app.state.vector_db.pool_stats(),
+                "async_pool": app.state.async_db.pool_stats(),
+                "replica_pool": app.state.vector_db.replica_pool_stats(),
+                "async_replica_pool": app.state.async_db.replica_pool_stats(),
+                "metrics_sink": (
+                    app.state.vector_db.metrics_sink.stats()
+                    if app.state.vector_db.metrics_sink
+                    else None
+                ),
+                "partitions": (
+                    app.state.vector_db.partition_manager.stats()
+                    if app.state.vector_db.partition_manager
+                    else None
+                ),
+                "embedding_cache": app.state.vector_db.embedding_cache_stats(),
+                "embedding_batcher": app.state.vector_db.embedding_batcher_stats(),
+                "result_cache": app.state.vector_db.result_cache_stats(),
+                "matrix_cache": app.state.vector_db.matrix_cache_stats(),
+                "query_stats": app.state.vector_db.query_stats_snapshot(),
+            },
+        )
     except Exception as e:
         logger.error("Error during database shutdown", extra={"error": str(e)})
     logger.info("Application shutdown complete")
@@ -162,10 +201,13 @@ def _send_upstream_status(
         logger.error("Failed to send upstream update", extra={"error": str(e)})
 
 
-def _handle_stage_checkout(db: Database, pipeline_type: Pipeline, data: dict, context: dict):
+async def _handle_stage_checkout(
+    db: AsyncDatabase, pipeline_type: Pipeline, data: dict, context: dict
+):
     """
-    Checks the database for the current stage status and determines if processing should proceed.
-    Returns (pipeline_stage_id, None) if okay to proceed.
+    Atomically claims the pipeline stage and determines if processing should proceed.
+    Returns (pipeline_stage_id, None) if the stage was claimed, with the lease recorded in
+    context["stage_attempt"].
     Returns (None, JSONResponse) if processing should stop (ACK/Ignore).
     """
     job_id = data.get("job_id")
@@ -174,11 +216,11 @@ def _handle_stage_checkout(db: Database, pipeline_type: Pipeline, data: dict, co
     logger.info("Processing request", extra={"job_id": job_id, "pipeline": pipeline_name})
 
     try:
-        pipeline_stage = db.read_stage(job_id, pipeline_name)
+        pipeline_stage = await db.claim_stage(job_id, pipeline_name, MAX_PIPELINE_STAGE_ATTEMPTS)
     except Exception as e:
-        logger.error("Failed to read stage", extra={"error": str(e)})
+        logger.error("Failed to claim stage", extra={"error": str(e)})
         return None, JSONResponse(
-            status_code=200, content={"error": "Ignored request, failed to read stage"}
+            status_code=200, content={"error": "Ignored request, failed to claim stage"}
         )
 
     if pipeline_stage is None:
@@ -192,8 +234,26 @@ def _handle_stage_checkout(db: Database, pipeline_type: Pipeline, data: dict, co
 
     pipeline_stage_id = pipeline_stage.get("id")
 
-    # Ignore if already in progress
-    if pipeline_stage.get("status") == Pipeline_Stage_Status.IN_PROGRESS:
+    # Claimed: status is IN_PROGRESS and attempt count was incremented in the same statement
+    if pipeline_stage.get("claimed"):
+        if pipeline_stage.get("previous_status") == Pipeline_Stage_Status.COMPLETED:
+            logger.warning(
+                "Pipeline stage marked COMPLETED but output not found. Proceeding with re-run."
+            )
+        elif pipeline_stage.get("previous_status") == Pipeline_Stage_Status.IN_PROGRESS:
+            logger.warning(
+                "Pipeline stage lease expired, taking over from its previous worker",
+                extra={"job_id": job_id, "attempts": pipeline_stage.get("attempt_count")},
+            )
+        # The claim's attempt count identifies this delivery's lease on the stage
+        context["stage_attempt"] = pipeline_stage.get("attempt_count")
+        return pipeline_stage_id, None
+
+    # Ignore if already in progress; a stage whose worker died on its last allowed attempt
+    # (lease expired) falls through to the attempt check so it is failed and reported
+    if pipeline_stage.get("status") == Pipeline_Stage_Status.IN_PROGRESS and not (
+        pipeline_stage.get("lease_expired")
+    ):
         logger.warning(
             "Request ignored, pipeline stage already in progress", extra={"job_id": job_id}
         )
@@ -209,7 +269,7 @@ def _handle_stage_checkout(db: Database, pipeline_type: Pipeline, data: dict, co
             extra={"job_id": job_id},
         )
         try:
-            output = db.read_stage_output(pipeline_stage_id)
+            output = await db.read_stage_output(pipeline_stage_id)
             if output:
                 _send_upstream_status(
                     data, context, pipeline_type, Pipeline_Stage_Status.COMPLETED, output=output
@@ -218,16 +278,22 @@ def _handle_stage_checkout(db: Database, pipeline_type: Pipeline, data: dict, co
                     status_code=200,
                     content={"error": "Ignored request, pipeline stage already completed"},
                 )
-            else:
-                logger.warning(
-                    "Pipeline stage marked COMPLETED but output not found. Proceeding with re-run."
-                )
         except Exception as e:
             logger.error("Failed to process completed stage output", extra={"error": str(e)})
             return None, JSONResponse(
                 status_code=400, content={"error": "Failed to handle completed stage output"}
             )
 
+        # Not re-claimable: the output aged out of its retention, the stage stays COMPLETED
+        logger.warning(
+            "Request ignored, pipeline stage completed and its output expired",
+            extra={"job_id": job_id},
+        )
+        return None, JSONResponse(
+            status_code=200,
+            content={"error": "Ignored request, pipeline stage output expired"},
+        )
+
     # Ignore if attempt count exceeded
     if pipeline_stage.get("attempt_count") >= MAX_PIPELINE_STAGE_ATTEMPTS:
         logger.warning(
@@ -239,10 +305,7 @@ def _handle_stage_checkout(db: Database, pipeline_type: Pipeline, data: dict, co
             },
         )
         try:
-            db.update_pipeline_stage_status(pipeline_stage_id, Pipeline_Stage_Status.FAILED)
-            db.update_pipeline_stage_error(
-                pipeline_stage_id, Pipeline_Stage_Errors.ATTEMPT_COUNT_EXCEEDED
-            )
+            await db.fail_stage(pipeline_stage_id, Pipeline_Stage_Errors.ATTEMPT_COUNT_EXCEEDED)
             _send_upstream_status(
                 data,
                 context,
@@ -258,14 +321,12 @@ def _handle_stage_checkout(db: Database, pipeline_type: Pipeline, data: dict, co
             content={"error": "Ignored request, pipeline stage attempt count exceeded"},
         )
 
-    # Update status and increment attempt count
-    try:
-        db.update_pipeline_stage_status(pipeline_stage_id, Pipeline_Stage_Status.IN_PROGRESS)
-        db.increment_pipeline_stage_attempt_count(pipeline_stage_id)
-    except Exception as e:
-        logger.error("Failed to update stage to IN_PROGRESS", extra={"error": str(e)})
-
-    return pipeline_stage_id, None
+    # Another delivery claimed the stage between our snapshot and the update
+    logger.warning("Request ignored, pipeline stage claimed concurrently", extra={"job_id": job_id})
+    return None, JSONResponse(
+        status_code=200,
+        content={"error": "Ignored request, pipeline stage already in progress"},
+    )
 
 
 def _get_pipeline_input(input_type: str, data: dict):
@@ -328,8 +389,8 @@ async def process_pipeline_request(request: Request, pipeline_type: Pipeline):
         logger.info("Context", extra={"context": context})
 
         # DB Stage Handling and Checkout
-        pipeline_stage_id, early_response = _handle_stage_checkout(
-            request.app.state.vector_db, pipeline_type, data, context
+        pipeline_stage_id, early_response = await _handle_stage_checkout(
+            request.app.state.async_db, pipeline_type, data, context
         )
         if early_response:
             return early_response
@@ -357,15 +418,18 @@ async def process_pipeline_request(request: Request, pipeline_type: Pipeline):
             status_code=200, content={"status": "ok", "branch": pipeline_type.value}
         )
 
+    except StageLeaseLostError as e:
+        # The delivery that took the stage over owns its status and the upstream report
+        logger.warning("Stage lease lost, acking message", extra={"error": str(e)})
+        return JSONResponse(status_code=200, content={"status": "stage_lease_lost"})
+
     except FatalPipelineError as e:
         logger.error("Fatal pipeline error, acking message", extra={"error": str(e)}, exc_info=True)
         if context and "pipeline_stage_id" in context:
-            request.app.state.vector_db.update_pipeline_stage_status(
-                context["pipeline_stage_id"], Pipeline_Stage_Status.FAILED
-            )
-            request.app.state.vector_db.update_pipeline_stage_error(
+            await request.app.state.async_db.fail_stage(
                 context["pipeline_stage_id"],
                 Pipeline_Stage_Errors.INTERNAL_ERROR,
+                context.get("stage_attempt"),
             )
         if data and context:
             _send_upstream_status(
@@ -381,8 +445,8 @@ async def process_pipeline_request(request: Request, pipeline_type: Pipeline):
         )
         try:
             if context and "pipeline_stage_id" in context:
-                request.app.state.vector_db.update_pipeline_stage_status(
-                    context["pipeline_stage_id"], Pipeline_Stage_Status.PENDING
+                await request.app.state.async_db.release_stage(
+                    context["pipeline_stage_id"], context.get("stage_attempt")
                 )
         except Exception as db_err:
             logger.error("Failed to update DB on crash", extra={"error": str(db_err)})
@@ -396,12 +460,10 @@ async def process_pipeline_request(request: Request, pipeline_type: Pipeline):
         )
         try:
             if context and "pipeline_stage_id" in context:
-                request.app.state.vector_db.update_pipeline_stage_status(
-                    context["pipeline_stage_id"], Pipeline_Stage_Status.FAILED
-                )
-                request.app.state.vector_db.update_pipeline_stage_error(
+                await request.app.state.async_db.fail_stage(
                     context["pipeline_stage_id"],
                     Pipeline_Stage_Errors.INTERNAL_ERROR,
+                    context.get("stage_attempt"),
                 )
         except Exception as db_err:
             logger.error("Failed to update DB on crash", extra={"error": str(db_err)})
@@ -6,9 +6,11 @@ Enforces a standard structure for execution, error handling, and upstream commun
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional, Tuple
 from common.logging import get_logger
-from pipeline.exceptions import FatalPipelineError, TransientPipelineError
+from pipeline.exceptions import FatalPipelineError, StageLeaseLostError, TransientPipelineError
+from pipeline.heartbeat import StageHeartbeat
 from util.util import upstream_call
 from db.db import Database
+from config.settings import STAGE_HEARTBEAT_INTERVAL
 from config.config import Pipeline_Stage_Status, Llm_Call
 
 
@@ -56,10 +58,66 @@ class Pipeline(ABC):
             },
         )
 
-        response = None
-        metrics = None
         error_info = None
+        # Attempt count of the claim, identifies this worker's lease on the stage
+        stage_attempt = context.get("stage_attempt")
 
+        try:
+            with StageHeartbeat(
+                self.db, pipeline_stage_id, stage_attempt, STAGE_HEARTBEAT_INTERVAL
+            ) as heartbeat:
+                with self.db.job_scope(job_id):
+                    response, metrics = self._execute(input_data, context)
+
+                if heartbeat.lost:
+                    raise StageLeaseLostError("Stage lease taken over by another delivery")
+
+                # if successfull then
+                # insert output and mark the stage completed in one statement; a lease taken
+                # over since the last heartbeat is seen here
+                output_id = self.db.complete_stage(pipeline_stage_id, response, stage_attempt)
+                if output_id is None and stage_attempt is not None:
+                    raise StageLeaseLostError("Stage lease taken over before completion")
+        except (FatalPipelineError, TransientPipelineError, StageLeaseLostError):
+            raise
+        except Exception as e:
+            self.logger.error("Failed to update stage status", extra={"error": str(e)})
+            raise TransientPipelineError("Failed to update stage status", original_error=e)
+
+        # Construct upstream payload
+        upstream_payload = {
+            "job_id": job_id,
+            "note_id": note_id,
+            "user_id": user_id,
+            "location": context.get("location"),
+            "timestamp": context.get("timestamp"),
+            "output": response,
+            "input_type": context.get("input_type"),
+            "plan_type": context.get("plan_type"),
+            "pipeline_stage": self.name,
+            "status": Pipeline_Stage_Status.COMPLETED.value,
+            "error": error_info,
+        }
+
+        # Final callback to upstream
+        self._send_upstream(upstream_payload)
+
+        return upstream_payload
+
+    def _execute(
+        self, input_data: Any, context: Dict[str, Any]
+    ) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """
+        Run _process, converting unexpected exceptions into FatalPipelineError.
+
+        Args:
+            input_data (Any): Input data for the pipeline.
+            context (Dict[str, Any]): Context metadata.
+
+        Returns:
+            Tuple[Optional[Dict], Optional[Dict]]: (response_data, metrics_data)
+        """
+        pipeline_stage_id = context.get("pipeline_stage_id")
         try:
             # Execute core logic implemented by subclasses
             response, metrics = self._process(input_data, context)
@@ -71,11 +129,12 @@ class Pipeline(ABC):
                 "Pipeline execution completed successfully",
                 extra={
                     "pipeline": self.name,
-                    "user_id": user_id,
-                    "note_id": note_id,
+                    "user_id": context.get("user_id"),
+                    "note_id": context.get("note_id"),
                     "pipeline_stage_id": pipeline_stage_id,
                 },
             )
+            return response, metrics
 
         except (FatalPipelineError, TransientPipelineError):
             raise
@@ -91,38 +150,6 @@ class Pipeline(ABC):
             )
             raise FatalPipelineError("Unhandled exception in pipeline", original_error=e)
 
-        # if successfull then
-        # insert output, update status to completed, increment attempt count
-
-        try:
-            self.db.write_pipeline_stage_output(pipeline_stage_id, response)
-            self.db.update_pipeline_stage_status(
-                pipeline_stage_id, Pipeline_Stage_Status.COMPLETED.value
-            )
-        except Exception as e:
-            self.logger.error("Failed to update stage status", extra={"error": str(e)})
-            raise TransientPipelineError("Failed to update stage status", original_error=e)
-
-        # Construct upstream payload
-        upstream_payload = {
-            "job_id": job_id,
-            "note_id": note_id,
-            "user_id": user_id,
-            "location": context.get("location"),
-            "timestamp": context.get("timestamp"),
-            "output": response,
-            "input_type": context.get("input_type"),
-            "plan_type": context.get("plan_type"),
-            "pipeline_stage": self.name,
-            "status": Pipeline_Stage_Status.COMPLETED.value,
-            "error": error_info,
-        }
-
-        # Final callback to upstream
-        self._send_upstream(upstream_payload)
-
-        return upstream_payload
-
     @abstractmethod
     def _process(
         self, input_data: Any, context: Dict[str, Any]
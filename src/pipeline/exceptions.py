@@ -33,3 +33,12 @@ class TransientPipelineError(PipelineError):
     """
 
     pass
+
+
+class StageLeaseLostError(PipelineError):
+    """
+    Raised when a running stage's lease expired and another delivery took it over.
+    The current worker must stop without writing its result or touching the stage status.
+    """
+
+    pass
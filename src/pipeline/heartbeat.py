@@ -0,0 +1,73 @@
+"""
+Lease heartbeat for a running pipeline stage.
+Refreshes pipeline_stages.last_heartbeat from a background thread so a redelivery only takes
+the stage over after the worker running it stopped heartbeating (e.g. its pod was killed).
+"""
+
+import threading
+from common.logging import get_logger
+from db.db import Database
+
+logger = get_logger(__name__)
+
+
+class StageHeartbeat:
+    """
+    Context manager heartbeating one claimed stage every interval seconds until exit.
+    lost turns True once the database reports the lease was taken over.
+    """
+
+    def __init__(self, db: Database, pipeline_stage_id, attempt_count: int, interval: float):
+        """
+        Args:
+            db (Database): Database used for the heartbeat writes.
+            pipeline_stage_id (uuid): ID of the claimed stage, no heartbeat is sent when None.
+            attempt_count (int): Attempt count returned by the claim, identifies the lease.
+            interval (float): Seconds between heartbeats, well below the lease duration.
+        """
+        self.db = db
+        self.pipeline_stage_id = pipeline_stage_id
+        self.attempt_count = attempt_count
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.pipeline_stage_id is not None and self.attempt_count is not None:
+            self._thread = threading.Thread(
+                target=self._run, name=f"heartbeat-{self.pipeline_stage_id}", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return False
+
+    def _run(self):
+        """
+        Heartbeat until stopped or until the lease is found lost.
+        """
+        while not self._stop.wait(self.interval):
+            try:
+                held = self.db.heartbeat_stage(self.pipeline_stage_id, self.attempt_count)
+            except Exception as e:
+                # The lease survives a few missed heartbeats, keep trying
+                logger.warning(
+                    "Stage heartbeat failed",
+                    extra={"pipeline_stage_id": self.pipeline_stage_id, "error": str(e)},
+                )
+                continue
+            if not held:
+                self.lost = True
+                logger.warning(
+                    "Stage lease lost",
+                    extra={
+                        "pipeline_stage_id": self.pipeline_stage_id,
+                        "attempt_count": self.attempt_count,
+                    },
+                )
+                return
@@ -5,11 +5,13 @@ Processes input to generate context and final notes using Vector DB and LLMs.
 
 from typing import Any, Dict, Optional, Tuple
 from config.config import Llm_Call, User_Input_Type, Pipeline as PipelineEnum
+from config.settings import SENTENCE_INGEST_ENABLED
 from db.db import Database
 from impl.context_utils import (
     format_sentences,
     prepare_context_for_noteback,
     current_note_sentences_with_embeddings,
+    ingest_note_sentences,
 )
 from impl.gemini import GeminiProvider
 from impl.llm_input import get_llm_input
@@ -98,7 +100,7 @@ class SmartPipeline(Pipeline):
 
         try:
             similarity_context = prepare_context_for_noteback(
-                context_response, self.db, context["user_id"]
+                context_response, self.db, context["user_id"], context.get("note_id")
             )
         except (TransientPipelineError, FatalPipelineError):
             raise
@@ -167,6 +169,21 @@ class SmartPipeline(Pipeline):
             self.logger.warning("Noteback processing returned null response")
             raise TransientPipelineError("Noteback processing returned null response")
 
+        # Ingested only once noteback succeeded; a retry after a later failure may still find
+        # this note's sentences stored, so the similarity search excludes the note itself
+        if SENTENCE_INGEST_ENABLED:
+            try:
+                sentences_with_embeddings = ingest_note_sentences(
+                    sentences_with_embeddings,
+                    self.db,
+                    context.get("user_id"),
+                    context.get("note_id"),
+                )
+            except (TransientPipelineError, FatalPipelineError):
+                raise
+            except Exception as e:
+                raise TransientPipelineError("Failed to ingest note sentences", original_error=e)
+
         if noteback_metrics is None:
             self.logger.warning("Noteback processing returned null metrics")
         else:
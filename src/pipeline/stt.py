@@ -11,7 +11,8 @@ from impl.llm_processor import call_llm
 from pipeline.base import Pipeline
 from db.db import Database
 from pipeline.exceptions import FatalPipelineError, TransientPipelineError
-from impl.context_utils import current_note_sentences_with_embeddings
+from config.settings import SENTENCE_INGEST_ENABLED
+from impl.context_utils import current_note_sentences_with_embeddings, ingest_note_sentences
 
 
 class SttPipeline(Pipeline):
@@ -102,6 +103,13 @@ class SttPipeline(Pipeline):
                 sentences_with_embeddings = current_note_sentences_with_embeddings(
                     response, self.db
                 )
+                if SENTENCE_INGEST_ENABLED:
+                    sentences_with_embeddings = ingest_note_sentences(
+                        sentences_with_embeddings,
+                        self.db,
+                        context.get("user_id"),
+                        context.get("note_id"),
+                    )
             except (TransientPipelineError, FatalPipelineError):
                 raise
             except Exception as e:
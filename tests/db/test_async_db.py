@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from db import queries
+from db.async_db import AsyncDatabase
+
+
+class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        pool_patcher = patch("db.async_db.AsyncConnectionPool")
+        self.mock_pool_cls = pool_patcher.start()
+        self.addCleanup(pool_patcher.stop)
+
+        self.mock_pool = self.mock_pool_cls.return_value
+        self.mock_pool.open = AsyncMock()
+        self.mock_cursor = MagicMock()
+        self.mock_cursor.execute = AsyncMock()
+        self.mock_cursor.fetchone = AsyncMock()
+        self.mock_cursor.fetchall = AsyncMock()
+
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value.__aenter__.return_value = self.mock_cursor
+        self.mock_pool.connection.return_value.__aenter__.return_value = mock_conn
+
+        self.db = AsyncDatabase()
+
+    async def test_open_waits_for_pool(self):
+        """Verify open() waits for the async pool to be ready."""
+        await self.db.open()
+        self.mock_pool.open.assert_awaited_once()
+
+    async def test_claim_stage_single_statement(self):
+        """Verify a stage claim is one statement and exposes the claim outcome."""
+        self.mock_cursor.fetchone.return_value = (
+            "stage",
+            "job",
+            "STT",
+            "IN_PROGRESS",
+            1,
+            None,
+            None,
+            None,
+            None,
+            True,
+            "PENDING",
+            False,
+        )
+
+        stage = await self.db.claim_stage("job", "STT", 3)
+
+        self.assertTrue(stage["claimed"])
+        self.assertEqual(stage["attempt_count"], 1)
+        self.assertEqual(self.mock_cursor.execute.call_args.args[0], queries.CLAIM_STAGE_QUERY)
+
+    async def test_fail_stage_carries_lease(self):
+        """Verify a stage is failed under the caller's lease."""
+        await self.db.fail_stage("stage", "ERROR", 2)
+
+        query, params = self.mock_cursor.execute.call_args.args
+        self.assertEqual(query, queries.FAIL_STAGE_QUERY)
+        self.assertEqual(params["attempt_count"], 2)
+
+    async def test_stage_output_read_from_replica(self):
+        """Verify completed-stage replays are served by the replica pool."""
+        replica = MagicMock(open=AsyncMock())
+        replica_conn = MagicMock()
+        replica_conn.execute = AsyncMock()
+        replica_conn.execute.return_value.fetchone = AsyncMock(
+            return_value=("out", "stage", None, {}, None, None, None, None)
+        )
+        replica.connection.return_value.__aenter__.return_value = replica_conn
+        self.mock_pool_cls.side_effect = [self.mock_pool, replica]
+        with patch("db.async_db.DB_REPLICA_DSN", "host=replica"):
+            db = AsyncDatabase()
+        await db.open()
+
+        output = await db.read_stage_output("stage")
+
+        self.assertEqual(output["id"], "out")
+        replica.open.assert_awaited_once_with(wait=False)
+        self.mock_cursor.execute.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
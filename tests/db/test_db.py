@@ -0,0 +1,566 @@
+import psycopg
+import unittest
+from unittest.mock import MagicMock, patch
+from config.config import Similarity_Search_Mode
+from config.settings import PIPELINE_OUTPUTS_RETENTION_DAYS
+from db import queries
+from db.db import Database, session_settings
+
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        pool_patcher = patch("db.db.ConnectionPool")
+        model_patcher = patch("db.db.TextEmbeddingModel")
+        sink_patcher = patch("db.db.METRICS_SINK_ENABLED", False)
+        partitions_patcher = patch("db.db.PARTITION_MANAGER_ENABLED", False)
+        partitions_patcher.start()
+        self.addCleanup(partitions_patcher.stop)
+        result_cache_patcher = patch("db.db.SIMILARITY_CACHE_ENABLED", False)
+        result_cache_patcher.start()
+        self.addCleanup(result_cache_patcher.stop)
+        migrations_patcher = patch("db.db.DB_RUN_MIGRATIONS", False)
+        self.persistent_patcher = patch("db.db.EMBEDDING_CACHE_PERSISTENT", False)
+        sink_patcher.start()
+        migrations_patcher.start()
+        self.persistent_patcher.start()
+        self.addCleanup(sink_patcher.stop)
+        self.addCleanup(migrations_patcher.stop)
+        self.addCleanup(self.persistent_patcher.stop)
+        self.mock_pool_cls = pool_patcher.start()
+        model_patcher.start()
+        self.addCleanup(pool_patcher.stop)
+        self.addCleanup(model_patcher.stop)
+
+        self.mock_pool = self.mock_pool_cls.return_value
+        self.mock_pool.closed = False
+        self.mock_conn = self.mock_pool.connection.return_value.__enter__.return_value
+        self.mock_cursor = self.mock_conn.cursor.return_value.__enter__.return_value
+
+        self.db = Database()
+
+    def test_batcher_bypassed_for_single_text_model(self):
+        """Verify texts never wait for a micro-batch the model could not send in one request."""
+        self.assertEqual(self.db.embedding_max_batch, 1)
+        self.assertIsNone(self.db.embedding_batcher)
+
+    @patch.dict("db.db.EMBEDDING_MODEL_MAX_BATCH", {"gemini-embedding-001": 250})
+    def test_batcher_used_for_multi_text_model(self):
+        """Verify the micro-batcher is shared when requests can carry several texts."""
+        db = Database()
+        self.addCleanup(db.embedding_batcher.close)
+
+        self.assertIsNotNone(db.embedding_batcher)
+
+    def test_pool_configured_with_bounds(self):
+        """Verify the pool is opened with min/max size and idle recycling."""
+        kwargs = self.mock_pool_cls.call_args.kwargs
+        self.assertIn("min_size", kwargs)
+        self.assertIn("max_size", kwargs)
+        self.assertIn("max_idle", kwargs)
+        self.assertTrue(kwargs["kwargs"]["autocommit"])
+
+    def test_pool_cursors_report_query_stats(self):
+        """Verify pooled connections time statements into the database's query stats."""
+        cursor_factory = self.mock_pool_cls.call_args.kwargs["kwargs"]["cursor_factory"]
+        self.assertIs(cursor_factory.query_stats, self.db.query_stats)
+
+    def test_similarity_search_labelled_with_mode(self):
+        """Verify similarity search statements are timed under their search mode."""
+        self.db._generate_query_embedding = MagicMock(return_value=([0.1], 2))
+        self.mock_cursor.fetchall.return_value = []
+
+        self.db.similarity_search("user", "ab", top_k=1)
+
+        kwargs = self.mock_cursor.execute.call_args.kwargs
+        self.assertEqual(kwargs["label"], "similarity_search.exact")
+        self.assertEqual(kwargs["context"]["user_id"], "user")
+
+    def test_ann_search_short_of_top_k_reruns_exact(self):
+        """Verify an ANN search the filtered index scan left short is answered in exact mode."""
+        self.db.search_mode = Similarity_Search_Mode.ANN
+        self.db._generate_query_embedding = MagicMock(return_value=([0.1], 2))
+        row = (0, "text", 0.1, 1.0, 0.0, 0.9)
+        self.mock_cursor.fetchall.side_effect = [[], [row, row]]
+
+        results, _ = self.db.similarity_search("user", "ab", top_k=2)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(
+            self.mock_cursor.execute.call_args.args[0], queries.EXACT_SIMILARITY_SEARCH_QUERY
+        )
+        self.assertEqual(
+            self.mock_cursor.execute.call_args.kwargs["label"], "similarity_search.exact_fallback"
+        )
+
+    def test_read_stage_checks_out_connection(self):
+        """Verify each call checks out its own pooled connection."""
+        self.mock_cursor.fetchone.return_value = (
+            "stage",
+            "job",
+            "STT",
+            "PENDING",
+            0,
+            None,
+            None,
+            None,
+            None,
+        )
+
+        self.db.read_stage("job", "STT")
+        self.db.read_stage("job", "STT")
+
+        self.assertEqual(self.mock_pool.connection.call_count, 2)
+
+    def test_read_stage_missing(self):
+        """Verify None is returned when no stage row exists."""
+        self.mock_cursor.fetchone.return_value = None
+        self.assertIsNone(self.db.read_stage("job", "STT"))
+
+    def test_claim_stage_single_statement(self):
+        """Verify a stage claim is one statement and exposes the claim outcome."""
+        self.mock_cursor.fetchone.return_value = (
+            "stage",
+            "job",
+            "STT",
+            "IN_PROGRESS",
+            1,
+            None,
+            None,
+            None,
+            None,
+            True,
+            "PENDING",
+            False,
+        )
+
+        stage = self.db.claim_stage("job", "STT", 3)
+
+        self.assertTrue(stage["claimed"])
+        self.assertEqual(stage["previous_status"], "PENDING")
+        self.assertFalse(stage["lease_expired"])
+        self.assertEqual(self.mock_cursor.execute.call_count, 1)
+        params = self.mock_cursor.execute.call_args.args[1]
+        self.assertEqual(params["max_attempts"], 3)
+        # Stages whose output the retention sweep removed are not re-run
+        self.assertEqual(params["output_retention_days"], PIPELINE_OUTPUTS_RETENTION_DAYS)
+
+    def test_complete_stage_single_statement(self):
+        """Verify output insert and COMPLETED status are written in one statement."""
+        self.mock_cursor.fetchone.return_value = ("output",)
+
+        output_id = self.db.complete_stage("stage", {"note": "done"})
+
+        self.assertEqual(output_id, "output")
+        self.assertEqual(self.mock_cursor.execute.call_count, 1)
+        params = self.mock_cursor.execute.call_args.args[1]
+        self.assertEqual(params["status"], "COMPLETED")
+
+    def test_complete_stage_packs_sentence_embeddings(self):
+        """Verify sentence embeddings are stored packed instead of inside the JSONB data."""
+        self.mock_cursor.fetchone.return_value = ("output",)
+        output = {"sentences_with_embeddings": [{"sentence_text": "s", "embedding": [1.0, 2.0]}]}
+
+        self.db.complete_stage("stage", output)
+
+        params = self.mock_cursor.execute.call_args.args[1]
+        self.assertEqual(params["data"].obj["sentences_with_embeddings"], [{"sentence_text": "s"}])
+        self.assertEqual(len(params["embeddings"]), 8)
+        self.assertIn("embedding", output["sentences_with_embeddings"][0])
+
+    def test_read_stage_output_without_embeddings(self):
+        """Verify the packed embeddings column is not read when it is not needed."""
+        self.mock_cursor.fetchone.return_value = None
+
+        self.db.read_stage_output("stage", include_embeddings=False)
+
+        query = self.mock_cursor.execute.call_args.args[0]
+        self.assertEqual(query, queries.READ_STAGE_OUTPUT_DATA_QUERY)
+
+    def test_complete_stage_after_lost_lease_writes_nothing(self):
+        """Verify a fenced completion returns no output id instead of failing."""
+        self.mock_cursor.fetchone.return_value = None
+
+        output_id = self.db.complete_stage("stage", {"note": "done"}, attempt_count=1)
+
+        self.assertIsNone(output_id)
+        params = self.mock_cursor.execute.call_args.args[1]
+        self.assertEqual(params["attempt_count"], 1)
+
+    def test_heartbeat_reports_lost_lease(self):
+        """Verify the heartbeat reports whether the claim still holds the stage."""
+        self.mock_cursor.fetchone.return_value = ("stage",)
+        self.assertTrue(self.db.heartbeat_stage("stage", 2))
+
+        self.mock_cursor.fetchone.return_value = None
+        self.assertFalse(self.db.heartbeat_stage("stage", 1))
+
+    def test_job_scope_tags_statements(self):
+        """Verify statements run inside a job scope carry its job_id, and only there."""
+        with self.db.job_scope("job"):
+            self.assertEqual(self.db._job_context(), {"job_id": "job"})
+
+        self.assertEqual(self.db._job_context(), {})
+
+    def test_write_metrics_uses_sink(self):
+        """Verify metrics are buffered by the sink instead of inserted inline."""
+        self.db.metrics_sink = MagicMock()
+
+        result = self.db.write_metrics("user", "job", "stage", "STT", {"input_tokens": 1})
+
+        self.assertIsNone(result)
+        self.db.metrics_sink.enqueue.assert_called_once()
+        self.mock_cursor.execute.assert_not_called()
+
+    def test_query_embeddings_split_into_request_batches(self):
+        """Verify anchors are embedded in model-sized batches and keep their order."""
+        self.db.embedding_max_batch = 1
+        self.db.embedding_model.get_embeddings.side_effect = lambda batch, **_: [
+            MagicMock(values=[float(len(item.text))]) for item in batch
+        ]
+
+        embeddings, chars = self.db._generate_query_embeddings(["a", "bb", "ccc"])
+
+        self.assertEqual(embeddings, [[1.0], [2.0], [3.0]])
+        self.assertEqual(chars, 6)
+        self.assertEqual(self.db.embedding_model.get_embeddings.call_count, 3)
+
+    def test_sentence_embeddings_bulk_keeps_order(self):
+        """Verify bulk sentence embeddings come back in input order with total chars."""
+        self.db.embedding_max_batch = 2
+        self.db.embedding_model.get_embeddings.side_effect = lambda batch, **_: [
+            MagicMock(values=[float(len(item.text))]) for item in batch
+        ]
+
+        embeddings, chars = self.db.generate_sentence_embeddings(["a", "bbb", "cc", "dddd", "e"])
+
+        self.assertEqual(embeddings, [[1.0], [3.0], [2.0], [4.0], [1.0]])
+        self.assertEqual(chars, 11)
+        self.assertEqual(self.db.embedding_model.get_embeddings.call_count, 3)
+
+    def test_repeated_sentence_embedded_once(self):
+        """Verify a sentence seen before is answered from memory without a model call."""
+        self.db.embedding_model.get_embeddings.return_value = [MagicMock(values=[0.5])]
+
+        first, _ = self.db._generate_sentence_embedding("same sentence")
+        second, _ = self.db._generate_sentence_embedding("same sentence")
+
+        self.assertEqual(first, second)
+        self.db.embedding_model.get_embeddings.assert_called_once()
+        stats = self.db.embedding_cache_stats()
+        self.assertEqual((stats["memory_hits"], stats["misses"]), (1, 1))
+
+    def test_embedding_cache_table_hit_skips_model(self):
+        """Verify embeddings stored in the embedding_cache table avoid a model call."""
+        with patch("db.db.EMBEDDING_CACHE_PERSISTENT", True):
+            self.mock_cursor.fetchall.side_effect = lambda: [
+                (self.mock_cursor.execute.call_args.args[1]["hashes"][0], [0.25, 0.5])
+            ]
+
+            embedding, _ = self.db._generate_query_embedding("stored anchor")
+
+        self.assertEqual(embedding, [0.25, 0.5])
+        self.db.embedding_model.get_embeddings.assert_not_called()
+        self.assertEqual(self.db.embedding_cache_stats()["db_hits"], 1)
+
+    def test_embedding_cache_miss_written_to_table(self):
+        """Verify newly computed embeddings are persisted for other instances."""
+        self.db.embedding_model.get_embeddings.return_value = [MagicMock(values=[0.5])]
+        with patch("db.db.EMBEDDING_CACHE_PERSISTENT", True):
+            self.mock_cursor.fetchall.return_value = []
+
+            self.db._generate_sentence_embedding("new sentence")
+
+        rows = self.mock_cursor.executemany.call_args.args[1]
+        self.assertEqual(rows[0][1:], ("RETRIEVAL_DOCUMENT", "gemini-embedding-001", 1536, [0.5]))
+
+    def test_similarity_search_many_single_statement(self):
+        """Verify several anchors are searched with one SQL statement."""
+        self.db._generate_query_embeddings = MagicMock(return_value=([[0.1], [0.2]], 4))
+        self.mock_cursor.fetchall.return_value = [(0, "text", 0.1, 1.0, 0.0, 0.9, 1)]
+
+        results, chars = self.db.similarity_search_many("user", ["ab", "cd"], top_k=3)
+
+        self.mock_cursor.execute.assert_called_once()
+        self.assertEqual(results[0]["anchor_index"], 1)
+        self.assertEqual(chars, 4)
+
+    def test_hybrid_search_matches_anchor_texts(self):
+        """Verify hybrid mode binds the anchor texts for the full-text candidates."""
+        self.db.search_mode = Similarity_Search_Mode.HYBRID
+        self.db._generate_query_embeddings = MagicMock(return_value=([[0.1], [0.2]], 4))
+        self.mock_cursor.fetchall.return_value = []
+
+        self.db.similarity_search_many("user", ["ab", "cd"], top_k=3)
+
+        params = self.mock_cursor.execute.call_args.args[1]
+        self.assertEqual(params["anchor_texts"], ["ab", "cd"])
+        self.assertEqual(
+            self.mock_cursor.execute.call_args.kwargs["label"], "similarity_search_many.hybrid"
+        )
+
+    def test_ingest_sentences_binary_copy_in_one_transaction(self):
+        """Verify sentences are COPYed to staging and merged in the same transaction."""
+        copy = self.mock_cursor.copy.return_value.__enter__.return_value
+        self.mock_cursor.rowcount = 1
+
+        written = self.db.ingest_sentences(
+            "user",
+            "note",
+            [
+                {
+                    "sentence_index": 1,
+                    "sentence_text": "s",
+                    "embedding": [1, 2],
+                    "importance_score": 3,
+                }
+            ],
+        )
+
+        self.mock_conn.transaction.assert_called_once()
+        self.assertIn("FORMAT BINARY", self.mock_cursor.copy.call_args.args[0])
+        copy.set_types.assert_called_once_with(queries.SENTENCE_STAGING_TYPES)
+        copy.write_row.assert_called_once_with((1, "s", [1.0, 2.0], 3.0))
+        statements = [call.args[0] for call in self.mock_cursor.execute.call_args_list]
+        self.assertEqual(
+            statements,
+            [
+                queries.CREATE_SENTENCE_STAGING_QUERY,
+                queries.MERGE_STAGED_SENTENCES_QUERY,
+                queries.DELETE_UNSTAGED_SENTENCES_QUERY,
+            ],
+        )
+        self.assertEqual(written, 1)
+
+    def test_pool_stats(self):
+        """Verify pool statistics are exposed."""
+        self.mock_pool.get_stats.return_value = {"requests_wait_ms": 5}
+        self.assertEqual(self.db.pool_stats(), {"requests_wait_ms": 5})
+
+    def test_close(self):
+        """Verify closing the database closes the pool."""
+        self.db.close()
+        self.mock_pool.close.assert_called_once()
+
+
+class TestReadReplicaRouting(unittest.TestCase):
+    def setUp(self):
+        self.primary = MagicMock(closed=False)
+        self.replica = MagicMock(closed=False)
+        pool_patcher = patch("db.db.ConnectionPool", side_effect=[self.primary, self.replica])
+        self.mock_pool_cls = pool_patcher.start()
+        self.addCleanup(pool_patcher.stop)
+        patchers = [
+            patch("db.db.TextEmbeddingModel"),
+            patch("db.db.METRICS_SINK_ENABLED", False),
+            patch("db.db.PARTITION_MANAGER_ENABLED", False),
+            patch("db.db.SIMILARITY_CACHE_ENABLED", False),
+            patch("db.db.DB_RUN_MIGRATIONS", False),
+            patch("db.db.EMBEDDING_CACHE_PERSISTENT", False),
+            patch("db.db.DB_REPLICA_DSN", "host=replica dbname=mydb"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.primary_cursor = (
+            self.primary.connection.return_value.__enter__.return_value.cursor.return_value
+        ).__enter__.return_value
+        self.replica_cursor = (
+            self.replica.connection.return_value.__enter__.return_value.cursor.return_value
+        ).__enter__.return_value
+
+        self.db = Database()
+
+    def test_replica_pool_opened_from_dsn(self):
+        """Verify the replica pool connects with the configured DSN."""
+        kwargs = self.mock_pool_cls.call_args_list[1].kwargs
+        self.assertEqual(kwargs["conninfo"], "host=replica dbname=mydb")
+        self.assertEqual(kwargs["name"], "replica")
+
+    def test_similarity_search_reads_replica(self):
+        """Verify retrieval queries run on the replica only."""
+        self.db._generate_query_embeddings = MagicMock(return_value=([[0.1]], 2))
+        self.replica_cursor.fetchall.return_value = [(0, "text", 0.1, 1.0, 0.0, 0.9)]
+
+        results, _ = self.db.similarity_search_many("user", ["ab"], top_k=1)
+
+        self.assertEqual(results[0]["sentence_text"], "text")
+        self.primary.connection.assert_not_called()
+
+    def test_claim_stays_on_primary(self):
+        """Verify stage claims never touch the replica."""
+        self.primary_cursor.fetchone.return_value = None
+        self.db.claim_stage("job", "STT", 3)
+        self.replica.connection.assert_not_called()
+
+    def test_stage_output_not_yet_replicated_read_from_primary(self):
+        """Verify a replica miss is re-read on the primary."""
+        self.replica_cursor.fetchone.return_value = None
+        self.primary_cursor.fetchone.return_value = (
+            "out",
+            "stage",
+            None,
+            {},
+            None,
+            None,
+            None,
+            None,
+        )
+
+        output = self.db.read_stage_output("stage")
+
+        self.assertEqual(output["id"], "out")
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        """Verify a replica connection error does not fail the read."""
+        self.replica.connection.side_effect = psycopg.OperationalError("replica down")
+        self.db._generate_query_embeddings = MagicMock(return_value=([[0.1]], 2))
+        self.primary_cursor.fetchall.return_value = []
+
+        results, _ = self.db.similarity_search_many("user", ["ab"], top_k=1)
+
+        self.assertEqual(results, [])
+        self.primary_cursor.execute.assert_called_once()
+
+    def test_close_closes_replica(self):
+        """Verify closing the database closes both pools."""
+        self.db.close()
+        self.replica.close.assert_called_once()
+
+
+class TestSimilarityResultCaching(unittest.TestCase):
+    def setUp(self):
+        patchers = [
+            patch("db.db.TextEmbeddingModel"),
+            patch("db.db.METRICS_SINK_ENABLED", False),
+            patch("db.db.PARTITION_MANAGER_ENABLED", False),
+            patch("db.db.DB_RUN_MIGRATIONS", False),
+            patch("db.db.EMBEDDING_CACHE_PERSISTENT", False),
+        ]
+        pool_patcher = patch("db.db.ConnectionPool")
+        mock_pool = pool_patcher.start().return_value
+        self.addCleanup(pool_patcher.stop)
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mock_cursor = (
+            mock_pool.connection.return_value.__enter__.return_value.cursor.return_value
+        ).__enter__.return_value
+        self.mock_cursor.fetchall.return_value = [(0, "text", 0.1, 1.0, 0.0, 0.9)]
+        self.version = 1
+        self.mock_cursor.fetchone.side_effect = lambda: (self.version, 10, 0)
+
+        self.db = Database()
+        self.db._generate_query_embedding = MagicMock(return_value=([0.1], 2))
+
+    def _searches(self) -> int:
+        return sum(
+            1
+            for call in self.mock_cursor.execute.call_args_list
+            if call.args[0] != queries.USER_CORPUS_STATE_QUERY
+        )
+
+    def test_repeated_search_served_from_cache(self):
+        """Verify a repeated search at the same corpus version skips the search query."""
+        first, _ = self.db.similarity_search("user", "ab", top_k=1)
+        second, _ = self.db.similarity_search("user", "ab", top_k=1)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self._searches(), 1)
+        self.assertEqual(self.db.result_cache_stats()["hits"], 1)
+
+    def test_corpus_version_bump_invalidates(self):
+        """Verify a change to the user's sentences makes the next search run again."""
+        self.db.similarity_search("user", "ab", top_k=1)
+        self.version = 2
+        self.db.similarity_search("user", "ab", top_k=1)
+
+        self.assertEqual(self._searches(), 2)
+        self.assertEqual(self.db.result_cache_stats()["invalidations"], 1)
+
+
+class TestUserMatrixTier(unittest.TestCase):
+    def setUp(self):
+        patchers = [
+            patch("db.db.TextEmbeddingModel"),
+            patch("db.db.METRICS_SINK_ENABLED", False),
+            patch("db.db.PARTITION_MANAGER_ENABLED", False),
+            patch("db.db.DB_RUN_MIGRATIONS", False),
+            patch("db.db.EMBEDDING_CACHE_PERSISTENT", False),
+            patch("db.db.SIMILARITY_CACHE_ENABLED", False),
+            patch("db.db.USER_MATRIX_CACHE_ENABLED", True),
+            patch("db.db.USER_MATRIX_MIN_SENTENCES", 2),
+        ]
+        pool_patcher = patch("db.db.ConnectionPool")
+        mock_pool = pool_patcher.start().return_value
+        self.addCleanup(pool_patcher.stop)
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mock_cursor = (
+            mock_pool.connection.return_value.__enter__.return_value.cursor.return_value
+        ).__enter__.return_value
+        self.state = (1, 2, 0)
+        self.mock_cursor.fetchone.side_effect = lambda: self.state
+        self.mock_cursor.fetchall.side_effect = [
+            [("n1", 0, "old", [1.0, 0.0], 1.0, 100.0), ("n1", 1, "older", [0.0, 1.0], 1.0, 50.0)],
+            [("n2", 0, "new", [1.0, 0.1], 1.0, 200.0)],
+        ]
+
+        self.db = Database()
+        self.db._generate_query_embedding = MagicMock(return_value=([1.0, 0.0], 2))
+
+    def _statements(self) -> list:
+        return [call.args[0] for call in self.mock_cursor.execute.call_args_list]
+
+    def test_heavy_user_searched_in_memory(self):
+        """Verify a user's sentences are loaded once and then searched without SQL scans."""
+        self.db.similarity_search("user", "ab", top_k=1)
+        results, _ = self.db.similarity_search("user", "ab", top_k=1)
+
+        self.assertEqual(results[0]["sentence_text"], "old")
+        self.assertEqual(self._statements().count(queries.USER_SENTENCES_QUERY), 1)
+        self.assertEqual(self.db.matrix_cache_stats()["hits"], 1)
+
+    def test_inserted_sentences_appended(self):
+        """Verify an insert-only version bump fetches just the new rows."""
+        self.db.similarity_search("user", "ab", top_k=1)
+        self.state = (2, 3, 0)
+        results, _ = self.db.similarity_search("user", "ab", top_k=3)
+
+        self.mock_cursor.execute.assert_any_call(
+            queries.USER_SENTENCES_SINCE_QUERY,
+            ("user", 100.0),
+            label="user_sentences_since",
+            context=None,
+        )
+        self.assertEqual(len(results), 3)
+        self.assertEqual(self.db.matrix_cache_stats()["appends"], 1)
+
+    def test_light_user_searched_in_sql(self):
+        """Verify users below the sentence threshold keep using the search query."""
+        self.state = (1, 1, 0)
+        self.mock_cursor.fetchall.side_effect = [[]]
+        self.db.similarity_search("user", "ab", top_k=1)
+
+        self.assertNotIn(queries.USER_SENTENCES_QUERY, self._statements())
+        self.assertEqual(self.db.matrix_cache_stats()["loads"], 0)
+
+
+class TestSessionSettings(unittest.TestCase):
+    @patch("db.db.SIMILARITY_HNSW_ITERATIVE_SCAN", "auto")
+    def test_auto_iterative_scan_follows_pgvector_version(self):
+        """Verify iterative scans are enabled only where pgvector supports them."""
+        self.assertIn(("hnsw.iterative_scan", "relaxed_order"), session_settings("0.8.0"))
+        names = [name for name, _ in session_settings("0.6.2")]
+        self.assertNotIn("hnsw.iterative_scan", names)
+        self.assertEqual(names, [name for name, _ in session_settings(None)])
+
+    @patch("db.db.SIMILARITY_HNSW_ITERATIVE_SCAN", "strict_order")
+    def test_explicit_iterative_scan_kept(self):
+        """Verify an explicit iterative scan setting is applied as configured."""
+        self.assertIn(("hnsw.iterative_scan", "strict_order"), session_settings("0.8.1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
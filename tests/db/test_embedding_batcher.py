@@ -0,0 +1,93 @@
+import threading
+import unittest
+from db.embedding_batcher import EmbeddingBatcher
+
+
+class TestEmbeddingBatcher(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def request_fn(texts, task):
+            self.calls.append((list(texts), task))
+            return [[float(len(text))] for text in texts]
+
+        self.request_fn = request_fn
+
+    def test_concurrent_callers_share_one_call(self):
+        """Verify texts submitted within the window go out as one call per task."""
+        batcher = EmbeddingBatcher(self.request_fn, max_batch=10, max_wait=0.2, start=False)
+        first = batcher.submit(["a", "bb"], "RETRIEVAL_DOCUMENT")
+        second = batcher.submit(["ccc"], "RETRIEVAL_DOCUMENT")
+        third = batcher.submit(["dddd"], "RETRIEVAL_QUERY")
+
+        batcher.close()
+
+        self.assertEqual([f.result() for f in first], [[1.0], [2.0]])
+        self.assertEqual(second[0].result(), [3.0])
+        self.assertEqual(third[0].result(), [4.0])
+        self.assertEqual(
+            sorted(self.calls),
+            [(["a", "bb", "ccc"], "RETRIEVAL_DOCUMENT"), (["dddd"], "RETRIEVAL_QUERY")],
+        )
+
+    def test_window_collects_threads(self):
+        """Verify callers on different threads within max_wait are batched together."""
+        batcher = EmbeddingBatcher(self.request_fn, max_batch=10, max_wait=0.2)
+        results = {}
+        barrier = threading.Barrier(3)
+
+        def worker(text):
+            barrier.wait()
+            results[text] = batcher.embed([text], "RETRIEVAL_DOCUMENT")
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in ("x", "yy", "zzz")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.close()
+
+        self.assertEqual(results, {"x": [[1.0]], "yy": [[2.0]], "zzz": [[3.0]]})
+        self.assertEqual(len(self.calls), 1)
+
+    def test_max_batch_splits_calls(self):
+        """Verify no call carries more than max_batch texts."""
+        batcher = EmbeddingBatcher(self.request_fn, max_batch=2, max_wait=0.2, start=False)
+        futures = batcher.submit(["a", "b", "c"], "RETRIEVAL_DOCUMENT")
+        batcher.close()
+
+        self.assertEqual([len(texts) for texts, _ in self.calls], [2, 1])
+        self.assertTrue(all(f.done() for f in futures))
+
+    def test_duplicate_texts_sent_once(self):
+        """Verify identical texts in a batch are embedded once and answered to every caller."""
+        batcher = EmbeddingBatcher(self.request_fn, max_batch=10, max_wait=0.2, start=False)
+        first = batcher.submit(["same"], "RETRIEVAL_QUERY")
+        second = batcher.submit(["same"], "RETRIEVAL_QUERY")
+        batcher.close()
+
+        self.assertEqual(self.calls, [(["same"], "RETRIEVAL_QUERY")])
+        self.assertEqual(first[0].result(), second[0].result())
+        self.assertEqual(batcher.stats()["texts_sent"], 1)
+
+    def test_failure_propagates_to_callers(self):
+        """Verify a failed call raises in every waiting caller."""
+
+        def failing(texts, task):
+            raise RuntimeError("quota exceeded")
+
+        batcher = EmbeddingBatcher(failing, max_batch=10, max_wait=0.001)
+        with self.assertRaises(RuntimeError):
+            batcher.embed(["a"], "RETRIEVAL_QUERY")
+        batcher.close()
+
+    def test_submit_after_close(self):
+        """Verify a closed batcher rejects new texts."""
+        batcher = EmbeddingBatcher(self.request_fn, start=False)
+        batcher.close()
+        with self.assertRaises(RuntimeError):
+            batcher.submit(["a"], "RETRIEVAL_QUERY")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from unittest.mock import patch
+from db.embedding_cache import EmbeddingCache, embedding_cache_key
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_key_depends_on_task_model_and_dimensionality(self):
+        """Verify the same text gets distinct keys per task, model and size."""
+        base = embedding_cache_key("text", "RETRIEVAL_QUERY", "model", 1536)
+        self.assertEqual(base, embedding_cache_key("text", "RETRIEVAL_QUERY", "model", 1536))
+        self.assertNotEqual(base, embedding_cache_key("text", "RETRIEVAL_DOCUMENT", "model", 1536))
+        self.assertNotEqual(base, embedding_cache_key("text", "RETRIEVAL_QUERY", "other", 1536))
+        self.assertNotEqual(base, embedding_cache_key("text", "RETRIEVAL_QUERY", "model", 768))
+
+    def test_least_recently_used_entry_evicted(self):
+        """Verify the cache keeps at most max_entries, dropping the least recently used."""
+        cache = EmbeddingCache(max_entries=2, ttl=0)
+        cache.put_many({"a": [1.0], "b": [2.0]})
+        cache.get_many(["a"])
+        cache.put_many({"c": [3.0]})
+
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": [1.0], "c": [3.0]})
+
+    def test_expired_entries_are_misses(self):
+        """Verify entries older than the TTL are not returned."""
+        cache = EmbeddingCache(max_entries=10, ttl=60)
+        with patch("db.embedding_cache.time.monotonic", return_value=1000.0):
+            cache.put_many({"a": [1.0]})
+        with patch("db.embedding_cache.time.monotonic", return_value=1061.0):
+            self.assertEqual(cache.get_many(["a"]), {})
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_counters(self):
+        """Verify memory hits, table hits and misses are counted."""
+        cache = EmbeddingCache(max_entries=10, ttl=0)
+        cache.put_many({"a": [1.0]})
+        cache.get_many(["a", "b"])
+        cache.record(db_hits=2, misses=3)
+
+        self.assertEqual(cache.stats(), {"memory_hits": 1, "db_hits": 2, "misses": 3, "entries": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
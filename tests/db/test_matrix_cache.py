@@ -0,0 +1,94 @@
+import unittest
+from db.matrix_cache import UserMatrix, UserMatrixCache
+
+ROWS = [
+    ("n1", 0, "close", [1.0, 0.0], 1.0, 100.0),
+    ("n1", 1, "far", [0.0, 1.0], 2.0, 200.0),
+    ("n2", 0, "middle", [1.0, 1.0], None, 150.0),
+]
+
+
+def combined(distance, importance, ts, max_importance=2.0, min_ts=100.0, max_ts=200.0):
+    return (
+        0.6 / (1 + distance)
+        + 0.2 * importance / max_importance
+        + 0.2 * (ts - min_ts) / (max_ts - min_ts)
+    )
+
+
+class TestUserMatrix(unittest.TestCase):
+    def test_rank_matches_sql_blend(self):
+        """Verify scores use the cosine distance / importance / recency blend of the SQL."""
+        rows = UserMatrix.from_rows(ROWS[:2], version=1).rank([2.0, 0.0], top_k=2)
+
+        self.assertEqual([row[1] for row in rows], ["close", "far"])
+        self.assertAlmostEqual(rows[0][2], 0.0, places=6)
+        self.assertAlmostEqual(rows[0][5], combined(0.0, 1.0, 100.0), places=6)
+        self.assertAlmostEqual(rows[1][5], combined(1.0, 2.0, 200.0), places=6)
+
+    def test_null_scores_rank_first(self):
+        """Verify a NULL importance yields a NULL score ordered first, as in SQL."""
+        rows = UserMatrix.from_rows(ROWS, version=1).rank([1.0, 0.0], top_k=1)
+
+        self.assertEqual(rows[0][1], "middle")
+        self.assertIsNone(rows[0][3])
+        self.assertIsNone(rows[0][5])
+
+    def test_rank_many_keeps_best_anchor(self):
+        """Verify sentences matched by several anchors are kept once with their best score."""
+        matrix = UserMatrix.from_rows(ROWS[:2], version=1)
+
+        rows = matrix.rank_many([[1.0, 0.0], [0.0, 1.0]], top_k=2)
+
+        self.assertEqual(len(rows), 2)
+        anchors = {row[1]: row[6] for row in rows}
+        self.assertEqual(anchors, {"close": 1, "far": 2})
+        self.assertEqual([row[5] for row in rows], sorted((row[5] for row in rows), reverse=True))
+
+    def test_rank_many_excludes_note(self):
+        """Verify the excluded note's sentences are never ranked."""
+        matrix = UserMatrix.from_rows(ROWS, version=1)
+
+        rows = matrix.rank_many([[1.0, 0.0]], top_k=3, exclude_note_id="n1")
+
+        self.assertEqual([row[1] for row in rows], ["middle"])
+        self.assertEqual(matrix.rank_many([[1.0, 0.0]], top_k=3, exclude_note_id="n1")[0][6], 1)
+        self.assertEqual(UserMatrix.from_rows(ROWS[:2], 1).rank_many([[1.0, 0.0]], 3, "n1"), [])
+
+    def test_appended_adds_and_replaces_rows(self):
+        """Verify inserted rows are appended and rows with a known key replaced."""
+        matrix = UserMatrix.from_rows(ROWS[:2], version=1)
+
+        updated = matrix.appended([ROWS[2], ("n1", 1, "far again", [0.0, 1.0], 2.0, 200.0)], 2)
+
+        self.assertEqual((len(matrix), len(updated), updated.version), (2, 3, 2))
+        self.assertIn("far again", updated.texts)
+        self.assertNotIn("far", updated.texts)
+        self.assertEqual(updated.loaded_until, 200.0)
+
+
+class TestUserMatrixCache(unittest.TestCase):
+    def test_cold_users_evicted_within_budget(self):
+        """Verify the least recently used user is evicted when the budget is exceeded."""
+        matrix = UserMatrix.from_rows(ROWS, version=1)
+        cache = UserMatrixCache(max_bytes=matrix.nbytes * 2)
+        cache.put("a", matrix)
+        cache.put("b", matrix)
+        cache.get("a")
+        cache.put("c", matrix)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual((stats["users"], stats["evictions"]), (2, 1))
+        self.assertLessEqual(stats["bytes"], cache.max_bytes)
+
+    def test_user_over_budget_not_cached(self):
+        """Verify a user larger than the whole budget is left to SQL."""
+        cache = UserMatrixCache(max_bytes=1)
+        cache.put("a", UserMatrix.from_rows(ROWS, version=1))
+        self.assertIsNone(cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import MagicMock
+from db.metrics_sink import MetricsSink
+
+
+class TestMetricsSink(unittest.TestCase):
+    def setUp(self):
+        self.mock_pool = MagicMock()
+        conn = self.mock_pool.connection.return_value.__enter__.return_value
+        self.mock_cursor = conn.cursor.return_value.__enter__.return_value
+        self.mock_copy = self.mock_cursor.copy.return_value.__enter__.return_value
+        self.metrics = {"input_tokens": 1, "output_tokens": 2}
+
+    def _sink(self, **kwargs):
+        return MetricsSink(self.mock_pool, start=False, **kwargs)
+
+    def test_flush_copies_pending_rows(self):
+        """Verify pending rows are written with a single COPY."""
+        sink = self._sink()
+        sink.enqueue("user", "job", "stage", "STT", self.metrics)
+        sink.enqueue("user", "job", "stage", "SMART", self.metrics)
+
+        written = sink.flush()
+
+        self.assertEqual(written, 2)
+        self.mock_cursor.copy.assert_called_once()
+        self.assertEqual(self.mock_copy.write_row.call_count, 2)
+        self.assertEqual(sink.stats(), {"pending": 0, "written": 2, "dropped": 0})
+
+    def test_full_queue_drops_rows(self):
+        """Verify rows beyond max_queue are dropped and counted."""
+        sink = self._sink(max_queue=1)
+
+        self.assertTrue(sink.enqueue("user", "job", "stage", "STT", self.metrics))
+        self.assertFalse(sink.enqueue("user", "job", "stage", "STT", self.metrics))
+
+        self.assertEqual(sink.stats()["dropped"], 1)
+        self.assertEqual(sink.stats()["pending"], 1)
+
+    def test_failed_flush_requeues_then_drops(self):
+        """Verify a failing batch is retried and dropped after max_retries."""
+        sink = self._sink(max_retries=1)
+        self.mock_cursor.copy.side_effect = Exception("DB Error")
+        sink.enqueue("user", "job", "stage", "STT", self.metrics)
+
+        self.assertEqual(sink.flush(), 0)
+        self.assertEqual(sink.stats()["pending"], 1)
+
+        self.assertEqual(sink.flush(), 0)
+        self.assertEqual(sink.stats(), {"pending": 0, "written": 0, "dropped": 1})
+
+    def test_close_flushes_and_rejects(self):
+        """Verify close() flushes pending rows and rejects new ones."""
+        sink = MetricsSink(self.mock_pool, flush_interval=60)
+        sink.enqueue("user", "job", "stage", "STT", self.metrics)
+
+        sink.close()
+
+        self.assertEqual(sink.stats()["written"], 1)
+        self.assertFalse(sink.enqueue("user", "job", "stage", "STT", self.metrics))
+
+
+if __name__ == "__main__":
+    unittest.main()
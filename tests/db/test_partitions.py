@@ -0,0 +1,188 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from db import partitions
+
+
+class TestPartitionMaintenance(unittest.TestCase):
+    def setUp(self):
+        self.conn = MagicMock()
+        self.partitions = [
+            ("llm_metrics_legacy", "FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00')"),
+            (
+                "llm_metrics_p202611",
+                "FOR VALUES FROM ('2026-11-01 00:00:00') TO ('2026-12-01 00:00:00')",
+            ),
+            ("llm_metrics_default", "DEFAULT"),
+        ]
+        self.executed = []
+        # Rows in the DEFAULT partition: earliest created_at after the covered range, any in
+        # the range probed
+        self.default_earliest = None
+        self.default_rows = False
+
+        def execute(query, params=None):
+            self.executed.append(str(query) if isinstance(query, str) else query)
+            result = MagicMock()
+            result.fetchall.return_value = self.partitions
+            if query is partitions.DEFAULT_PARTITION_QUERY:
+                result.fetchone.return_value = ("llm_metrics_default",)
+            elif "min(" in repr(query):
+                result.fetchone.return_value = (self.default_earliest,)
+            else:
+                result.fetchone.return_value = (self.default_rows,)
+            return result
+
+        self.conn.execute.side_effect = execute
+
+    def _ddl(self):
+        return [
+            query
+            for query in self.executed
+            if not isinstance(query, str) and "TABLE" in repr(query)
+        ]
+
+    def test_add_months_wraps_year(self):
+        """Verify month arithmetic crosses year boundaries."""
+        self.assertEqual(
+            partitions.add_months(datetime(2026, 11, 17, 8, 30), 2), datetime(2027, 1, 1)
+        )
+
+    def test_partition_bounds_skip_default(self):
+        """Verify range bounds are parsed and the DEFAULT partition ignored."""
+        bounds = partitions.partition_bounds(self.conn, "llm_metrics")
+
+        self.assertEqual(
+            bounds,
+            [
+                ("llm_metrics_legacy", None, datetime(2026, 11, 1)),
+                ("llm_metrics_p202611", datetime(2026, 11, 1), datetime(2026, 12, 1)),
+            ],
+        )
+
+    def test_ensure_partitions_continues_after_covered_range(self):
+        """Verify only the months after the last partition are created."""
+        created = partitions.ensure_partitions(self.conn, "llm_metrics", 2, datetime(2026, 10, 17))
+
+        self.assertEqual(created, ["llm_metrics_p202612"])
+        self.assertEqual(len(self._ddl()), 1)
+        self.assertTrue(any("lock_timeout" in str(query) for query in self.executed))
+
+    def test_ensure_partitions_never_backfills_past_months(self):
+        """Verify a stale table gets partitions from the current month on."""
+        created = partitions.ensure_partitions(self.conn, "llm_metrics", 1, datetime(2027, 3, 2))
+        self.assertEqual(created, ["llm_metrics_p202703", "llm_metrics_p202704"])
+
+    def test_ensure_partitions_moves_default_rows(self):
+        """Verify rows stranded in the DEFAULT partition get their own monthly partition."""
+        self.default_earliest = datetime(2026, 12, 3)
+        self.default_rows = True
+
+        created = partitions.ensure_partitions(self.conn, "llm_metrics", 0, datetime(2027, 1, 10))
+
+        self.assertEqual(created, ["llm_metrics_p202612", "llm_metrics_p202701"])
+        ddl = [repr(query) for query in self._ddl()]
+        self.assertEqual(sum("ATTACH PARTITION" in query for query in ddl), 2)
+        self.assertFalse(any("PARTITION OF" in query for query in ddl))
+
+    def test_sweep_detaches_expired_partitions(self):
+        """Verify partitions ending before the cutoff are detached by default."""
+        swept = partitions.sweep_partitions(
+            self.conn, "llm_metrics", 30, "detach", datetime(2026, 12, 15)
+        )
+
+        self.assertEqual(swept, ["llm_metrics_legacy"])
+        self.assertEqual(len(self._ddl()), 1)
+
+    def test_sweep_disabled_with_zero_retention(self):
+        """Verify a retention of 0 days keeps every partition."""
+        swept = partitions.sweep_partitions(
+            self.conn, "llm_metrics", 0, "drop", datetime(2030, 1, 1)
+        )
+        self.assertEqual(swept, [])
+        self.conn.execute.assert_not_called()
+
+
+class TestDefaultPartitionSweep(unittest.TestCase):
+    @patch("db.partitions.DEFAULT_PARTITION_SWEEP_BATCH", 2)
+    def test_expired_default_rows_deleted_in_batches(self):
+        """Verify DEFAULT partition rows past the cutoff are deleted batch by batch."""
+        conn = MagicMock()
+        conn.execute.side_effect = [
+            MagicMock(fetchone=MagicMock(return_value=("llm_metrics_default",))),
+            MagicMock(rowcount=2),
+            MagicMock(rowcount=0),
+        ]
+
+        deleted = partitions.sweep_default_partition(
+            conn, "llm_metrics", 30, datetime(2026, 12, 31)
+        )
+
+        self.assertEqual(deleted, 2)
+        self.assertIn("llm_metrics_default", repr(conn.execute.call_args.args[0]))
+        self.assertEqual(conn.execute.call_args.args[1]["cutoff"], datetime(2026, 12, 1))
+
+    def test_table_without_default_partition(self):
+        """Verify nothing is deleted when the table has no DEFAULT partition."""
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = None
+
+        self.assertEqual(
+            partitions.sweep_default_partition(conn, "llm_metrics", 30, datetime(2026, 12, 31)),
+            0,
+        )
+        conn.execute.assert_called_once()
+
+
+class TestEmbeddingCacheSweep(unittest.TestCase):
+    @patch("db.partitions.EMBEDDING_CACHE_SWEEP_BATCH", 2)
+    def test_sweep_deletes_in_batches(self):
+        """Verify unused entries are deleted batch by batch until a batch comes back short."""
+        conn = MagicMock()
+        conn.execute.side_effect = [MagicMock(rowcount=2), MagicMock(rowcount=1)]
+
+        deleted = partitions.sweep_embedding_cache(conn, 30)
+
+        self.assertEqual(deleted, 3)
+        self.assertEqual(conn.execute.call_count, 2)
+        self.assertEqual(conn.execute.call_args.args[1]["retention_days"], 30)
+
+    def test_sweep_disabled_with_zero_retention(self):
+        """Verify a retention of 0 days keeps every entry."""
+        conn = MagicMock()
+        self.assertEqual(partitions.sweep_embedding_cache(conn, 0), 0)
+        conn.execute.assert_not_called()
+
+
+class TestPartitionManager(unittest.TestCase):
+    def test_round_skipped_when_locked_elsewhere(self):
+        """Verify only the instance holding the partition lock maintains tables."""
+        pool = MagicMock()
+        conn = pool.connection.return_value.__enter__.return_value
+        conn.execute.return_value.fetchone.return_value = (False,)
+        manager = partitions.PartitionManager(pool, {"llm_metrics": 30}, start=False)
+
+        self.assertEqual(manager.run_once(), {})
+        conn.execute.assert_called_once()
+
+    def test_unpartitioned_table_skipped(self):
+        """Verify tables not yet converted by the migration are left alone."""
+        pool = MagicMock()
+        conn = pool.connection.return_value.__enter__.return_value
+        conn.execute.return_value.fetchone.side_effect = [
+            (True,),
+            (datetime(2026, 10, 17),),
+            (False,),
+        ]
+        manager = partitions.PartitionManager(pool, {"llm_metrics": 30}, start=False)
+
+        results = manager.run_once()
+
+        self.assertEqual(
+            results, {"llm_metrics": {"created": [], "swept": [], "default_deleted": 0}}
+        )
+        self.assertIn("pg_advisory_unlock", conn.execute.call_args.args[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+from config.config import Similarity_Search_Mode
+from db import queries
+
+
+class TestSimilaritySearchStatement(unittest.TestCase):
+    def test_exact_mode_scans_all_sentences(self):
+        """Verify exact mode does not limit candidates before blending."""
+        query, params = queries.similarity_search_statement(
+            Similarity_Search_Mode.EXACT, [0.1, 0.2], "user", 3, 100
+        )
+        self.assertNotIn("%(candidate_depth)s", query)
+        self.assertEqual(params["user_id"], "user")
+        self.assertEqual(params["top_k"], 3)
+
+    def test_ann_mode_limits_candidates(self):
+        """Verify ANN mode orders by distance and limits to the candidate depth."""
+        query, params = queries.similarity_search_statement(
+            Similarity_Search_Mode.ANN, [0.1, 0.2], "user", 3, 100
+        )
+        self.assertIn("ORDER BY embedding <=> %(query)s::vector", query)
+        self.assertEqual(params["candidate_depth"], 100)
+
+    def test_candidate_depth_never_below_top_k(self):
+        """Verify the candidate depth is raised to top_k when configured lower."""
+        _, params = queries.similarity_search_statement(
+            Similarity_Search_Mode.ANN, [0.1], "user", 20, 5
+        )
+        self.assertEqual(params["candidate_depth"], 20)
+
+    def test_halfvec_mode_scans_quantized_index_and_reranks(self):
+        """Verify halfvec candidates come from the quantized expression and rerank at full precision."""
+        query, params = queries.similarity_search_statement(
+            Similarity_Search_Mode.HALFVEC, [0.1, 0.2, 0.3], "user", 3, 100
+        )
+        self.assertIn("ORDER BY embedding::halfvec(3) <=> %(query)s::vector::halfvec(3)", query)
+        self.assertIn("embedding <=> %(query)s::vector AS distance", query)
+        self.assertEqual(params["candidate_depth"], 100)
+
+    def test_binary_mode_uses_hamming_distance(self):
+        """Verify binary candidates are ordered by Hamming distance on the quantized copy."""
+        query, _ = queries.similarity_search_statement(
+            Similarity_Search_Mode.BINARY, [0.1, 0.2], "user", 3, 100
+        )
+        self.assertIn(
+            "binary_quantize(embedding)::bit(2) <~> binary_quantize(%(query)s::vector)", query
+        )
+
+    def test_prefix_mode_scans_leading_dimensions(self):
+        """Verify prefix mode pulls candidates by the truncated vector and rescores in full."""
+        query, _ = queries.similarity_search_statement(
+            Similarity_Search_Mode.PREFIX, [0.1] * 8, "user", 3, 100, prefix_dimensions=4
+        )
+        self.assertIn("ORDER BY subvector(embedding, 1, 4)::vector(4) <=>", query)
+        self.assertIn("embedding <=> %(query)s::vector AS distance", query)
+
+    def test_centroid_mode_limits_to_closest_notes(self):
+        """Verify centroid mode scores only sentences of the note_depth closest notes."""
+        query, params = queries.similarity_search_statement(
+            Similarity_Search_Mode.CENTROID, [0.1, 0.2], "user", 3, 100, note_depth=7
+        )
+        self.assertIn("ORDER BY centroid <=> %(query)s::vector", query)
+        self.assertIn("LIMIT %(note_depth)s", query)
+        self.assertEqual(params["note_depth"], 7)
+
+    def test_hybrid_mode_fuses_lexical_and_vector_candidates(self):
+        """Verify hybrid mode bounds both candidate lists and blends the fused relevance."""
+        query, params = queries.similarity_search_statement(
+            Similarity_Search_Mode.HYBRID,
+            [0.1, 0.2],
+            "user",
+            3,
+            100,
+            query_text="weekly review",
+            lexical_depth=40,
+            text_search_config="simple",
+        )
+        self.assertIn("to_tsvector('simple', sentence_text) @@", query)
+        self.assertIn("plainto_tsquery('simple', %(query_text)s)", query)
+        self.assertIn("ORDER BY embedding <=> %(query)s::vector", query)
+        self.assertIn("LIMIT %(lexical_depth)s", query)
+        self.assertIn("rn.relevance * 0.6", query)
+        self.assertEqual(
+            (params["query_text"], params["lexical_depth"], params["rrf_k"]),
+            ("weekly review", 40, 60),
+        )
+
+    def test_hybrid_mode_rejects_invalid_text_search_config(self):
+        """Verify the formatted-in configuration name must be an identifier."""
+        with self.assertRaises(ValueError):
+            queries.similarity_search_statement(
+                Similarity_Search_Mode.HYBRID, [0.1], "user", 3, 100, text_search_config="a b"
+            )
+
+
+class TestMultiAnchorSearchStatement(unittest.TestCase):
+    def test_anchors_sent_as_one_array(self):
+        """Verify every anchor embedding is bound into a single statement parameter."""
+        query, params = queries.multi_anchor_search_statement(
+            Similarity_Search_Mode.EXACT, [[0.1, 0.2], [0.3, 0.4]], "user", 3, 100
+        )
+        self.assertEqual(params["anchors"], ["[0.1, 0.2]", "[0.3, 0.4]"])
+        self.assertIn("DISTINCT ON (note_id, sentence_index)", query)
+        self.assertNotIn("%(candidate_depth)s", query)
+
+    def test_ann_mode_limits_candidates_per_anchor(self):
+        """Verify ANN mode pulls candidate_depth index neighbours per anchor."""
+        query, params = queries.multi_anchor_search_statement(
+            Similarity_Search_Mode.ANN, [[0.1, 0.2]], "user", 3, 50
+        )
+        self.assertIn("ORDER BY ns.embedding <=> a.embedding", query)
+        self.assertEqual(params["candidate_depth"], 50)
+
+    def test_excluded_note_bound_in_every_mode(self):
+        """Verify the note being processed is filtered out whatever the retrieval mode."""
+        for mode in Similarity_Search_Mode:
+            query, params = queries.multi_anchor_search_statement(
+                mode, [[0.1, 0.2]], "user", 3, 50, anchor_texts=["a"], exclude_note_id="note"
+            )
+            self.assertIn("note_id IS DISTINCT FROM %(exclude_note_id)s", query)
+            self.assertEqual(params["exclude_note_id"], "note")
+
+    def test_quantized_mode_per_anchor_candidates(self):
+        """Verify quantized modes order each anchor's candidates by the quantized expression."""
+        query, _ = queries.multi_anchor_search_statement(
+            Similarity_Search_Mode.HALFVEC, [[0.1, 0.2]], "user", 3, 50
+        )
+        self.assertIn("ORDER BY ns.embedding::halfvec(2) <=> a.embedding::halfvec(2)", query)
+
+    def test_centroid_mode_per_anchor_notes(self):
+        """Verify each anchor picks its own closest notes."""
+        query, _ = queries.multi_anchor_search_statement(
+            Similarity_Search_Mode.CENTROID, [[0.1, 0.2]], "user", 3, 50, note_depth=5
+        )
+        self.assertIn("ORDER BY c.centroid <=> a.embedding", query)
+
+    def test_hybrid_mode_binds_anchor_texts(self):
+        """Verify each anchor's text is matched against the full-text index with its vector."""
+        query, params = queries.multi_anchor_search_statement(
+            Similarity_Search_Mode.HYBRID,
+            [[0.1, 0.2], [0.3, 0.4]],
+            "user",
+            3,
+            50,
+            anchor_texts=["sleep", "running"],
+        )
+        self.assertEqual(params["anchor_texts"], ["sleep", "running"])
+        self.assertIn("unnest(%(anchors)s::text[], %(anchor_texts)s::text[])", query)
+        self.assertIn("to_tsvector('english', sentence_text) @@ a.lexical", query)
+        self.assertIn("DISTINCT ON (note_id, sentence_index)", query)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import psycopg
+import unittest
+from unittest.mock import MagicMock, patch
+from psycopg import pq
+from db import queries
+from db.query_stats import LatencyHistogram, QueryStats, statement_labels
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_buckets_and_percentiles(self):
+        """Verify executions land in their bucket and percentiles use bucket bounds."""
+        histogram = LatencyHistogram(bounds=(10, 100))
+        for elapsed_ms in (3, 4, 5, 50, 500):
+            histogram.observe(elapsed_ms)
+
+        snapshot = histogram.snapshot()
+
+        self.assertEqual(snapshot["buckets"], {"le_10": 3, "le_100": 1, "le_inf": 1})
+        self.assertEqual(snapshot["p50_ms"], 10.0)
+        self.assertEqual(snapshot["p99_ms"], 500)
+        self.assertEqual(snapshot["max_ms"], 500)
+
+    def test_empty_snapshot(self):
+        """Verify an unused histogram reports zeros."""
+        snapshot = LatencyHistogram().snapshot()
+        self.assertEqual(
+            (snapshot["count"], snapshot["mean_ms"], snapshot["p95_ms"]), (0, 0.0, 0.0)
+        )
+
+
+class TestQueryStats(unittest.TestCase):
+    def test_known_statements_labelled_by_constant_name(self):
+        """Verify queries constants are labelled by name and others by their text."""
+        stats = QueryStats(labels=statement_labels(queries))
+
+        self.assertEqual(stats.label(queries.CLAIM_STAGE_QUERY), "claim_stage")
+        self.assertEqual(stats.label("SELECT\n   1"), "SELECT 1")
+
+    def test_only_slow_statements_sampled(self):
+        """Verify fast statements are counted but never sampled."""
+        stats = QueryStats(slow_ms=100, sample_rate=1.0)
+
+        self.assertFalse(stats.observe("read_stage", 5))
+        self.assertTrue(stats.observe("read_stage", 150))
+        self.assertEqual(stats.stats()["read_stage"]["slow"], 1)
+
+    def test_zero_sample_rate_never_samples(self):
+        """Verify a sample rate of 0 disables plan capture."""
+        stats = QueryStats(slow_ms=0, sample_rate=0.0)
+        self.assertFalse(stats.observe("read_stage", 1000))
+
+
+class TestTimedCursor(unittest.TestCase):
+    def setUp(self):
+        self.context = MagicMock(return_value={"job_id": "job"})
+        self.stats = QueryStats(slow_ms=0, sample_rate=1.0, context=self.context)
+        self.conn = MagicMock()
+        self.conn.pgconn.pipeline_status = pq.PipelineStatus.OFF
+        self.conn.info.transaction_status = pq.TransactionStatus.IDLE
+        self.cursor = self.stats.cursor_factory()(self.conn)
+
+        execute_patcher = patch.object(psycopg.Cursor, "execute")
+        self.mock_execute = execute_patcher.start()
+        self.addCleanup(execute_patcher.stop)
+        explain_patcher = patch("db.query_stats.psycopg.Cursor")
+        self.explain_cursor = explain_patcher.start().return_value.__enter__.return_value
+        self.addCleanup(explain_patcher.stop)
+        self.explain_cursor.fetchone.return_value = ([{"Plan": {"Node Type": "Seq Scan"}}],)
+
+    def test_slow_statement_plan_logged_with_job_context(self):
+        """Verify a sampled slow statement is explained and logged with its context."""
+        with patch("db.query_stats.logger") as mock_logger:
+            self.cursor.execute(
+                "SELECT * FROM note_sentences WHERE user_id = %s",
+                ("user",),
+                label="similarity_search.exact",
+                context={"user_id": "user"},
+            )
+
+        explained = self.explain_cursor.execute.call_args.args
+        self.assertTrue(explained[0].startswith("EXPLAIN (FORMAT JSON) SELECT"))
+        self.assertEqual(explained[1], ("user",))
+        extra = mock_logger.warning.call_args.kwargs["extra"]
+        self.assertEqual(extra["job_id"], "job")
+        self.assertEqual(extra["user_id"], "user")
+        self.assertEqual(extra["plan"][0]["Plan"]["Node Type"], "Seq Scan")
+        self.assertIn("similarity_search.exact", self.stats.stats())
+
+    def test_statement_in_transaction_not_explained(self):
+        """Verify no EXPLAIN runs inside an open transaction."""
+        self.conn.info.transaction_status = pq.TransactionStatus.INTRANS
+        self.cursor.execute("SELECT 1")
+
+        self.explain_cursor.execute.assert_not_called()
+        self.assertEqual(self.stats.stats()["SELECT 1"]["count"], 1)
+
+    def test_pipelined_statement_not_timed(self):
+        """Verify statements queued in pipeline mode are not counted."""
+        self.conn.pgconn.pipeline_status = pq.PipelineStatus.ON
+        self.cursor.execute("SELECT 1")
+
+        self.mock_execute.assert_called_once()
+        self.assertEqual(self.stats.stats(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from db.result_cache import SimilarityResultCache, similarity_cache_key
+
+RESULTS = [{"sentence_index": 0, "sentence_text": "text", "combined_score": 0.9}]
+
+
+class TestSimilarityResultCache(unittest.TestCase):
+    def test_key_depends_on_embeddings_and_top_k(self):
+        """Verify different anchors or result counts never share an entry."""
+        key = similarity_cache_key("user", 1, "exact", 5, [[0.1, 0.2]])
+
+        self.assertEqual(key, similarity_cache_key("user", 1, "exact", 5, [[0.1, 0.2]]))
+        self.assertNotEqual(key, similarity_cache_key("user", 1, "exact", 5, [[0.1, 0.3]]))
+        self.assertNotEqual(key, similarity_cache_key("user", 1, "exact", 3, [[0.1, 0.2]]))
+        self.assertNotEqual(key, similarity_cache_key("user", 1, "exact", 5, [[0.1, 0.2]], "note"))
+
+    def test_hit_returns_copies(self):
+        """Verify callers mutating results do not corrupt the cached entry."""
+        cache = SimilarityResultCache(max_entries=10)
+        key = similarity_cache_key("user", 1, "exact", 5, [[0.1]])
+        cache.put(key, RESULTS)
+
+        cache.get(key)[0]["sentence_text"] = "changed"
+
+        self.assertEqual(cache.get(key)[0]["sentence_text"], "text")
+        self.assertEqual(cache.stats()["hit_rate"], 1.0)
+
+    def test_newer_version_drops_user_entries_only(self):
+        """Verify a version bump invalidates exactly that user's entries."""
+        cache = SimilarityResultCache(max_entries=10)
+        cache.put(similarity_cache_key("user", 1, "exact", 5, [[0.1]]), RESULTS)
+        cache.put(similarity_cache_key("user", 1, "exact", 5, [[0.2]]), RESULTS)
+        other = similarity_cache_key("other", 1, "exact", 5, [[0.1]])
+        cache.put(other, RESULTS)
+
+        self.assertIsNone(cache.get(similarity_cache_key("user", 2, "exact", 5, [[0.1]])))
+
+        stats = cache.stats()
+        self.assertEqual((stats["invalidations"], stats["entries"]), (2, 1))
+        self.assertIsNotNone(cache.get(other))
+
+    def test_stale_version_not_stored(self):
+        """Verify results read at an older version never replace newer ones."""
+        cache = SimilarityResultCache(max_entries=10)
+        cache.put(similarity_cache_key("user", 2, "exact", 5, [[0.1]]), RESULTS)
+        cache.put(similarity_cache_key("user", 1, "exact", 5, [[0.2]]), RESULTS)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        """Verify the least recently used entry is evicted first and bytes are tracked."""
+        cache = SimilarityResultCache(max_entries=2)
+        keys = [similarity_cache_key("user", 1, "exact", 5, [[float(i)]]) for i in range(3)]
+        cache.put(keys[0], RESULTS)
+        cache.put(keys[1], RESULTS)
+        cache.get(keys[0])
+        cache.put(keys[2], RESULTS)
+
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[0]))
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertGreater(stats["bytes"], 0)
+
+        tiny = SimilarityResultCache(max_entries=10, max_bytes=1)
+        tiny.put(keys[0], RESULTS)
+        self.assertEqual((tiny.stats()["entries"], tiny.stats()["bytes"]), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+import unittest
+from unittest.mock import MagicMock
+from config.config import Similarity_Search_Mode
+from db import schema
+
+
+class TestApplyMigrations(unittest.TestCase):
+    def setUp(self):
+        self.conn = MagicMock()
+        self.applied_versions = {1}
+        self.executed = []
+
+        def execute(sql, params=None):
+            self.executed.append(sql)
+            result = MagicMock()
+            if "FROM schema_migrations" in sql:
+                result.fetchone.return_value = (1,) if params[0] in self.applied_versions else None
+            return result
+
+        self.conn.execute.side_effect = execute
+
+    def test_only_pending_migrations_run(self):
+        """Verify recorded versions are skipped and pending ones are applied in order."""
+        migrations = [(3, "third", "SELECT 3"), (1, "first", "SELECT 1"), (2, "second", "SELECT 2")]
+
+        applied = schema.apply_migrations(self.conn, migrations)
+
+        self.assertEqual(applied, [2, 3])
+        self.assertNotIn("SELECT 1", self.executed)
+        self.assertLess(self.executed.index("SELECT 2"), self.executed.index("SELECT 3"))
+
+    def test_each_migration_locked_in_own_transaction(self):
+        """Verify every migration takes the advisory lock inside a transaction."""
+        schema.apply_migrations(self.conn, [(2, "second", "SELECT 2")])
+
+        self.conn.transaction.assert_called_once()
+        self.assertTrue(any("pg_advisory_xact_lock" in sql for sql in self.executed))
+
+
+class TestEnsureSearchModeIndex(unittest.TestCase):
+    def setUp(self):
+        self.conn = MagicMock()
+        self.index_row = None
+        self.executed = []
+
+        def execute(sql, params=None):
+            self.executed.append(sql)
+            result = MagicMock()
+            result.fetchone.return_value = self.index_row
+            return result
+
+        self.conn.execute.side_effect = execute
+
+    def test_builds_missing_index(self):
+        """Verify the expression index is created concurrently with the embedding size."""
+        self.assertTrue(
+            schema.ensure_search_mode_index(self.conn, Similarity_Search_Mode.HALFVEC, 1536)
+        )
+        ddl = [sql for sql in self.executed if sql.startswith("CREATE INDEX CONCURRENTLY")]
+        self.assertIn("embedding::halfvec(1536)", ddl[0])
+        self.assertIn("pg_advisory_unlock", self.executed[-1])
+
+    def test_valid_index_left_alone(self):
+        """Verify nothing is built when a valid index exists."""
+        self.index_row = (True,)
+        self.assertFalse(
+            schema.ensure_search_mode_index(self.conn, Similarity_Search_Mode.BINARY, 1536)
+        )
+        self.assertFalse(any(sql.startswith("CREATE INDEX") for sql in self.executed))
+
+    def test_invalid_index_rebuilt(self):
+        """Verify an index left invalid by an interrupted build is dropped and rebuilt."""
+        self.index_row = (False,)
+        self.assertTrue(
+            schema.ensure_search_mode_index(self.conn, Similarity_Search_Mode.BINARY, 1536)
+        )
+        self.assertTrue(any(sql.startswith("DROP INDEX CONCURRENTLY") for sql in self.executed))
+
+    def test_prefix_index_named_by_length(self):
+        """Verify each prefix length gets its own index over the truncated vector."""
+        schema.ensure_search_mode_index(self.conn, Similarity_Search_Mode.PREFIX, 1536, 256)
+        ddl = [sql for sql in self.executed if sql.startswith("CREATE INDEX CONCURRENTLY")]
+        self.assertIn("note_sentences_embedding_prefix256_idx", ddl[0])
+        self.assertIn("subvector(embedding, 1, 256)::vector(256)", ddl[0])
+
+    def test_hybrid_text_index_uses_configuration(self):
+        """Verify hybrid mode builds a GIN index over the configured tsvector expression."""
+        schema.ensure_search_mode_index(
+            self.conn, Similarity_Search_Mode.HYBRID, 1536, text_search_config="simple"
+        )
+        ddl = [sql for sql in self.executed if sql.startswith("CREATE INDEX CONCURRENTLY")]
+        self.assertIn("note_sentences_text_simple_idx ON note_sentences USING gin", ddl[0])
+        self.assertIn("to_tsvector('simple'::regconfig, sentence_text)", ddl[0])
+
+    def test_invalid_text_search_config_rejected(self):
+        """Verify a configuration that is not an identifier never reaches the DDL."""
+        with self.assertRaises(ValueError):
+            schema.ensure_search_mode_index(
+                self.conn, Similarity_Search_Mode.HYBRID, 1536, text_search_config="x'; --"
+            )
+        self.conn.execute.assert_not_called()
+
+    def test_plain_modes_need_no_index(self):
+        """Verify exact and ann modes do not touch the database."""
+        self.assertFalse(
+            schema.ensure_search_mode_index(self.conn, Similarity_Search_Mode.ANN, 1536)
+        )
+        self.conn.execute.assert_not_called()
+
+
+class TestVerifyIndexes(unittest.TestCase):
+    def setUp(self):
+        self.conn = MagicMock()
+        self.indexes = [
+            ("pipeline_stages", "btree", True, ["id"]),
+            ("pipeline_stages", "btree", True, ["job_id", "pipeline_name"]),
+            ("pipeline_outputs", "btree", False, ["pipeline_stage_id", "created_at"]),
+            ("note_sentences", "btree", True, ["user_id", "note_id", "sentence_index"]),
+            ("llm_metrics", "btree", False, ["pipeline_stage_id"]),
+        ]
+        self.executed = []
+
+        def execute(sql, params=None):
+            self.executed.append(sql)
+            result = MagicMock()
+            result.fetchall.return_value = self.indexes
+            result.fetchone.return_value = None
+            return result
+
+        self.conn.execute.side_effect = execute
+
+    def test_equivalent_indexes_satisfy_requirements(self):
+        """Verify indexes are matched by leading columns, not by name."""
+        missing = schema.verify_indexes(self.conn, Similarity_Search_Mode.EXACT, production=True)
+        self.assertEqual(missing, [])
+
+    def test_hnsw_index_required_only_in_ann_mode(self):
+        """Verify the embedding HNSW index is only checked when ann mode scans it."""
+        missing = schema.verify_indexes(self.conn, Similarity_Search_Mode.ANN)
+        self.assertEqual([spec["index"] for spec in missing], ["note_sentences_embedding_idx"])
+
+    def test_non_unique_index_does_not_satisfy_unique_requirement(self):
+        """Verify a plain index on the stage key does not count as the unique one."""
+        self.indexes[1] = ("pipeline_stages", "btree", False, ["job_id", "pipeline_name"])
+        missing = schema.verify_indexes(self.conn, Similarity_Search_Mode.EXACT)
+        self.assertEqual(
+            [spec["index"] for spec in missing], ["pipeline_stages_job_id_pipeline_name_key"]
+        )
+
+    def test_missing_critical_index_refuses_production(self):
+        """Verify production startup fails on a missing critical index."""
+        del self.indexes[2]
+        with self.assertRaises(schema.SchemaVerificationError):
+            schema.verify_indexes(self.conn, Similarity_Search_Mode.EXACT, production=True)
+
+    def test_missing_optional_index_only_logged(self):
+        """Verify a missing non-critical index never blocks startup."""
+        del self.indexes[4]
+        missing = schema.verify_indexes(self.conn, Similarity_Search_Mode.EXACT, production=True)
+        self.assertEqual([spec["index"] for spec in missing], ["llm_metrics_pipeline_stage_id_idx"])
+
+    def test_build_creates_missing_index_concurrently(self):
+        """Verify missing indexes are built concurrently under the advisory lock."""
+        del self.indexes[2]
+        schema.verify_indexes(self.conn, Similarity_Search_Mode.EXACT, build=True)
+        ddl = [sql for sql in self.executed if sql.startswith("CREATE INDEX CONCURRENTLY")]
+        self.assertEqual(len(ddl), 1)
+        self.assertIn("ON pipeline_outputs USING btree (pipeline_stage_id)", ddl[0])
+        self.assertTrue(any("pg_advisory_unlock" in sql for sql in self.executed))
+
+    def test_build_indexes_partitioned_table_per_partition(self):
+        """Verify a partitioned parent is indexed ON ONLY and each partition concurrently."""
+        del self.indexes[2]
+        partitioned = self.conn.execute.side_effect
+
+        def execute(sql, params=None):
+            result = partitioned(sql, params)
+            if sql is schema.IS_PARTITIONED_QUERY:
+                result.fetchone.return_value = (True,)
+            elif sql is schema.LIST_PARTITIONS_QUERY:
+                result.fetchall.return_value = [("pipeline_outputs_p202610", "FOR VALUES ...")]
+            return result
+
+        self.conn.execute.side_effect = execute
+        schema.verify_indexes(self.conn, Similarity_Search_Mode.EXACT, build=True)
+
+        ddl = [sql for sql in self.executed if sql.startswith(("CREATE INDEX", "ALTER INDEX"))]
+        self.assertEqual(
+            ddl,
+            [
+                "CREATE INDEX IF NOT EXISTS pipeline_outputs_pipeline_stage_id_idx "
+                "ON ONLY pipeline_outputs USING btree (pipeline_stage_id)",
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                "pipeline_outputs_p202610_pipeline_stage_id_idx "
+                "ON pipeline_outputs_p202610 USING btree (pipeline_stage_id)",
+                "ALTER INDEX pipeline_outputs_pipeline_stage_id_idx "
+                "ATTACH PARTITION pipeline_outputs_p202610_pipeline_stage_id_idx",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
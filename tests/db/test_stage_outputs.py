@@ -0,0 +1,51 @@
+import unittest
+from db.stage_outputs import LAYOUT_KEY, merge_embeddings, split_embeddings
+
+
+class TestStageOutputs(unittest.TestCase):
+    def setUp(self):
+        self.output = {
+            "sentences_with_embeddings": [
+                {"sentence_index": 1, "sentence_text": "a", "embedding": [0.5, -1.0]},
+                {"sentence_index": 2, "sentence_text": "b", "embedding": [0.25, 2.0]},
+            ],
+            "noteback_response": {"note": "n"},
+        }
+
+    def test_round_trip(self):
+        """Verify a split output is rebuilt exactly (values representable in float32)."""
+        data, embeddings = split_embeddings(self.output)
+
+        self.assertEqual(len(embeddings), 2 * 2 * 4)
+        self.assertNotIn("embedding", data["sentences_with_embeddings"][0])
+        self.assertEqual(data[LAYOUT_KEY]["dimensions"], 2)
+        self.assertEqual(merge_embeddings(data, embeddings), self.output)
+
+    def test_merge_without_embeddings_drops_them(self):
+        """Verify a reader skipping the embeddings gets the sentences without them."""
+        data, _ = split_embeddings(self.output)
+
+        output = merge_embeddings(data)
+
+        self.assertNotIn(LAYOUT_KEY, output)
+        self.assertEqual(
+            output["sentences_with_embeddings"][1], {"sentence_index": 2, "sentence_text": "b"}
+        )
+
+    def test_outputs_without_uniform_embeddings_kept_inline(self):
+        """Verify missing or ragged embeddings are left in the JSONB data as before."""
+        for sentences in (
+            None,
+            [{"sentence_text": "a"}],
+            [{"embedding": [1.0]}, {"embedding": [1.0, 2.0]}],
+        ):
+            output = {"sentences_with_embeddings": sentences}
+            self.assertEqual(split_embeddings(output), (output, None))
+
+    def test_legacy_inline_data_unchanged(self):
+        """Verify rows written before the split are returned as stored."""
+        self.assertEqual(merge_embeddings(self.output, None), self.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
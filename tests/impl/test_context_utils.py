@@ -1,7 +1,12 @@
 import unittest
 from unittest.mock import MagicMock
-from impl.context_utils import format_sentences, prepare_context_for_noteback
-from pipeline.exceptions import FatalPipelineError
+from impl.context_utils import (
+    current_note_sentences_with_embeddings,
+    format_sentences,
+    ingest_note_sentences,
+    prepare_context_for_noteback,
+)
+from pipeline.exceptions import FatalPipelineError, TransientPipelineError
 
 
 class TestContextUtils(unittest.TestCase):
@@ -61,7 +66,7 @@ class TestContextUtils(unittest.TestCase):
         context_response = {"search_anchors": ["anchor1"]}
 
         # Mock vector DB response
-        self.mock_db.similarity_search.return_value = (
+        self.mock_db.similarity_search_many.return_value = (
             [{"sentence_text": "similar text", "combined_score": 0.88}],
             100,  # chars used
         )
@@ -71,7 +76,32 @@ class TestContextUtils(unittest.TestCase):
         result = prepare_context_for_noteback(context_response, self.mock_db, "test_user")
 
         self.assertEqual(result, expected)
-        self.mock_db.similarity_search.assert_called_once()
+        self.mock_db.similarity_search_many.assert_called_once_with(
+            user_id="test_user", anchors=["anchor1"], top_k=3, exclude_note_id=None
+        )
+
+    def test_prepare_context_multiple_anchors_single_search(self):
+        """Verify all valid anchors go to one batched search and invalid ones are skipped."""
+        context_response = {"search_anchors": ["anchor1", None, "anchor2"]}
+        self.mock_db.similarity_search_many.return_value = (
+            [
+                {"sentence_text": "a", "combined_score": 0.9, "anchor_index": 1},
+                {"sentence_text": "b", "combined_score": 0.7, "anchor_index": 2},
+            ],
+            14,
+        )
+
+        result = prepare_context_for_noteback(
+            context_response, self.mock_db, "test_user", note_id="note"
+        )
+
+        self.assertEqual(
+            result,
+            ["sentence_text: a, value_score: 0.9", "sentence_text: b, value_score: 0.7"],
+        )
+        self.mock_db.similarity_search_many.assert_called_once_with(
+            user_id="test_user", anchors=["anchor1", "anchor2"], top_k=3, exclude_note_id="note"
+        )
 
     def test_prepare_context_no_anchors(self):
         """Verify FatalPipelineError when no search anchors exist."""
@@ -87,7 +117,61 @@ class TestContextUtils(unittest.TestCase):
     def test_prepare_context_search_failure(self):
         """Verify FatalPipelineError when similarity search fails completely."""
         context_response = {"search_anchors": ["anchor1"]}
-        self.mock_db.similarity_search.side_effect = Exception("DB Error")
+        self.mock_db.similarity_search_many.side_effect = Exception("DB Error")
 
         with self.assertRaises(FatalPipelineError):
             prepare_context_for_noteback(context_response, self.mock_db, "test_user")
+
+    # --- current_note_sentences_with_embeddings tests ---
+
+    def test_sentence_embeddings_single_bulk_call(self):
+        """Verify all sentences are embedded with one bulk call, in order."""
+        context_response = {
+            "input_to_sentences": [
+                {"sentence": "first", "importance_score": 0.5},
+                {"sentence": "second", "importance_score": 0.9},
+            ]
+        }
+        self.mock_db.generate_sentence_embeddings.return_value = ([[0.1], [0.2]], 11)
+
+        result = current_note_sentences_with_embeddings(context_response, self.mock_db)
+
+        self.mock_db.generate_sentence_embeddings.assert_called_once_with(["first", "second"])
+        self.assertEqual([item["embedding"] for item in result], [[0.1], [0.2]])
+        self.assertEqual([item["sentence_index"] for item in result], [1, 2])
+
+    def test_sentence_embeddings_failure(self):
+        """Verify FatalPipelineError when the bulk embedding call fails."""
+        context_response = {"input_to_sentences": [{"sentence": "s", "importance_score": 1}]}
+        self.mock_db.generate_sentence_embeddings.side_effect = Exception("Vertex error")
+
+        with self.assertRaises(FatalPipelineError):
+            current_note_sentences_with_embeddings(context_response, self.mock_db)
+
+    # --- ingest_note_sentences tests ---
+
+    def test_ingest_strips_embeddings_from_output(self):
+        """Verify sentences are written with their embeddings and returned without them."""
+        sentences = [
+            {"sentence_index": 1, "sentence_text": "s", "importance_score": 1, "embedding": [0.1]}
+        ]
+
+        result = ingest_note_sentences(sentences, self.mock_db, "user", "note")
+
+        self.mock_db.ingest_sentences.assert_called_once_with("user", "note", sentences)
+        self.assertEqual(
+            result, [{"sentence_index": 1, "sentence_text": "s", "importance_score": 1}]
+        )
+
+    def test_ingest_requires_note_id(self):
+        """Verify FatalPipelineError when the note is unknown."""
+        with self.assertRaises(FatalPipelineError):
+            ingest_note_sentences([], self.mock_db, "user", None)
+        self.mock_db.ingest_sentences.assert_not_called()
+
+    def test_ingest_database_failure_is_transient(self):
+        """Verify a failed write can be retried."""
+        self.mock_db.ingest_sentences.side_effect = Exception("connection lost")
+
+        with self.assertRaises(TransientPipelineError):
+            ingest_note_sentences([], self.mock_db, "user", "note")
@@ -0,0 +1,97 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from pipeline.heartbeat import StageHeartbeat
+from pipeline.smart import SmartPipeline
+from pipeline.exceptions import StageLeaseLostError
+
+
+class TestStageHeartbeat(unittest.TestCase):
+    def test_heartbeats_until_exit(self):
+        """Verify the lease is refreshed in the background while the block runs."""
+        db = MagicMock()
+        beaten = threading.Event()
+        db.heartbeat_stage.side_effect = lambda *args: beaten.set() or True
+
+        with StageHeartbeat(db, "stage", 1, interval=0.01) as heartbeat:
+            self.assertTrue(beaten.wait(1))
+
+        db.heartbeat_stage.assert_called_with("stage", 1)
+        self.assertFalse(heartbeat.lost)
+
+    def test_lost_lease_stops_heartbeat(self):
+        """Verify a heartbeat matching no row marks the lease lost."""
+        db = MagicMock()
+        db.heartbeat_stage.return_value = False
+
+        with StageHeartbeat(db, "stage", 1, interval=0.01) as heartbeat:
+            heartbeat._thread.join(1)
+
+        self.assertTrue(heartbeat.lost)
+        db.heartbeat_stage.assert_called_once()
+
+    def test_no_heartbeat_without_claim(self):
+        """Verify nothing runs when the stage was not claimed with a lease."""
+        db = MagicMock()
+        with StageHeartbeat(db, "stage", None, interval=0.01) as heartbeat:
+            self.assertIsNone(heartbeat._thread)
+        db.heartbeat_stage.assert_not_called()
+
+
+class TestLeaseInPipelineRun(unittest.TestCase):
+    def setUp(self):
+        self.db = MagicMock()
+        self.pipeline = SmartPipeline(MagicMock(), MagicMock(), self.db)
+        self.context = {"pipeline_stage_id": "stage", "job_id": "job", "stage_attempt": 2}
+
+    @patch("pipeline.base.StageHeartbeat")
+    def test_completion_carries_lease(self, mock_heartbeat):
+        """Verify the stage is completed under the claim's lease."""
+        mock_heartbeat.return_value.__enter__.return_value.lost = False
+        self.pipeline._execute = MagicMock(return_value=({"note": "done"}, {}))
+
+        with patch.object(self.pipeline, "_send_upstream"):
+            self.pipeline.run(b"input", self.context)
+
+        self.db.complete_stage.assert_called_once_with("stage", {"note": "done"}, 2)
+
+    @patch("pipeline.base.StageHeartbeat")
+    def test_lost_lease_skips_completion(self, mock_heartbeat):
+        """Verify a worker whose stage was taken over writes no result."""
+        mock_heartbeat.return_value.__enter__.return_value.lost = True
+        self.pipeline._execute = MagicMock(return_value=({"note": "done"}, {}))
+
+        with self.assertRaises(StageLeaseLostError):
+            self.pipeline.run(b"input", self.context)
+
+        self.db.complete_stage.assert_not_called()
+
+    @patch("pipeline.base.StageHeartbeat")
+    def test_lease_lost_at_completion_skips_upstream(self, mock_heartbeat):
+        """Verify a completion matching no lease is not reported upstream."""
+        mock_heartbeat.return_value.__enter__.return_value.lost = False
+        self.pipeline._execute = MagicMock(return_value=({"note": "done"}, {}))
+        self.db.complete_stage.return_value = None
+
+        with patch.object(self.pipeline, "_send_upstream") as send_upstream:
+            with self.assertRaises(StageLeaseLostError):
+                self.pipeline.run(b"input", self.context)
+
+        send_upstream.assert_not_called()
+
+    @patch("pipeline.base.StageHeartbeat")
+    def test_processing_runs_in_job_scope(self, mock_heartbeat):
+        """Verify statements issued while processing are tagged with the job."""
+        mock_heartbeat.return_value.__enter__.return_value.lost = False
+        self.pipeline._execute = MagicMock(return_value=({"note": "done"}, {}))
+        self.db.complete_stage.return_value = "out"
+
+        with patch.object(self.pipeline, "_send_upstream"):
+            self.pipeline.run(b"input", self.context)
+
+        self.db.job_scope.assert_called_once_with(self.context["job_id"])
+        self.db.complete_stage.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
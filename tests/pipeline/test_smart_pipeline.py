@@ -25,7 +25,7 @@ class TestSmartPipeline(unittest.TestCase):
             "note_id": "test_note",
         }
 
-        self.mock_db._generate_sentence_embedding.return_value = ([0.1, 0.2], 10)
+        self.mock_db.generate_sentence_embeddings.return_value = ([[0.1, 0.2]], 10)
         self.input_data = b"test_input"
 
     # --- Success Case ---
@@ -83,10 +83,64 @@ class TestSmartPipeline(unittest.TestCase):
         mock_get_input.assert_any_call(Llm_Call.SMART, self.input_data, "AUDIO_WAV", plan_type=None)
         # 2. call_llm for Smart
         # 3. prepare_context & format_sentences
-        mock_prep_context.assert_called_with(smart_response, self.mock_db, "test_user")
+        mock_prep_context.assert_called_with(smart_response, self.mock_db, "test_user", "test_note")
         # 4. get_llm_input for Noteback (with replacements)
         # 5. call_llm for Noteback
 
+    @patch("pipeline.smart.SENTENCE_INGEST_ENABLED", True)
+    @patch("pipeline.smart.get_llm_input")
+    @patch("pipeline.smart.call_llm")
+    @patch("pipeline.smart.prepare_context_for_noteback")
+    @patch("pipeline.smart.format_sentences")
+    def test_process_ingests_sentences(
+        self, mock_format, mock_prep_context, mock_call_llm, mock_get_input
+    ):
+        """Verify sentences are ingested and the output carries them without embeddings."""
+        mock_get_input.return_value = {"prompt": "p"}
+        smart_response = {
+            "search_anchors": ["a1"],
+            "input_to_sentences": [{"sentence": "test", "importance_score": 0.5}],
+        }
+        mock_call_llm.side_effect = [(smart_response, {}), ({"note": "n"}, {})]
+        mock_prep_context.return_value = ["formatted context"]
+        mock_format.return_value = ["formatted note"]
+
+        response, _ = self.pipeline._process(self.input_data, self.context)
+
+        ingested = self.mock_db.ingest_sentences.call_args.args
+        self.assertEqual(ingested[:2], ("test_user", "test_note"))
+        self.assertEqual(ingested[2][0]["embedding"], [0.1, 0.2])
+        self.assertEqual(
+            response["sentences_with_embeddings"],
+            [{"sentence_index": 1, "sentence_text": "test", "importance_score": 0.5}],
+        )
+
+    @patch("pipeline.smart.SENTENCE_INGEST_ENABLED", True)
+    @patch("pipeline.smart.get_llm_input")
+    @patch("pipeline.smart.call_llm")
+    @patch("pipeline.smart.prepare_context_for_noteback")
+    @patch("pipeline.smart.format_sentences")
+    def test_failed_noteback_ingests_nothing(
+        self, mock_format, mock_prep_context, mock_call_llm, mock_get_input
+    ):
+        """Verify a retried noteback does not find the note's own sentences as history."""
+        mock_get_input.return_value = {"prompt": "p"}
+        smart_response = {
+            "search_anchors": ["a1"],
+            "input_to_sentences": [{"sentence": "test", "importance_score": 0.5}],
+        }
+        mock_call_llm.side_effect = [
+            (smart_response, {}),
+            TransientPipelineError("Noteback unavailable"),
+        ]
+        mock_prep_context.return_value = ["formatted context"]
+        mock_format.return_value = ["formatted note"]
+
+        with self.assertRaises(TransientPipelineError):
+            self.pipeline._process(self.input_data, self.context)
+
+        self.mock_db.ingest_sentences.assert_not_called()
+
     # --- Failure Cases ---
 
     def test_process_empty_input(self):
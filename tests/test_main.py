@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+import main
+from config.config import Pipeline, Pipeline_Stage_Status
+
+
+class TestStageCheckout(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.fail_stage = AsyncMock()
+        self.db.read_stage_output = AsyncMock(return_value=None)
+        self.data = {"job_id": "job", "note_id": "note", "user_id": "user"}
+
+    def _stage(self, **fields):
+        stage = {
+            "id": "stage",
+            "status": Pipeline_Stage_Status.COMPLETED,
+            "attempt_count": main.MAX_PIPELINE_STAGE_ATTEMPTS,
+            "claimed": False,
+            "previous_status": Pipeline_Stage_Status.COMPLETED,
+            "lease_expired": False,
+        }
+        stage.update(fields)
+        return stage
+
+    @patch("main._send_upstream_status")
+    async def test_completed_stage_with_expired_output_is_acked(self, send_upstream):
+        """Verify a completed stage whose output expired is neither failed nor re-reported."""
+        self.db.claim_stage = AsyncMock(return_value=self._stage())
+
+        stage_id, response = await main._handle_stage_checkout(self.db, Pipeline.STT, self.data, {})
+
+        self.assertIsNone(stage_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"output expired", response.body)
+        self.db.fail_stage.assert_not_called()
+        send_upstream.assert_not_called()
+
+    @patch("main._send_upstream_status")
+    async def test_completed_stage_output_sent_upstream(self, send_upstream):
+        """Verify a redelivered completed stage reports its stored output."""
+        self.db.claim_stage = AsyncMock(return_value=self._stage(attempt_count=1))
+        self.db.read_stage_output.return_value = {"note": "done"}
+
+        stage_id, _ = await main._handle_stage_checkout(self.db, Pipeline.STT, self.data, {})
+
+        self.assertIsNone(stage_id)
+        self.assertEqual(send_upstream.call_args.args[3], Pipeline_Stage_Status.COMPLETED)
+
+
+if __name__ == "__main__":
+    unittest.main()